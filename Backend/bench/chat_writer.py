@@ -0,0 +1,92 @@
+# bench/chat_writer.py
+# 📊 So sánh tốc độ ghi tin nhắn chat: commit từng tin (cách cũ) vs MessageWriter ghi theo lô
+# Chạy từ thư mục Backend:  python -m bench.chat_writer --messages 2000 --senders 50
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+import models
+from models.user import User
+from models.forum import Forum
+from models.message import Message
+from message_writer import MessageWriter
+
+
+def make_db(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    db = Session()
+    db.add(User(user_id=1, username="bench", email="bench@example.com", password_hash="x"))
+    db.add(Forum(forum_id=1, name="bench", created_by=1))
+    db.commit()
+    db.close()
+    return engine, Session
+
+
+async def run_inline(Session, messages, senders):
+    # Cách cũ: mỗi tin add/commit/refresh ngay trong coroutine → chặn event loop
+    per_sender = messages // senders
+
+    async def sender():
+        for i in range(per_sender):
+            db = Session()
+            msg = Message(forum_id=1, user_id=1, content=f"m{i}", created_at=datetime.utcnow())
+            db.add(msg)
+            db.commit()
+            db.refresh(msg)
+            db.close()
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(sender() for _ in range(senders)))
+    return per_sender * senders
+
+
+async def run_batched(Session, messages, senders, batch_size):
+    writer = MessageWriter(session_factory=Session, batch_size=batch_size)
+    per_sender = messages // senders
+
+    async def sender():
+        for i in range(per_sender):
+            await writer.write(forum_id=1, user_id=1, content=f"m{i}", created_at=datetime.utcnow())
+
+    await asyncio.gather(*(sender() for _ in range(senders)))
+    await writer.stop()
+    return per_sender * senders
+
+
+def measure(label, coro_factory):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, Session = make_db(os.path.join(tmp, "bench.db"))
+        start = time.perf_counter()
+        written = asyncio.run(coro_factory(Session))
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+    return {"mode": label, "messages": written, "seconds": round(elapsed, 3),
+            "messages_per_sec": round(written / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--senders", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    results = [
+        measure("inline_commit", lambda S: run_inline(S, args.messages, args.senders)),
+        measure("batched_writer", lambda S: run_batched(S, args.messages, args.senders, args.batch_size)),
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# bench/forum_stream.py
+# 📊 So sánh GET /forum/ kiểu cũ (query(Forum).all() + list dict) với bản stream (mảng JSON / NDJSON)
+# - Mỗi chế độ chạy trong 1 process riêng để đo RSS đỉnh (ru_maxrss) tăng thêm khi phục vụ request
+# - Gọi thẳng ASGI app → đo được thời điểm nhận byte đầu tiên (TTFB), TestClient thì đợi hết body
+# Chạy từ thư mục Backend:  python -m bench.forum_stream --forums 100000
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from fastapi import Depends, FastAPI, Request
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, get_db, get_read_db
+import models
+from models.forum import Forum
+
+MODES = {
+    "legacy": "/legacy",
+    "stream_json": "/forum/",
+    "stream_ndjson": "/forum/?format=ndjson",
+    "page": "/forum/?page=1&limit=50",
+}
+
+
+def build_database(path, n_forums, seed=42):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        for offset in range(0, n_forums, 10_000):
+            conn.execute(insert(Forum), [
+                {
+                    "name": f"Diễn đàn {i}",
+                    "tag": rng.choice(("game", "music", "code", "travel", "food")),
+                    "caption": "Nơi thảo luận " + " ".join(rng.choices(("vui", "hay", "bổ ích", "mới", "cũ"), k=15)),
+                    "background": f"uploads/{i}.jpg",
+                    "created_by": 1,
+                    "created_at": start + timedelta(minutes=i),
+                }
+                for i in range(offset + 1, min(offset + 10_000, n_forums) + 1)
+            ])
+    engine.dispose()
+
+
+def make_app(path):
+    from routers.forum import router as forum_router
+
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    def override():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(forum_router)
+    app.dependency_overrides[get_db] = override
+
+    # Bản cũ của GET /forum/ để so sánh
+    @app.get("/legacy")
+    def legacy(request: Request, db=Depends(get_read_db)):
+        forums = db.query(Forum).all()
+        base_url = str(request.base_url).rstrip("/")
+        return [
+            {
+                "forum_id": f.forum_id,
+                "name": f.name,
+                "tag": f.tag,
+                "caption": f.caption,
+                "background": f"{base_url}/static/{f.background}" if f.background else None,
+                "created_by": f.created_by,
+                "created_at": f.created_at
+            }
+            for f in forums
+        ]
+
+    return app
+
+
+async def call(app, url):
+    path, _, query = url.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    sent = False
+    never = asyncio.Event()
+    stats = {"status": None, "ttfb": None, "bytes": 0}
+    start = time.perf_counter()
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await never.wait()  # client không ngắt kết nối
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            stats["status"] = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            if stats["ttfb"] is None:
+                stats["ttfb"] = time.perf_counter() - start
+            stats["bytes"] += len(message["body"])
+
+    await app(scope, receive, send)
+    stats["total"] = time.perf_counter() - start
+    return stats
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: KB
+
+
+def run_worker(path, mode):
+    app = make_app(path)
+    asyncio.run(call(app, "/forum/?page=1&limit=1"))  # khởi động engine, import lazy
+    baseline = max_rss_mb()
+    stats = asyncio.run(call(app, MODES[mode]))
+    print(json.dumps({
+        "mode": mode,
+        "status": stats["status"],
+        "ttfb_ms": round(stats["ttfb"] * 1000, 1),
+        "total_ms": round(stats["total"] * 1000, 1),
+        "bytes": stats["bytes"],
+        "peak_rss_growth_mb": round(max_rss_mb() - baseline, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--forums", type=int, default=100_000)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.db, args.worker)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "forums.db")
+        build_database(path, args.forums)
+        results = []
+        for mode in args.modes.split(","):
+            out = subprocess.run(
+                [sys.executable, "-m", "bench.forum_stream", "--worker", mode, "--db", path],
+                capture_output=True, text=True, check=True
+            ).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+    print(json.dumps({"forums": args.forums, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
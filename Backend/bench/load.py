@@ -0,0 +1,285 @@
+# bench/load.py
+# 🚦 Load test trong process: sinh dữ liệu (bench/seed.py) rồi bắn request đồng thời vào main.app
+# - Chạy nguyên app thật (middleware, cache response, message_writer, chat hub) qua ASGI, không cần uvicorn
+# - Mỗi kịch bản chạy riêng: --requests request với --concurrency client, có warmup (không tính)
+# - Kết quả JSON: throughput, p50/p95/p99, tỉ lệ lỗi, số câu SQL / request (database.sql_stats)
+# - WebSocket: --ws-clients client cùng 1 forum, đo độ trễ tới client nhận cuối cùng của mỗi tin broadcast
+# Chạy từ thư mục Backend:
+#   python -m bench.load --users 5000 --forums 1000 --messages 100000 --requests 1000 --concurrency 32 --out v1.json
+#   python -m bench.load --url sqlite:///bench.db --skip-seed      (dùng lại DB đã sinh bằng bench.seed)
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+# ⚠️ Không import database / main / bench.seed ở đây: database.py đọc DATABASE_URL lúc import,
+# main() đặt biến môi trường xong mới import
+
+SCENARIOS = {
+    "forum_page": lambda rng, ctx: f"/forum/page?limit=20&page={rng.randint(1, 5)}",
+    "forum_trending": lambda rng, ctx: "/forum/trending?limit=20",
+    "forum_search": lambda rng, ctx: "/forum/search?" + urlencode({"keyword": ctx["query"](rng)}),
+    "forum_by_tag": lambda rng, ctx: f"/forum/by-tag/{rng.choice(ctx['tags'])}",
+    "forum_joined": lambda rng, ctx: f"/forum/joined/{rng.randint(1, ctx['users'])}",
+    "message_history": lambda rng, ctx: f"/message/forum/{ctx['hot_forum'](rng)}?limit=50",
+    "profile_stats": lambda rng, ctx: f"/user/{rng.randint(1, ctx['users'])}",
+}
+
+
+def total_statements() -> int:
+    from database import sql_stats
+    return sum(sql_stats.snapshot()["statements"].values())
+
+
+# ===============================
+# 🔌 ASGI trong process (lifespan + WebSocket; HTTP đi qua httpx.ASGITransport)
+# ===============================
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    inbox, outbox = asyncio.Queue(), asyncio.Queue()
+    task = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}}, inbox.get, outbox.put))
+    await inbox.put({"type": "lifespan.startup"})
+    message = await outbox.get()
+    if message["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"startup lỗi: {message}")
+    try:
+        yield
+    finally:
+        await inbox.put({"type": "lifespan.shutdown"})
+        await outbox.get()
+        await task
+
+
+class WebSocketClient:
+    def __init__(self, app, path: str, query_string: str = ""):
+        self.app = app
+        self.path = path
+        self.query_string = query_string
+        self._to_app = asyncio.Queue()
+        self._from_app = asyncio.Queue()
+        self._task = None
+
+    async def connect(self):
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "path": self.path,
+            "raw_path": self.path.encode(), "query_string": self.query_string.encode(), "root_path": "", "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 1), "server": ("bench", 80), "subprotocols": [],
+        }
+        await self._to_app.put({"type": "websocket.connect"})
+        self._task = asyncio.create_task(self.app(scope, self._to_app.get, self._from_app.put))
+        message = await self._from_app.get()
+        if message["type"] != "websocket.accept":
+            raise RuntimeError(f"WebSocket bị từ chối: {message}")
+
+    async def send(self, text: str):
+        await self._to_app.put({"type": "websocket.receive", "text": text})
+
+    async def receive(self) -> str:
+        message = await self._from_app.get()
+        if message["type"] != "websocket.send":
+            raise RuntimeError(f"WebSocket đóng: {message}")
+        return message["text"]
+
+    async def close(self):
+        await self._to_app.put({"type": "websocket.disconnect", "code": 1000})
+        await self._task
+
+
+# ===============================
+# 🏃 Chạy kịch bản
+# ===============================
+async def run_scenario(client, name, ctx, requests, concurrency, warmup, seed_value):
+    from bench.search import percentiles
+
+    make_url = SCENARIOS[name]
+    rng = random.Random(seed_value)
+    for _ in range(warmup):
+        await client.get(make_url(rng, ctx))
+
+    latencies, statuses = [], {}
+    counter = itertools.count()
+    statements_before = total_statements()
+
+    async def worker(i):
+        rng = random.Random(seed_value * 1000 + i)
+        while next(counter) < requests:
+            url = make_url(rng, ctx)
+            start = time.perf_counter()
+            response = await client.get(url)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    errors = sum(n for code, n in statuses.items() if code >= 400)
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1),
+        **percentiles(latencies),
+        "errors": errors,
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        "queries_per_request": round((total_statements() - statements_before) / len(latencies), 2),
+    }
+
+
+async def run_websocket(app, clients, messages, forum_id, timeout):
+    from bench.search import percentiles
+
+    from identity import issue_token
+
+    # Mỗi client đăng nhập bằng 1 user đã sinh (người gửi lấy từ token)
+    sockets = [
+        WebSocketClient(app, f"/chat/ws/{forum_id}", urlencode({"token": issue_token(i, f"user{i}", None)}))
+        for i in range(1, clients + 1)
+    ]
+    for ws in sockets:
+        await ws.connect()
+
+    sent_at = {}
+    last_delivery = {}
+    delivered = 0
+
+    async def listen(ws):
+        nonlocal delivered
+        for _ in range(messages):
+            payload = json.loads(await ws.receive())
+            key = payload["content"]
+            last_delivery[key] = time.perf_counter()
+            delivered += 1
+
+    listeners = [asyncio.create_task(listen(ws)) for ws in sockets]
+    start = time.perf_counter()
+    for i in range(messages):
+        key = f"bench-{i}"
+        sent_at[key] = time.perf_counter()
+        # Lần lượt từng client gửi (giống nhiều người cùng chat)
+        await sockets[i % clients].send(json.dumps({"content": key}))
+        await asyncio.sleep(0)
+    done, pending = await asyncio.wait(listeners, timeout=timeout)
+    elapsed = time.perf_counter() - start
+    for task in pending:
+        task.cancel()
+    for ws in sockets:
+        await ws.close()
+
+    latencies = [last_delivery[k] - sent_at[k] for k in sent_at if k in last_delivery]
+    return {
+        "clients": clients,
+        "messages": messages,
+        "seconds": round(elapsed, 3),
+        "deliveries": delivered,
+        "expected_deliveries": clients * messages,
+        "deliveries_per_sec": round(delivered / elapsed, 1),
+        "fanout_latency": percentiles(latencies) if latencies else None,
+    }
+
+
+async def run(args, volumes):
+    import httpx
+    import main
+    from bench.seed import zipf_weights
+    from bench.search import TAGS, fake_query
+
+    forum_weights = zipf_weights(volumes["forums"])
+    forum_ids = range(1, volumes["forums"] + 1)
+    ctx = {
+        "users": volumes["users"],
+        "hot_forum": lambda rng: rng.choices(forum_ids, cum_weights=forum_weights)[0],
+        "tags": TAGS,
+        "query": fake_query,
+    }
+
+    results, websocket = [], None
+    async with lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for i, name in enumerate(args.scenarios.split(",")):
+                results.append(await run_scenario(
+                    client, name, ctx, args.requests, args.concurrency, args.warmup, args.seed + i
+                ))
+        if args.ws_clients and args.ws_messages:
+            websocket = await run_websocket(main.app, args.ws_clients, args.ws_messages, 1, args.ws_timeout)
+    return results, websocket
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="DB có sẵn (mặc định: SQLite tạm)")
+    parser.add_argument("--skip-seed", action="store_true", help="không sinh lại dữ liệu trong --url")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="số request mỗi kịch bản")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--no-cache", action="store_true", help="tắt cache response (đo đường DB)")
+    parser.add_argument("--ws-clients", type=int, default=50)
+    parser.add_argument("--ws-messages", type=int, default=200)
+    parser.add_argument("--ws-timeout", type=float, default=60)
+    parser.add_argument("--out", help="ghi JSON ra file (mặc định in ra stdout)")
+    args, _ = parser.parse_known_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url or f"sqlite:///{os.path.join(tmp, 'load.db')}"
+        os.environ["DATABASE_URL"] = url
+        os.environ["CACHE_ENABLED"] = "0" if args.no_cache else os.getenv("CACHE_ENABLED", "1")
+        os.environ.setdefault("SLOW_REQUEST_MS", "1e9")  # tắt log request chậm khi đang dồn tải
+        os.environ.setdefault("SLOW_REQUEST_STATEMENTS", "1000000")
+        os.environ.setdefault("JWT_SECRET_KEY", "bench-only-secret")  # token của client WebSocket
+
+        from bench import seed
+
+        seed.add_arguments(parser)
+        args = parser.parse_args()
+        unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+        if unknown:
+            parser.error(f"kịch bản không có: {', '.join(sorted(unknown))}")
+
+        # Log của app ra stderr, stdout chỉ còn JSON kết quả
+        with contextlib.redirect_stdout(sys.stderr):
+            volumes = seed.volumes(args)
+            seeded = None if args.skip_seed else seed.build_database(url, seed=args.seed, **volumes)
+            results, websocket = asyncio.run(run(args, volumes))
+
+    report = {
+        "meta": {
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "database": url.split("://", 1)[0],
+            "cache": not args.no_cache,
+            "volumes": volumes,
+            "seed": args.seed,
+        },
+        "seeded": seeded,
+        "results": results,
+        "websocket": websocket,
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# bench/password_hash.py
+# 🔐 Đo số lần đăng nhập (verify pbkdf2_sha256) mỗi giây và mỗi core
+# - threadpool: cách cũ, route đồng bộ → verify chạy trong threadpool chung của FastAPI
+# - process_pool: password_pool.PasswordPool với 1, 2, … PASSWORD_WORKERS process
+# - Cùng lúc đó 1 "route đồng bộ khác" (việc rỗng qua run_in_threadpool) chạy đều đặn:
+#   độ trễ của nó cho thấy đăng nhập có làm nghẽn phần còn lại của app không
+# - per_core = logins_per_sec / số core thực sự dùng (min(số process / thread, os.cpu_count()))
+# - burst: bắn --burst request cùng lúc vào pool có --max-pending nhỏ → bao nhiêu bị từ chối (503)
+# Chạy từ thư mục Backend:  python -m bench.password_hash --logins 400 --concurrency 64 --workers 1,2,4
+import argparse
+import asyncio
+import json
+import os
+import platform
+import time
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+import my_utils
+from password_pool import PasswordPool
+
+# ⚠️ Process con (spawn) import lại module này: không import database / bench.search ở đầu file
+
+THREADPOOL_TOKENS = 40  # giới hạn mặc định của anyio
+
+
+async def _neighbour(stop: asyncio.Event, interval: float, latencies: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await run_in_threadpool(lambda: None)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+
+
+async def run_mode(name, verify, parallelism, logins, concurrency, hashed, interval):
+    from bench.search import percentiles
+
+    for _ in range(min(parallelism, 4)):
+        await verify("secret", hashed)  # warmup (process đã spawn, import xong)
+
+    remaining = logins
+    rejected = 0
+
+    async def client():
+        nonlocal remaining, rejected
+        while remaining > 0:
+            remaining -= 1
+            try:
+                assert await verify("secret", hashed)
+            except HTTPException:
+                rejected += 1
+
+    stop, neighbour_latency = asyncio.Event(), []
+    probe = asyncio.create_task(_neighbour(stop, interval, neighbour_latency))
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+
+    cores = min(parallelism, os.cpu_count() or 1)
+    done = logins - rejected
+    return {
+        "mode": name,
+        "parallelism": parallelism,
+        "cores": cores,
+        "logins": done,
+        "rejected": rejected,
+        "seconds": round(elapsed, 3),
+        "logins_per_sec": round(done / elapsed, 1),
+        "per_core": round(done / elapsed / cores, 1),
+        "neighbour_latency": percentiles(neighbour_latency) if neighbour_latency else None,
+    }
+
+
+async def run_burst(workers, max_pending, burst, hashed):
+    pool = PasswordPool(workers=workers, max_pending=max_pending)
+    await pool.start()
+    try:
+        results = await asyncio.gather(
+            *(pool.verify("secret", hashed) for _ in range(burst)), return_exceptions=True
+        )
+    finally:
+        await pool.stop()
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    return {
+        "workers": workers,
+        "max_pending": max_pending,
+        "burst": burst,
+        "accepted": burst - len(rejected),
+        "rejected_503": len(rejected),
+        "retry_after": rejected[0].headers["Retry-After"] if rejected else None,
+    }
+
+
+async def run(args):
+    hashed = my_utils.hash_password("secret")
+    results = [await run_mode(
+        "threadpool", lambda p, h: run_in_threadpool(my_utils.verify_password, p, h),
+        THREADPOOL_TOKENS, args.logins, args.concurrency, hashed, args.interval
+    )]
+    for workers in (int(w) for w in args.workers.split(",")):
+        # Không giới hạn hàng đợi ở đây: đo throughput, phần 503 đo riêng ở burst
+        pool = PasswordPool(workers=workers, max_pending=args.logins + args.concurrency)
+        await pool.start()
+        try:
+            results.append(await run_mode(
+                "process_pool", pool.verify, workers, args.logins, args.concurrency, hashed, args.interval
+            ))
+        finally:
+            await pool.stop()
+    burst = await run_burst(int(args.workers.split(",")[0]), args.max_pending, args.burst, hashed)
+    return results, burst
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=400, help="số lần verify mỗi chế độ")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, os.cpu_count() or 1})),
+                        help="các cỡ process pool cần đo, vd 1,2,4")
+    parser.add_argument("--interval", type=float, default=0.01, help="chu kỳ của route đồng bộ giả lập (giây)")
+    parser.add_argument("--burst", type=int, default=200)
+    parser.add_argument("--max-pending", type=int, default=16)
+    args = parser.parse_args()
+
+    results, burst = asyncio.run(run(args))
+    print(json.dumps({
+        "meta": {
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "scheme": my_utils.pwd_context.default_scheme(),
+        },
+        "results": results,
+        "burst": burst,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# bench/query_counts.py
+# 🔢 Kiểm tra số câu SQL mỗi request không tăng theo kích thước dữ liệu (chống N+1)
+# Chạy từ thư mục Backend:  python -m bench.query_counts
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base, get_db
+import models
+from models.user import User
+from models.forum import Forum
+from models.message import Message
+from models.membership import Membership
+from routers import message, forum
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def make_client(routers):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    for r in routers:
+        app.include_router(r)
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app), Session, StatementCounter(engine)
+
+
+def count_statements(client, counter, url):
+    before = counter.count
+    response = client.get(url)
+    assert response.status_code == 200, response.text
+    return counter.count - before
+
+
+def check_message_history(sizes=(10, 50, 200)):
+    results = {}
+    for size in sizes:
+        client, Session, counter = make_client([message.router])
+        db = Session()
+        db.add(User(user_id=1, username="bench", email="bench@example.com", password_hash="x"))
+        db.add(Forum(forum_id=1, name="bench", created_by=1))
+        db.add(Message(message_id=1, forum_id=1, user_id=1, content="x" * 300))
+        db.add_all(
+            Message(forum_id=1, user_id=1, content=f"reply {i}", reply_to=1)
+            for i in range(size)
+        )
+        db.commit()
+        db.close()
+        results[size] = count_statements(client, counter, f"/message/forum/1?limit={size}")
+
+    assert len(set(results.values())) == 1, f"Số câu SQL thay đổi theo số reply: {results}"
+    return results
+
+
+def check_joined_forums(sizes=(5, 50, 200)):
+    results = {}
+    for size in sizes:
+        client, Session, counter = make_client([forum.router])
+        db = Session()
+        db.add_all(
+            User(user_id=i, username=f"u{i}", email=f"u{i}@example.com", password_hash="x")
+            for i in (1, 2)
+        )
+        for forum_id in range(1, size + 1):
+            db.add(Forum(forum_id=forum_id, name=f"f{forum_id}", created_by=1))
+            db.add(Membership(user_id=1, forum_id=forum_id))
+            db.add(Membership(user_id=2, forum_id=forum_id))
+            db.add_all(Message(forum_id=forum_id, user_id=2, content="hi") for _ in range(3))
+        db.commit()
+        db.close()
+        results[size] = count_statements(client, counter, "/forum/joined/1")
+
+    assert len(set(results.values())) == 1, f"Số câu SQL thay đổi theo số forum: {results}"
+    return results
+
+
+def main():
+    report = {
+        "message_history": check_message_history(),
+        "joined_forums": check_joined_forums(),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
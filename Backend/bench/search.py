@@ -0,0 +1,114 @@
+# bench/search.py
+# 📊 Đo độ trễ tìm kiếm forum trên dữ liệu giả lập
+# - memory_index: MemorySearchIndex (BM25, bỏ dấu) — backend dùng khi không có MySQL
+# - ilike_scan: cách cũ, 3 điều kiện ILIKE '%kw%' trả về mọi kết quả, trên SQLite (chỉ chạy khi có --baseline)
+# Chạy từ thư mục Backend:  python -m bench.search --forums 1000000 --queries 500
+import argparse
+import json
+import random
+import statistics
+import time
+
+from sqlalchemy import create_engine, or_
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+import models
+from models.forum import Forum
+from search_index import MemorySearchIndex
+
+# Âm tiết tiếng Việt giả lập (phụ âm đầu + vần có dấu + phụ âm cuối), tần suất theo phân phối Zipf
+INITIALS = ["", "b", "c", "ch", "d", "đ", "g", "gh", "h", "k", "kh", "l", "m", "n", "ng", "nh",
+            "p", "ph", "qu", "r", "s", "t", "th", "tr", "v", "x"]
+VOWELS = ["a", "à", "á", "ả", "ã", "ạ", "ă", "â", "e", "ê", "ế", "i", "o", "ô", "ơ", "ờ", "u", "ư",
+          "y", "oa", "uô", "ươ", "iê"]
+FINALS = ["", "c", "ch", "m", "n", "ng", "nh", "p", "t", "i", "o", "u"]
+VOCAB = sorted({i + v + f for i in INITIALS for v in VOWELS for f in FINALS})
+random.Random(0).shuffle(VOCAB)
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCAB))]
+TAGS = ["game", "music", "code", "travel", "food", "sport", "book", "tech", "pet", "fashion"]
+
+
+def fake_forum(rng, forum_id):
+    name = " ".join(rng.choices(VOCAB, WEIGHTS, k=3)) + f" {forum_id}"
+    caption = " ".join(rng.choices(VOCAB, WEIGHTS, k=10))
+    return forum_id, name, rng.choice(TAGS), caption
+
+
+def fake_query(rng):
+    words = rng.choices(VOCAB, WEIGHTS, k=rng.choice((1, 2)))
+    if rng.random() < 0.3:
+        words[-1] = words[-1][:2]  # gõ dở
+    return " ".join(words)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda p: samples[min(len(samples) - 1, int(p * len(samples)))]
+    return {
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+    }
+
+
+def bench_memory(forums, queries, limit):
+    index = MemorySearchIndex()
+    start = time.perf_counter()
+    for forum_id, name, tag, caption in forums:
+        index._add(forum_id, {"name": name, "tag": tag, "caption": caption}, update_vocab=False)
+    index._vocab = sorted(index._postings)
+    index.ready = True
+    build_seconds = time.perf_counter() - start
+
+    samples = []
+    for q in queries:
+        t = time.perf_counter()
+        index.search(None, q, 0, limit)
+        samples.append(time.perf_counter() - t)
+    return {"mode": "memory_index", "build_seconds": round(build_seconds, 2), **percentiles(samples)}
+
+
+def bench_ilike(forums, queries):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.bulk_insert_mappings(Forum, [
+        {"forum_id": fid, "name": name, "tag": tag, "caption": caption, "created_by": 1}
+        for fid, name, tag, caption in forums
+    ])
+    db.commit()
+
+    samples = []
+    for q in queries:
+        t = time.perf_counter()
+        db.query(Forum).filter(or_(
+            Forum.name.ilike(f"%{q}%"), Forum.tag.ilike(f"%{q}%"), Forum.caption.ilike(f"%{q}%")
+        )).all()
+        samples.append(time.perf_counter() - t)
+    db.close()
+    return {"mode": "ilike_scan", **percentiles(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--forums", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--baseline", action="store_true", help="đo thêm cách ILIKE cũ trên SQLite")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    forums = [fake_forum(rng, i) for i in range(1, args.forums + 1)]
+    queries = [fake_query(rng) for _ in range(args.queries)]
+
+    results = [bench_memory(forums, queries, args.limit)]
+    if args.baseline:
+        results.append(bench_ilike(forums, queries))
+    print(json.dumps({"forums": args.forums, "queries": args.queries, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# chat_hub.py
+# 🛰️ Hub phát tin nhắn chat cho /chat/ws/{forum_id}
+# - Mỗi worker giữ danh sách WebSocket của riêng nó
+# - Tin nhắn được publish qua 1 backend pub/sub để mọi worker (kể cả worker gửi) đều nhận
+#   và phát lại cho các client đang kết nối với mình
+# - Mỗi client có hàng đợi gửi riêng + task ghi riêng, client chậm bị ngắt khi hàng đợi đầy
+import asyncio
+import json
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi import WebSocket
+
+# Kênh pub/sub của mỗi forum có dạng chat:<forum_id>
+CHANNEL_PREFIX = "chat:"
+
+# Số tin tối đa được xếp hàng cho 1 client trước khi bị coi là client chậm
+SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", "100"))
+
+# 1013 = Try Again Later: client đọc không kịp
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# Mất kết nối Redis pub/sub: thử lại sau RETRY_DELAY giây, nhân đôi mỗi lần lỗi, tối đa RETRY_MAX_DELAY
+RETRY_DELAY = float(os.getenv("CHAT_BROKER_RETRY_DELAY", "1"))
+RETRY_MAX_DELAY = float(os.getenv("CHAT_BROKER_RETRY_MAX_DELAY", "30"))
+
+Handler = Callable[[int, str], Awaitable[None]]
+
+
+# ===============================
+# 🧪 Backend trong bộ nhớ (1 process / test)
+# ===============================
+class MemoryBroker:
+    """Broker giả lập trong bộ nhớ. Nhiều MemoryBackend dùng chung 1 broker = nhiều worker."""
+
+    def __init__(self):
+        self.subscribers: List[Handler] = []
+
+    async def publish(self, forum_id: int, data: str):
+        for handler in list(self.subscribers):
+            await handler(forum_id, data)
+
+
+class MemoryBackend:
+    def __init__(self, broker: Optional[MemoryBroker] = None):
+        self.broker = broker or MemoryBroker()
+        self._handler: Optional[Handler] = None
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+        self.broker.subscribers.append(handler)
+
+    async def stop(self):
+        if self._handler in self.broker.subscribers:
+            self.broker.subscribers.remove(self._handler)
+        self._handler = None
+
+    async def publish(self, forum_id: int, data: str):
+        await self.broker.publish(forum_id, data)
+
+
+# ===============================
+# 🔴 Backend Redis (nhiều worker / nhiều node)
+# ===============================
+class RedisBackend:
+    def __init__(self, url: str):
+        self.url = url
+        self._redis = None
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Handler):
+        # Chỉ cần cài redis khi thật sự dùng backend này
+        from redis import asyncio as aioredis
+
+        self._redis = aioredis.from_url(self.url, decode_responses=True)
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+        self._task = asyncio.create_task(self._listen(handler))
+
+    async def _listen(self, handler: Handler):
+        # Redis khởi động lại / mạng chập chờn: đăng ký lại chat:* thay vì im lặng ngừng nhận tin
+        delay = RETRY_DELAY
+        while True:
+            try:
+                if self._pubsub is None:
+                    self._pubsub = self._redis.pubsub()
+                    await self._pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                    print("✅ Đã kết nối lại Redis pub/sub")
+                async for msg in self._pubsub.listen():
+                    delay = RETRY_DELAY
+                    if msg.get("type") != "pmessage":
+                        continue
+                    try:
+                        forum_id = int(msg["channel"][len(CHANNEL_PREFIX):])
+                        await handler(forum_id, msg["data"])
+                    except Exception as e:
+                        print(f"❌ Lỗi khi nhận tin từ Redis: {e}")
+                raise ConnectionError("Redis pub/sub đã dừng")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Mất kết nối Redis pub/sub, thử lại sau {delay:g}s: {e}")
+                await self._close_pubsub()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+
+    async def _close_pubsub(self):
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub is not None:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass  # kết nối đã hỏng
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._close_pubsub()
+        if self._redis:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def publish(self, forum_id: int, data: str):
+        await self._redis.publish(f"{CHANNEL_PREFIX}{forum_id}", data)
+
+
+# ===============================
+# 📬 Kết nối có hàng đợi gửi riêng
+# ===============================
+class Connection:
+    def __init__(self, hub: "ChatHub", forum_id: int, websocket: WebSocket, max_queue: int):
+        self.hub = hub
+        self.forum_id = forum_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.closed = False
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, data: str) -> bool:
+        """Xếp tin vào hàng đợi, không chờ. Trả về False nếu hàng đợi đã đầy."""
+        try:
+            self.queue.put_nowait(data)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _write_loop(self):
+        try:
+            while True:
+                data = await self.queue.get()
+                await self.websocket.send_text(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Bỏ kết nối lỗi ở forum {self.forum_id}: {e}")
+            self.hub.evict(self, code=1011)
+
+    def stop(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+    async def close(self, code: int):
+        self.stop()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass  # socket đã đóng từ phía client
+
+
+# ===============================
+# 🧭 Hub
+# ===============================
+class ChatHub:
+    def __init__(self, backend=None, max_queue: int = SEND_QUEUE_SIZE):
+        self.backend = backend or MemoryBackend()
+        self.max_queue = max_queue
+        self.connections: Dict[int, Dict[WebSocket, Connection]] = {}
+        # Task đóng socket đang chạy: event loop chỉ giữ weak reference, không lưu thì có thể bị GC giữa chừng
+        self._closing: Set[asyncio.Task] = set()
+        self._started = False
+        self._start_lock = asyncio.Lock()
+
+    async def start(self):
+        async with self._start_lock:
+            if self._started:
+                return
+            await self.backend.start(self._deliver)
+            self._started = True
+
+    async def stop(self):
+        if self._started:
+            await self.backend.stop()
+            self._started = False
+
+    async def connect(self, forum_id: int, websocket: WebSocket):
+        await self.start()
+        conn = Connection(self, forum_id, websocket, self.max_queue)
+        self.connections.setdefault(forum_id, {})[websocket] = conn
+
+    def _remove(self, forum_id: int, websocket: WebSocket) -> Optional[Connection]:
+        conns = self.connections.get(forum_id)
+        if not conns:
+            return None
+        conn = conns.pop(websocket, None)
+        if not conns:
+            self.connections.pop(forum_id, None)
+        return conn
+
+    def disconnect(self, forum_id: int, websocket: WebSocket):
+        conn = self._remove(forum_id, websocket)
+        if conn:
+            conn.stop()
+
+    def evict(self, conn: Connection, code: int = SLOW_CONSUMER_CLOSE_CODE):
+        """Ngắt 1 client (chậm hoặc lỗi) mà không làm ảnh hưởng các client khác."""
+        self._remove(conn.forum_id, conn.websocket)
+        if not conn.closed:
+            task = asyncio.create_task(conn.close(code))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    async def publish(self, forum_id: int, payload: dict):
+        """Gửi payload tới mọi client của forum trên tất cả worker."""
+        await self.backend.publish(forum_id, json.dumps(payload))
+
+    async def _deliver(self, forum_id: int, data: str):
+        # Phát cho các client đang kết nối với worker này: chỉ xếp hàng, không chờ socket nào
+        for conn in list(self.connections.get(forum_id, {}).values()):
+            if not conn.send(data):
+                print(f"🐢 Client chậm ở forum {forum_id}, ngắt kết nối")
+                self.evict(conn)
+
+
+def create_hub() -> ChatHub:
+    # 🔧 CHAT_BROKER_URL=redis://localhost:6379/0 để chạy nhiều worker; bỏ trống = trong bộ nhớ
+    broker_url = os.getenv("CHAT_BROKER_URL", "")
+    if broker_url.startswith(("redis://", "rediss://")):
+        return ChatHub(RedisBackend(broker_url))
+    return ChatHub()
+
+
+hub = create_hub()
@@ -0,0 +1,119 @@
+# etag.py
+# 🏷️ ETag + conditional GET (If-None-Match → 304 Not Modified)
+# - ETag tính từ "dấu phiên bản" rẻ (User.updated_at, Forum.version): khớp thì trả 304 luôn,
+#   không chạy truy vấn nặng, không serialize, không gửi body
+# - Route không có dấu phiên bản: ETag = hash nội dung (vẫn tiết kiệm băng thông)
+# - Dấu phiên bản đã đọc được đưa vào key của @cached_route (response_cache.current_version):
+#   body cache và ETag cùng 1 phiên bản, không trả body cũ kèm ETag mới
+# - Cache-Control theo từng route: tham số decorator, ghi đè bằng biến môi trường
+#   CACHE_CONTROL_<TÊN_HÀM_ROUTE>, vd CACHE_CONTROL_GET_TOP_TAGS="public, max-age=60"
+import functools
+import hashlib
+import inspect
+import os
+from typing import Callable, Optional
+
+from fastapi import Request, Response
+
+from response_cache import current_version, render_json, route_key
+
+DEFAULT_CACHE_CONTROL = os.getenv("CACHE_CONTROL_DEFAULT", "no-cache")  # luôn hỏi lại server, dùng kèm ETag
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode("utf-8"), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {t.strip() for t in header.split(",")}
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def cache_control_for(route: str, default: Optional[str] = None) -> str:
+    return os.getenv(f"CACHE_CONTROL_{route.upper()}", default or DEFAULT_CACHE_CONTROL)
+
+
+def etag_route(version: Optional[Callable] = None, cache_control: Optional[str] = None):
+    """
+    Thêm ETag / If-None-Match cho 1 route GET (route phải có tham số request: Request).
+    version(db, **tham_số_route) trả về dấu phiên bản; None = không tìm thấy → để route tự báo 404.
+    Không truyền version thì ETag = hash body.
+    Đặt ngay dưới @router.get (trên @cached_route / @async_db_route).
+    """
+    def decorator(fn):
+        route = fn.__name__
+        header_value = cache_control_for(route, cache_control)
+        if not any(p.annotation is Request for p in inspect.signature(fn).parameters.values()):
+            raise TypeError(f"{route}: etag_route cần tham số request: Request")
+
+        def split(kwargs):
+            request = next(v for v in kwargs.values() if isinstance(v, Request))
+            params = {k: v for k, v in kwargs.items() if k != "db" and not isinstance(v, Request)}
+            return request, params
+
+        def version_etag(kwargs, marker) -> Optional[str]:
+            return None if marker is None else make_etag(route_key(route, kwargs), marker)
+
+        def finish(request: Request, result, etag: Optional[str]):
+            if not isinstance(result, Response):
+                result = Response(content=render_json(result), media_type="application/json")
+            elif not hasattr(result, "body"):
+                return result  # streaming: không tính ETag
+            etag = etag or body_etag(result.body)
+            headers = {"ETag": etag, "Cache-Control": header_value}
+            if etag_matches(request, etag):
+                return Response(status_code=304, headers=headers)
+            result.headers.update(headers)
+            return result
+
+        def not_modified(etag: str):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": header_value})
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(**kwargs):
+                request, params = split(kwargs)
+                etag = None
+                if version is not None:
+                    marker = await kwargs["db"].run_sync(lambda session: version(session, **params))
+                    etag = version_etag(kwargs, marker)
+                    if etag and etag_matches(request, etag):
+                        return not_modified(etag)
+                    token = current_version.set(marker)
+                    try:
+                        result = await fn(**kwargs)
+                    finally:
+                        current_version.reset(token)
+                    return finish(request, result, etag)
+                return finish(request, await fn(**kwargs), etag)
+        else:
+            @functools.wraps(fn)
+            def wrapper(**kwargs):
+                request, params = split(kwargs)
+                etag = None
+                if version is not None:
+                    marker = version(kwargs["db"], **params)
+                    etag = version_etag(kwargs, marker)
+                    if etag and etag_matches(request, etag):
+                        return not_modified(etag)
+                    token = current_version.set(marker)
+                    try:
+                        result = fn(**kwargs)
+                    finally:
+                        current_version.reset(token)
+                    return finish(request, result, etag)
+                return finish(request, fn(**kwargs), etag)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,204 @@
+# firebase_tokens.py
+# 🔥 Xác thực Firebase ID token không chặn event loop (thay firebase_admin.auth.verify_id_token)
+# - Khoá công khai (chứng chỉ x509 theo kid) của Google giữ trong bộ nhớ, parse sẵn 1 lần
+# - Hết hạn theo Cache-Control: max-age của Google; task nền làm mới trước FIREBASE_CERTS_REFRESH_MARGIN giây,
+#   lỗi mạng thì giữ khoá cũ và thử lại sau (backoff), request không phải chờ tải chứng chỉ
+# - Gặp kid lạ (Google vừa xoay khoá) → tải lại ngay, tối đa 1 lần / FIREBASE_CERTS_MIN_REFRESH giây
+# - Kiểm tra chữ ký RS256 chạy trong threadpool; kiểm tra aud / iss / exp / iat / auth_time / sub
+#   như firebase_admin, trả về claims kèm "uid" (= sub)
+# - FIREBASE_CERTS_URL trỏ được tới file:///.../certs.json (bộ khoá giả lập, không cần mạng);
+#   hoặc truyền fetch=... vào FirebaseVerifier
+# Chạy thử:  python -m firebase_tokens <id_token>   (từ thư mục Backend)
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+import urllib.request
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from jose import jwk, jwt
+from jose.exceptions import JOSEError
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+CERTS_URL = os.getenv("FIREBASE_CERTS_URL", GOOGLE_CERTS_URL)
+DEFAULT_MAX_AGE = float(os.getenv("FIREBASE_CERTS_DEFAULT_MAX_AGE", "3600"))  # khi không có Cache-Control
+REFRESH_MARGIN = float(os.getenv("FIREBASE_CERTS_REFRESH_MARGIN", "300"))
+MIN_REFRESH_SECONDS = float(os.getenv("FIREBASE_CERTS_MIN_REFRESH", "60"))
+RETRY_DELAY = float(os.getenv("FIREBASE_CERTS_RETRY_DELAY", "5"))
+FETCH_TIMEOUT = float(os.getenv("FIREBASE_CERTS_TIMEOUT", "10"))
+CLOCK_SKEW = 60  # giây lệch đồng hồ chấp nhận cho iat / auth_time
+SERVICE_ACCOUNT_FILE = os.path.join(os.getcwd(), "firebase-service-account.json")
+
+
+class InvalidFirebaseToken(ValueError):
+    pass
+
+
+def default_project_id() -> Optional[str]:
+    project_id = os.getenv("FIREBASE_PROJECT_ID")
+    if project_id:
+        return project_id
+    try:
+        with open(SERVICE_ACCOUNT_FILE) as f:
+            return json.load(f).get("project_id")
+    except (OSError, ValueError):
+        return None
+
+
+def fetch_certs(url: str = CERTS_URL) -> Tuple[Dict[str, str], float]:
+    """Tải {kid: chứng chỉ PEM} + số giây được cache (đồng bộ, gọi trong threadpool)."""
+    with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT) as response:
+        certs = json.load(response)
+        cache_control = response.headers.get("Cache-Control", "") if response.headers else ""
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return certs, float(match.group(1)) if match else DEFAULT_MAX_AGE
+
+
+class FirebaseVerifier:
+    def __init__(self, project_id: Optional[str] = None, fetch: Callable[[], Tuple[Dict[str, str], float]] = fetch_certs):
+        self.project_id = project_id or default_project_id()
+        self.fetch = fetch
+        self.keys: Dict[str, object] = {}
+        self.expires_at = 0.0
+        self.fetched_at = float("-inf")
+        self.retry_at = 0.0  # sau lần tải lỗi, không thử lại trước mốc này
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    # ===============================
+    # 🔑 Cache khoá công khai
+    # ===============================
+    async def refresh(self):
+        async with self._lock:
+            await self._refresh_locked()
+
+    async def _refresh_locked(self):
+        certs, max_age = await run_in_threadpool(self.fetch)
+        # Parse chứng chỉ 1 lần ở đây, không parse lại mỗi lần verify
+        keys = await run_in_threadpool(lambda: {kid: jwk.construct(pem, "RS256") for kid, pem in certs.items()})
+        self.keys = keys
+        now = time.monotonic()
+        self.fetched_at = now
+        self.expires_at = now + max_age
+        self.refreshes += 1
+
+    async def _key_for(self, kid: str):
+        now = time.monotonic()
+        key = self.keys.get(kid)
+        if key is not None and now < self.expires_at:
+            return key
+        async with self._lock:
+            # Request khác có thể đã tải xong trong lúc chờ lock
+            now = time.monotonic()
+            key = self.keys.get(kid)
+            if key is not None and now < self.expires_at:
+                return key
+            stale = now >= self.expires_at or now - self.fetched_at >= MIN_REFRESH_SECONDS
+            if stale and now >= self.retry_at:
+                try:
+                    await self._refresh_locked()
+                except Exception as e:
+                    self.refresh_errors += 1
+                    self.retry_at = time.monotonic() + RETRY_DELAY
+                    # Khoá cũ vẫn dùng được tạm khi Google không trả lời
+                    if key is None:
+                        raise InvalidFirebaseToken(f"Không tải được khoá công khai Firebase: {e}")
+                    print("⚠️ Không làm mới được khoá Firebase, dùng khoá cũ:", e)
+                    return key
+            key = self.keys.get(kid)
+        if key is None:
+            raise InvalidFirebaseToken("Token ký bằng khoá không xác định (kid)")
+        return key
+
+    async def _refresh_loop(self):
+        delay = RETRY_DELAY
+        while True:
+            wait = 0.0
+            if self.keys:
+                # max-age ngắn hơn REFRESH_MARGIN → làm mới ở nửa thời hạn, không quay vòng liên tục
+                lifetime = self.expires_at - self.fetched_at
+                wait = max(self.expires_at - REFRESH_MARGIN, self.fetched_at + lifetime / 2) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                await self.refresh()
+                delay = RETRY_DELAY
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.refresh_errors += 1
+                print(f"⚠️ Làm mới khoá Firebase lỗi, thử lại sau {delay:.0f}s:", e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, REFRESH_MARGIN)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ===============================
+    # ✅ Xác thực token
+    # ===============================
+    def _decode(self, token: str, key) -> dict:
+        issuer = f"https://securetoken.google.com/{self.project_id}"
+        try:
+            claims = jwt.decode(token, key, algorithms=["RS256"], audience=self.project_id, issuer=issuer)
+        except JOSEError as e:
+            raise InvalidFirebaseToken(str(e))
+
+        now = time.time()
+        sub = claims.get("sub")
+        if not isinstance(sub, str) or not sub or len(sub) > 128:
+            raise InvalidFirebaseToken("Claim sub không hợp lệ")
+        for claim in ("iat", "auth_time"):
+            value = claims.get(claim)
+            if not isinstance(value, (int, float)) or value > now + CLOCK_SKEW:
+                raise InvalidFirebaseToken(f"Claim {claim} không hợp lệ")
+        claims["uid"] = sub
+        return claims
+
+    async def verify(self, token: str) -> dict:
+        if not self.project_id:
+            raise InvalidFirebaseToken("Chưa cấu hình project Firebase (FIREBASE_PROJECT_ID)")
+        try:
+            header = jwt.get_unverified_header(token)
+        except JOSEError as e:
+            raise InvalidFirebaseToken(str(e))
+        if header.get("alg") != "RS256" or not header.get("kid"):
+            raise InvalidFirebaseToken("Header token không hợp lệ (alg / kid)")
+        key = await self._key_for(header["kid"])
+        return await run_in_threadpool(self._decode, token, key)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "project_id": self.project_id,
+            "keys": len(self.keys),
+            "expires_in": round(self.expires_at - now, 1) if self.keys else None,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+        }
+
+
+firebase_verifier = FirebaseVerifier()
+
+
+if __name__ == "__main__":
+    async def _main(token):
+        claims = await firebase_verifier.verify(token)
+        print(json.dumps(claims, indent=2, ensure_ascii=False))
+
+    asyncio.run(_main(sys.argv[1]))
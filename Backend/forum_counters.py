@@ -0,0 +1,78 @@
+# forum_counters.py
+# 🔢 Bộ đếm lưu sẵn trên bảng forum: member_count, like_count, message_count
+# - Các route ghi (join/leave/add/remove, like, gửi tin) cộng/trừ trong cùng transaction
+# - reconcile_counts() tính lại toàn bộ từ bảng gốc khi cần sửa lệch
+# - Forum.version tăng theo member_count / like_count (hiện ở chi tiết forum, danh sách thành viên → ETag)
+# Chạy đồng bộ lại:  python -m forum_counters   (từ thư mục Backend)
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models.forum import Forum
+from models.membership import Membership
+from models.like import Like
+from models.message import Message
+
+
+# message_count không hiển thị ở các route có ETag → không cần đổi version mỗi tin nhắn
+VERSIONED_COUNTERS = {"member_count", "like_count"}
+
+
+def bump(db: Session, forum_id: int, column, delta: int = 1):
+    """Cộng delta vào 1 cột đếm bằng UPDATE nguyên tử (không đọc-rồi-ghi). Chưa commit."""
+    values = {column: column + delta}
+    if column.key in VERSIONED_COUNTERS:
+        values[Forum.version] = Forum.version + 1
+    db.query(Forum).filter(Forum.forum_id == forum_id).update(values, synchronize_session=False)
+
+
+def touch(db: Session, forum_id: int):
+    """Tăng Forum.version khi sửa thông tin forum. Chưa commit."""
+    db.query(Forum).filter(Forum.forum_id == forum_id).update(
+        {Forum.version: Forum.version + 1}, synchronize_session=False
+    )
+
+
+def forum_version(db: Session, forum_id: int, **_):
+    """Dấu phiên bản cho ETag (xem etag.py); None nếu forum không tồn tại."""
+    return db.query(Forum.version).filter(Forum.forum_id == forum_id).scalar()
+
+
+def reconcile_counts(db: Session):
+    """Tính lại cả 3 cột đếm cho mọi forum từ membership / like / message."""
+    member_count = (
+        select(func.count(Membership.membership_id))
+        .where(Membership.forum_id == Forum.forum_id)
+        .scalar_subquery()
+    )
+    like_count = (
+        select(func.count(Like.like_id))
+        .where(Like.forum_id == Forum.forum_id)
+        .scalar_subquery()
+    )
+    message_count = (
+        select(func.count(Message.message_id))
+        .where(Message.forum_id == Forum.forum_id)
+        .scalar_subquery()
+    )
+    updated = db.query(Forum).update(
+        {
+            Forum.member_count: member_count,
+            Forum.like_count: like_count,
+            Forum.message_count: message_count,
+            Forum.version: Forum.version + 1,
+        },
+        synchronize_session=False
+    )
+    db.commit()
+    return updated
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    import models
+
+    db = SessionLocal()
+    try:
+        print(f"✅ Đã đồng bộ bộ đếm cho {reconcile_counts(db)} forum")
+    finally:
+        db.close()
@@ -0,0 +1,121 @@
+# identity.py
+# 🪪 Người dùng hiện tại lấy từ JWT do my_utils.create_token cấp (signin / firebase-login)
+# - current_user: dependency cho route cần đăng nhập, đọc header "Authorization: Bearer <token>"
+#   (WebSocket không gửi được header → ?token=..., xem websocket_user)
+# - Claims đã giải mã cache trong LRU giới hạn TOKEN_CACHE_SIZE, khoá = token, tự hết hạn theo exp của token:
+#   request sau chỉ tra 1 dict, không giải mã lại, không truy vấn bảng user
+# - Token thiếu / sai / hết hạn → 401; đăng nhập rồi nhưng thao tác thay người khác → 403 (require_self)
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Depends, HTTPException, WebSocket
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import jwt
+from jose.exceptions import JOSEError
+
+import my_utils
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    user_id: int
+    username: str
+    email: Optional[str] = None
+
+
+class ClaimsCache:
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()  # token → (CurrentUser, exp)
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        with self._lock:
+            item = self._items.get(token)
+            if item is None:
+                self.misses += 1
+                return None
+            user, exp = item
+            if exp <= time.time():
+                del self._items[token]
+                self.misses += 1
+                return None
+            self._items.move_to_end(token)
+            self.hits += 1
+            return user
+
+    def put(self, token: str, user: CurrentUser, exp: float):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[token] = (user, exp)
+            self._items.move_to_end(token)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._items), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+claims_cache = ClaimsCache()
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+def user_from_token(token: str) -> CurrentUser:
+    user = claims_cache.get(token)
+    if user is not None:
+        return user
+    try:
+        claims = jwt.decode(token, my_utils.SECRET_KEY, algorithms=[my_utils.ALGORITHM])
+    except JOSEError:
+        raise _unauthorized("Phiên đăng nhập không hợp lệ hoặc đã hết hạn")
+    try:
+        user = CurrentUser(user_id=int(claims["id"]), username=claims["username"], email=claims.get("email"))
+        exp = float(claims["exp"])
+    except (KeyError, TypeError, ValueError):
+        raise _unauthorized("Token thiếu thông tin người dùng")
+    claims_cache.put(token, user, exp)
+    return user
+
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+async def current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> CurrentUser:
+    if credentials is None:
+        raise _unauthorized("Bạn cần đăng nhập")
+    return user_from_token(credentials.credentials)
+
+
+def websocket_user(websocket: WebSocket) -> Optional[CurrentUser]:
+    """Người dùng của kết nối WebSocket (?token=... hoặc header Authorization), None nếu không hợp lệ."""
+    token = websocket.query_params.get("token")
+    if not token:
+        scheme, _, token = websocket.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer":
+            return None
+    try:
+        return user_from_token(token)
+    except HTTPException:
+        return None
+
+
+def require_self(user: CurrentUser, user_id: int):
+    if user.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Bạn không có quyền thao tác thay người dùng khác")
+
+
+def issue_token(user_id: int, username: str, email: Optional[str]) -> str:
+    return my_utils.create_token({"id": user_id, "email": email, "username": username})
@@ -0,0 +1,251 @@
+# image_variants.py
+# 🖼️ Ảnh thu nhỏ + bản WebP cho background forum và avatar
+# - Route upload chỉ xếp việc vào hàng đợi (enqueue), worker nền resize/encode trong threadpool
+#   → request không phải đợi Pillow
+# - Bản phái sinh nằm cạnh file gốc trong kho (storage.py): <digest>.<tên>.webp
+#   Cùng nội dung → cùng bản phái sinh, làm 1 lần; storage.remove_files() xoá kèm khi hết tham chiếu
+# - Lỗi tạm thời (I/O, DB) thử lại với backoff; ảnh hỏng / không đọc được thì bỏ qua
+# - Chưa có bản phái sinh (đang xử lý, thiếu Pillow, file cũ ngoài kho) → API trả *_variants = null,
+#   client dùng ảnh gốc như trước
+# Tạo bù cho ảnh đã có:  python -m image_variants   (từ thư mục Backend)
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+import storage
+from database import SessionLocal
+from response_cache import invalidate
+
+# tên → (rộng, cao, cắt cho vừa khung). Không cắt = thu nhỏ giữ tỉ lệ trong khung, không phóng to
+VARIANTS = {
+    "thumb": (160, 160, True),   # avatar, ô nhỏ
+    "card": (640, 360, True),    # thẻ forum ở trang chủ / danh sách
+    "large": (1280, 1280, False),  # trang chi tiết
+}
+WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(40_000_000)))  # chặn "decompression bomb"
+
+WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+QUEUE_SIZE = int(os.getenv("IMAGE_QUEUE_SIZE", "1000"))
+MAX_ATTEMPTS = int(os.getenv("IMAGE_MAX_ATTEMPTS", "4"))
+RETRY_DELAY = float(os.getenv("IMAGE_RETRY_DELAY", "2"))  # giây, nhân đôi sau mỗi lần lỗi
+
+
+class BadImage(Exception):
+    """File không phải ảnh / ảnh hỏng / quá lớn: thử lại cũng vô ích."""
+
+
+def variant_path(path: str, name: str) -> str:
+    """Đường dẫn (tính từ static/) của bản phái sinh."""
+    return f"{os.path.splitext(path)[0]}.{name}.webp"
+
+
+def has_variants(path: Optional[str]) -> bool:
+    if not path or not path.startswith(storage.BLOB_PREFIX + "/"):
+        return False
+    # Các bản được ghi theo thứ tự VARIANTS → có bản cuối là đủ cả
+    last = variant_path(path, next(reversed(VARIANTS)))
+    return os.path.isfile(os.path.join(storage.STATIC_DIR, last))
+
+
+def variant_urls(base_url: str, path: Optional[str]) -> Optional[Dict[str, str]]:
+    """{"thumb": url, "card": url, "large": url} nếu đã tạo xong, ngược lại None."""
+    if not has_variants(path):
+        return None
+    return {name: f"{base_url}/static/{variant_path(path, name)}" for name in VARIANTS}
+
+
+# ===============================
+# 🧮 Resize + encode (chạy trong thread)
+# ===============================
+def _load_pillow():
+    from PIL import Image, ImageOps
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    return Image, ImageOps
+
+
+def render(path: str) -> bool:
+    """Tạo các bản còn thiếu cho 1 ảnh trong kho. False nếu file gốc không còn."""
+    Image, ImageOps = _load_pillow()
+    source = os.path.join(storage.STATIC_DIR, path)
+    if not os.path.isfile(source):
+        return False
+
+    try:
+        with Image.open(source) as img:
+            img = ImageOps.exif_transpose(img)  # ảnh chụp điện thoại: xoay theo EXIF
+            img.load()
+    except FileNotFoundError:
+        return False  # bị xoá giữa lúc kiểm tra và lúc mở
+    except (Image.UnidentifiedImageError, Image.DecompressionBombError, SyntaxError, OSError) as e:
+        # OSError: file cụt ("image file is truncated"), lỗi giải mã → thử lại cũng vậy
+        raise BadImage(str(e)) from e
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+
+    for name, (width, height, crop) in VARIANTS.items():
+        target = os.path.join(storage.STATIC_DIR, variant_path(path, name))
+        if os.path.exists(target):
+            continue
+        if crop:
+            # Ảnh nhỏ hơn khung: thu khung lại (giữ tỉ lệ khung), không phóng to ảnh
+            scale = min(1.0, img.width / width, img.height / height)
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            out = ImageOps.fit(img, size, Image.Resampling.LANCZOS)
+        else:
+            out = img.copy()
+            out.thumbnail((width, height), Image.Resampling.LANCZOS)
+        tmp = target + ".tmp"
+        out.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+        os.replace(tmp, target)
+    return True
+
+
+# ===============================
+# 🧵 Hàng đợi + worker nền
+# ===============================
+@dataclass
+class ImageJob:
+    path: str
+    on_ready: Optional[Callable[[Session], None]] = None
+    tags: Iterable[str] = ()
+    attempt: int = 0
+    rendered: bool = False
+
+
+class ImageWorker:
+    def __init__(self, session_factory=SessionLocal, workers: int = WORKERS, queue_size: int = QUEUE_SIZE):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.queue_size = queue_size
+        self.available: Optional[bool] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._retries = set()
+        self._stats = {"done": 0, "retried": 0, "failed": 0, "dropped": 0}
+
+    async def start(self):
+        if self._tasks:
+            return
+        if self.available is None:
+            try:
+                _load_pillow()
+                self.available = True
+            except ImportError:
+                self.available = False
+                print("⚠️ Chưa cài Pillow → không tạo ảnh thu nhỏ (pip install Pillow)")
+        if not self.available:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Dừng worker. Việc còn trong hàng đợi bị bỏ — chạy python -m image_variants để tạo bù."""
+        for task in [*self._tasks, *self._retries]:
+            task.cancel()
+        self._tasks = []
+        self._retries = set()
+
+    async def enqueue(self, path: Optional[str], on_ready: Optional[Callable[[Session], None]] = None,
+                      tags: Iterable[str] = ()):
+        """
+        Xếp 1 ảnh (path tính từ static/) vào hàng đợi; không đợi xử lý xong.
+        Xong thì chạy on_ready(db) + commit, rồi xoá cache theo tags.
+        """
+        if not path or not path.startswith(storage.BLOB_PREFIX + "/") or has_variants(path):
+            return
+        await self.start()
+        if not self.available:
+            return
+        self._put(ImageJob(path=path, on_ready=on_ready, tags=tuple(tags)))
+
+    def _put(self, job: ImageJob):
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+            print(f"⚠️ Hàng đợi ảnh đầy, bỏ qua {job.path}")
+
+    async def _retry_later(self, job: ImageJob):
+        await asyncio.sleep(RETRY_DELAY * 2 ** (job.attempt - 1))
+        self._put(job)
+
+    def _schedule_retry(self, job: ImageJob):
+        task = asyncio.create_task(self._retry_later(job))
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                if not job.rendered:
+                    if not await loop.run_in_executor(None, render, job.path):
+                        continue  # ảnh đã bị xoá trước khi tới lượt
+                    job.rendered = True
+                if job.on_ready is not None:
+                    await loop.run_in_executor(None, self._mark_ready, job.on_ready)
+                invalidate(*job.tags)
+                self._stats["done"] += 1
+            except BadImage as e:
+                self._stats["failed"] += 1
+                print(f"⚠️ Không xử lý được ảnh {job.path}: {e}")
+            except Exception as e:
+                job.attempt += 1
+                if job.attempt >= MAX_ATTEMPTS:
+                    self._stats["failed"] += 1
+                    print(f"❌ Bỏ ảnh {job.path} sau {job.attempt} lần lỗi: {e}")
+                else:
+                    self._stats["retried"] += 1
+                    print(f"⚠️ Lỗi xử lý ảnh {job.path} (lần {job.attempt}), thử lại: {e}")
+                    self._schedule_retry(job)
+            finally:
+                self._queue.task_done()
+
+    def _mark_ready(self, on_ready: Callable[[Session], None]):
+        # Chạy trong thread: callback (đổi version / updated_at để ETag đổi) trong 1 transaction riêng
+        db = self.session_factory()
+        try:
+            on_ready(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            "available": self.available,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "retrying": len(self._retries),
+            **self._stats,
+        }
+
+
+image_worker = ImageWorker()
+
+
+if __name__ == "__main__":
+    import models
+    from models.stored_file import StoredFile
+
+    db = SessionLocal()
+    try:
+        paths = [
+            p for (p,) in db.query(StoredFile.path).filter(StoredFile.content_type.like("image/%"))
+            if not has_variants(p)
+        ]
+    finally:
+        db.close()
+    made = 0
+    for p in paths:
+        try:
+            made += render(p)
+        except BadImage as e:
+            print(f"⚠️ Bỏ qua {p}: {e}")
+    print(f"✅ Đã tạo ảnh thu nhỏ cho {made}/{len(paths)} file (cache response hết hạn theo TTL)")
@@ -1,8 +1,22 @@
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, RedirectResponse
-from database import Base, engine
+from fastapi.responses import FileResponse, RedirectResponse, JSONResponse, PlainTextResponse
+from database import Base, engine, async_engine, SessionLocal, pool_status, replicas, mark_primary_sticky, WRITE_METHODS
+from sqlalchemy import text
+from chat_hub import hub
+from message_writer import message_writer
+from trending import run_compaction
+from user_index import run_rebuild as rebuild_user_index
+from search_index import run_rebuild as rebuild_search_index
+from response_cache import response_cache
+import storage
+from image_variants import image_worker
+from password_pool import password_pool
+from firebase_tokens import firebase_verifier
+from static_files import StaticAssets, static_app
+import metrics
+import my_utils
+import asyncio
 from routers.auth import router as auth_router
 from routers.forum import router as forum_router
 from routers.profile import router as profile_router
@@ -19,10 +33,10 @@ FRONTEND_DIR = os.path.join(BASE_DIR, "../Frontend")
 print("📂 FRONTEND_DIR:", FRONTEND_DIR)
 
 if os.path.exists(FRONTEND_DIR):
-    app.mount("/Frontend", StaticFiles(directory=FRONTEND_DIR), name="frontend")
+    app.mount("/Frontend", StaticAssets(directory=FRONTEND_DIR), name="frontend")
 
 if os.path.exists("static"):
-    app.mount("/static", StaticFiles(directory="static"), name="static")
+    app.mount("/static", static_app("static"), name="static")
 
 # ===============================
 # ⚙️ Cấu hình CORS
@@ -35,6 +49,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ===============================
+# 📦 Chặn upload quá lớn trước khi nhận body (Content-Length)
+# ===============================
+# Phần dư cho các trường form khác + boundary của multipart
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        try:
+            length = int(request.headers.get("content-length", "0"))
+        except ValueError:
+            length = 0
+        if length > storage.UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD:
+            limit_mb = storage.UPLOAD_MAX_BYTES // (1024 * 1024)
+            return JSONResponse(status_code=413, content={"detail": f"File quá lớn (tối đa {limit_mb} MB)"})
+    return await call_next(request)
+
+# ===============================
+# 📚 Read-your-writes: sau khi ghi thành công, client đọc từ primary một lúc
+# ===============================
+if replicas:
+    @app.middleware("http")
+    async def stick_to_primary_after_write(request: Request, call_next):
+        response = await call_next(request)
+        if request.method in WRITE_METHODS and response.status_code < 400:
+            mark_primary_sticky(response)
+        return response
+
+# ===============================
+# 📈 Đo độ trễ + số câu SQL mỗi request (thêm sau cùng → bọc ngoài cùng, đo cả các middleware trên)
+# ===============================
+app.add_middleware(metrics.MetricsMiddleware)
+
 # ===============================
 # 🧠 Tạo bảng nếu có DB (bỏ qua nếu fail)
 # ===============================
@@ -58,6 +106,79 @@ app.include_router(tag.router)
 
 print("✅ Routers loaded successfully!")
 
+# ===============================
+# 🛰️ Chat hub (pub/sub giữa các worker) + bộ ghi tin nhắn theo lô
+# 🔥 Build lại bảng trending + chỉ mục username / tìm kiếm (bộ nhớ) định kỳ
+# ===============================
+@app.on_event("startup")
+async def start_background_tasks():
+    my_utils.require_secret_key()  # 🔑 thiếu JWT_SECRET_KEY → không khởi động
+    await hub.start()
+    await message_writer.start()
+    await image_worker.start()
+    await password_pool.start()
+    await firebase_verifier.start()
+    app.state.trending_task = asyncio.create_task(run_compaction(SessionLocal))
+    app.state.user_index_task = asyncio.create_task(rebuild_user_index(SessionLocal))
+    app.state.search_index_task = asyncio.create_task(rebuild_search_index(SessionLocal))
+    storage.ensure_tmp_dir()  # trước request upload đầu tiên
+    asyncio.get_running_loop().run_in_executor(None, storage.sweep_tmp)
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    app.state.trending_task.cancel()
+    app.state.user_index_task.cancel()
+    app.state.search_index_task.cancel()
+    await message_writer.stop()
+    await image_worker.stop()
+    await password_pool.stop()
+    await firebase_verifier.stop()
+    await hub.stop()
+
+# ===============================
+# 🩺 Tình trạng DB + thống kê connection pool
+# - Mọi /health/* lộ cấu hình, số liệu nội bộ → cùng quyền với /metrics (metrics.authorize)
+# ===============================
+@app.get("/health/db", dependencies=[Depends(metrics.authorize)])
+def database_health():
+    result = {"ok": True, "engine": pool_status(engine)}
+    if async_engine is not None:
+        result["async_engine"] = pool_status(async_engine.sync_engine)
+    if replicas:
+        result["replicas"] = replicas.status()
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        result.update(ok=False, error=str(e))
+    return result
+
+# 🗄️ Thống kê cache response (hit ratio, độ trễ hit/miss theo route)
+@app.get("/health/cache", dependencies=[Depends(metrics.authorize)])
+def cache_health():
+    return response_cache.stats()
+
+# 🖼️ Hàng đợi tạo ảnh thu nhỏ (image_variants.py)
+@app.get("/health/images", dependencies=[Depends(metrics.authorize)])
+def image_health():
+    return image_worker.stats()
+
+# 🔐 Pool băm mật khẩu (password_pool.py)
+@app.get("/health/passwords", dependencies=[Depends(metrics.authorize)])
+def password_health():
+    return password_pool.stats()
+
+# 🔥 Khoá công khai Firebase đang cache (firebase_tokens.py)
+@app.get("/health/firebase", dependencies=[Depends(metrics.authorize)])
+def firebase_health():
+    return firebase_verifier.stats()
+
+# 📈 Prometheus scrape (METRICS_TOKEN, xem metrics.authorize)
+@app.get("/metrics")
+def prometheus_metrics(request: Request):
+    metrics.authorize(request)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # ===============================
 # 🌐 Trang chủ → home-page
 # ===============================
@@ -0,0 +1,142 @@
+# message_writer.py
+# 💾 Ghi tin nhắn chat theo lô, ngoài event loop
+# - Handler WebSocket chỉ xếp tin vào hàng đợi rồi await kết quả (message_id)
+# - 1 task nền gom các tin đang chờ thành 1 lô, ghi trong thread riêng bằng 1 câu INSERT nhiều dòng + 1 lần commit
+# - Lô lỗi (vd 1 dòng vi phạm khoá ngoại) → ghi lại từng dòng, chỉ người gửi dòng lỗi nhận exception
+import asyncio
+import os
+from typing import List, Optional, Union
+
+from sqlalchemy import insert, text
+
+from database import SessionLocal
+from forum_counters import bump
+from models.forum import Forum
+from models.message import Message
+
+BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "200"))
+# Thời gian chờ thêm (giây) để gom lô khi hàng đợi chưa đủ; 0 = chỉ gom những gì đang có
+BATCH_LINGER = float(os.getenv("CHAT_WRITE_LINGER", "0.002"))
+
+
+class MessageWriter:
+    def __init__(self, session_factory=SessionLocal, batch_size: int = BATCH_SIZE, linger: float = BATCH_LINGER):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.linger = linger
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._id_step: Optional[int] = None  # MySQL @@auto_increment_increment, đọc 1 lần
+
+    async def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Ghi nốt các tin còn trong hàng đợi rồi dừng task nền."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        self._task = None
+
+    async def write(self, **values) -> int:
+        """Lưu 1 tin nhắn, trả về message_id sau khi lô chứa nó đã commit."""
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((values, future))
+        return await future
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            rows = [values for values, _ in batch]
+            try:
+                try:
+                    results = await loop.run_in_executor(None, self._insert_batch, rows)
+                except Exception as e:
+                    print(f"⚠️ Lỗi khi ghi lô {len(batch)} tin nhắn, ghi lại từng tin: {e}")
+                    results = await loop.run_in_executor(None, self._insert_each, rows)
+                for (_, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+            except Exception as e:
+                print(f"❌ Lỗi khi ghi lô {len(batch)} tin nhắn: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _insert_rows(self, db, rows: List[dict]) -> List[int]:
+        """1 câu INSERT cho cả lô, trả về message_id theo đúng thứ tự rows."""
+        dialect = db.get_bind().dialect
+        if dialect.insert_returning:
+            # SQLite / PostgreSQL / MariaDB: INSERT ... VALUES (...), (...) RETURNING message_id
+            result = db.execute(
+                insert(Message).returning(Message.message_id, sort_by_parameter_order=True), rows
+            )
+            return list(result.scalars())
+        # MySQL không có RETURNING: 1 câu INSERT nhiều VALUES, lastrowid = id của dòng ĐẦU;
+        # InnoDB cấp id liên tiếp cho 1 câu INSERT biết trước số dòng, bước nhảy = auto_increment_increment
+        if self._id_step is None:
+            self._id_step = int(db.execute(text("SELECT @@auto_increment_increment")).scalar() or 1)
+        first = db.execute(insert(Message).values(rows)).lastrowid
+        return [first + i * self._id_step for i in range(len(rows))]
+
+    def _insert_batch(self, rows: List[dict]) -> List[int]:
+        # Chạy trong thread: 1 session, 1 transaction cho cả lô
+        db = self.session_factory()
+        try:
+            ids = self._insert_rows(db, rows)
+            # 🔢 Cập nhật message_count 1 lần cho mỗi forum trong lô
+            per_forum = {}
+            for row in rows:
+                per_forum[row["forum_id"]] = per_forum.get(row["forum_id"], 0) + 1
+            for forum_id, count in per_forum.items():
+                bump(db, forum_id, Forum.message_count, count)
+            db.commit()
+            return ids
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _insert_each(self, rows: List[dict]) -> List[Union[int, Exception]]:
+        """Ghi từng dòng (transaction riêng) sau khi cả lô lỗi: dòng hỏng không kéo theo dòng khác."""
+        results = []
+        for row in rows:
+            try:
+                results.append(self._insert_batch([row])[0])
+            except Exception as e:
+                results.append(e)
+        return results
+
+message_writer = MessageWriter()
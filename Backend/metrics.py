@@ -0,0 +1,265 @@
+# metrics.py
+# 📈 Đo hiệu năng theo request + endpoint /metrics (định dạng text của Prometheus, không cần thư viện ngoài)
+# - MetricsMiddleware (ASGI thuần, bọc ngoài cùng): histogram độ trễ theo (method, route, status),
+#   tính tới lúc gửi xong body (kể cả StreamingResponse)
+# - Số câu SQL + thời gian DB của từng request: event trên engine (database.instrument_engine)
+#   cộng vào current_request_sql → histogram số câu SQL theo route
+# - Request chậm (> SLOW_REQUEST_MS) hoặc nhiều câu SQL (> SLOW_REQUEST_STATEMENTS) → in log kèm số câu SQL,
+#   N+1 lộ ra ngay
+# - render(): thêm connection pool (pool_status), cache response, hàng đợi ảnh, pool băm mật khẩu, cache token
+# - /metrics và /health/* cần "Authorization: Bearer $METRICS_TOKEN" (bearer_token trong cấu hình scrape
+#   của Prometheus); không đặt METRICS_TOKEN thì chỉ nhận request từ localhost
+import bisect
+import hmac
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from fastapi import HTTPException, Request
+
+from database import (
+    RequestSQL, current_request_sql, sql_stats, engine, async_engine, replicas, pool_status, WAIT_BUCKETS_MS
+)
+from response_cache import response_cache
+from image_variants import image_worker
+from password_pool import password_pool
+from identity import claims_cache
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_REQUEST_STATEMENTS = int(os.getenv("SLOW_REQUEST_STATEMENTS", "30"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series: Dict[tuple, list] = {}  # nhãn → [đếm từng bucket..., +Inf, tổng]
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def snapshot(self) -> Dict[tuple, list]:
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+
+request_latency = Histogram(LATENCY_BUCKETS)
+request_statements = Histogram(STATEMENT_BUCKETS)
+# Bộ đếm theo route (ngoài 2 histogram): cập nhật / đọc dưới _counters_lock
+_counters_lock = threading.Lock()
+request_db_seconds: Dict[tuple, float] = {}
+slow_requests: Dict[tuple, int] = {}
+
+
+def route_label(scope, root_path: str) -> str:
+    # Router gán scope["route"] khi khớp → dùng path mẫu (/forum/{forum_id}), không bùng nổ số nhãn
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Mount (/static, /Frontend) chỉ nối thêm vào root_path
+    mounted = scope.get("root_path", "")[len(root_path):]
+    return f"{mounted}/*" if mounted else "unmatched"
+
+
+def record(scope, route: str, status: int, seconds: float, sql: RequestSQL):
+    method = scope["method"]
+    request_latency.observe((method, route, str(status)), seconds)
+    request_statements.observe((method, route), sql.statements)
+    key = (method, route)
+    slow = seconds * 1000 > SLOW_REQUEST_MS or sql.statements > SLOW_REQUEST_STATEMENTS
+    with _counters_lock:
+        request_db_seconds[key] = request_db_seconds.get(key, 0.0) + sql.seconds
+        if slow:
+            slow_requests[key] = slow_requests.get(key, 0) + 1
+
+    if slow:
+        print(
+            f"🐢 {method} {scope['path']} ({route}) → {status}: {seconds * 1000:.0f}ms, "
+            f"{sql.statements} câu SQL ({sql.seconds * 1000:.0f}ms DB)"
+        )
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        root_path = scope.get("root_path", "")
+        sql = RequestSQL()
+        token = current_request_sql.set(sql)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_request_sql.reset(token)
+            record(scope, route_label(scope, root_path), status, time.perf_counter() - start, sql)
+
+
+# ===============================
+# 📝 Xuất dạng text Prometheus
+# ===============================
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable) -> str:
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}" if pairs else ""
+
+
+def _header(lines: List[str], name: str, kind: str, help_text: str):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+
+
+def _samples(lines: List[str], name: str, kind: str, help_text: str, names: Tuple[str, ...], values: dict):
+    _header(lines, name, kind, help_text)
+    for labels, value in sorted(values.items()):
+        lines.append(f"{name}{_labels(names, labels)} {value}")
+
+
+def _histogram(lines: List[str], name: str, help_text: str, names: Tuple[str, ...], buckets, series: dict):
+    _header(lines, name, "histogram", help_text)
+    for labels, counts in sorted(series.items()):
+        running = 0
+        for le, n in zip([*buckets, "+Inf"], counts):
+            running += n
+            lines.append(f"{name}_bucket{_labels((*names, 'le'), (*labels, le))} {running}")
+        lines.append(f"{name}_sum{_labels(names, labels)} {counts[-1]}")
+        lines.append(f"{name}_count{_labels(names, labels)} {running}")
+
+
+def _engines():
+    yield "primary", engine
+    if async_engine is not None:
+        yield "primary_async", async_engine.sync_engine
+    for replica in replicas.replicas:
+        yield f"replica:{replica.label}", replica.engine
+
+
+def _pool_metrics(lines: List[str]):
+    gauges = {"size": {}, "checked_out": {}, "overflow": {}}
+    counters = {"checkouts": {}, "timeouts": {}, "connects": {}}
+    waits = {}
+    for name, eng in _engines():
+        status = pool_status(eng)
+        for key, values in (*gauges.items(), *counters.items()):
+            if key in status:
+                values[(name,)] = status[key]
+        if "wait_ms" in status:
+            # wait_ms là dạng cộng dồn → đổi lại thành đếm từng bucket
+            cumulative = [b["count"] for b in status["wait_ms"]["buckets"]]
+            counts = [c - p for c, p in zip(cumulative, [0, *cumulative[:-1]])]
+            waits[(name,)] = counts + [status["wait_ms"]["sum_ms"] / 1000]
+    for key, values in gauges.items():
+        _samples(lines, f"db_pool_{key}", "gauge", f"Connection pool: {key}", ("engine",), values)
+    for key, values in counters.items():
+        _samples(lines, f"db_pool_{key}_total", "counter", f"Connection pool: {key}", ("engine",), values)
+    _histogram(
+        lines, "db_pool_wait_seconds", "Thời gian chờ lấy connection", ("engine",),
+        [ms / 1000 for ms in WAIT_BUCKETS_MS], waits
+    )
+
+
+def authorize(request: Request):
+    """Chặn /metrics, /health/* với người ngoài: đúng METRICS_TOKEN, hoặc (khi chưa đặt token) request từ localhost."""
+    if METRICS_TOKEN:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+            raise HTTPException(status_code=401, detail="Sai token metrics", headers={"WWW-Authenticate": "Bearer"})
+    elif request.client is None or request.client.host not in LOCAL_HOSTS:
+        raise HTTPException(status_code=403, detail="Chỉ truy cập từ localhost (hoặc đặt METRICS_TOKEN)")
+
+
+def render() -> str:
+    lines: List[str] = []
+    with _counters_lock:
+        db_seconds = dict(request_db_seconds)
+        slow = dict(slow_requests)
+
+    _histogram(
+        lines, "http_request_duration_seconds", "Độ trễ request tới khi gửi xong body",
+        ("method", "route", "status"), LATENCY_BUCKETS, request_latency.snapshot()
+    )
+    _histogram(
+        lines, "http_request_sql_statements", "Số câu SQL mỗi request",
+        ("method", "route"), STATEMENT_BUCKETS, request_statements.snapshot()
+    )
+    _samples(
+        lines, "http_request_db_seconds_total", "counter", "Tổng thời gian chạy SQL theo route",
+        ("method", "route"), db_seconds
+    )
+    _samples(
+        lines, "http_slow_requests_total", "counter", "Số request vượt ngưỡng chậm / số câu SQL",
+        ("method", "route"), slow
+    )
+
+    sql = sql_stats.snapshot()
+    _samples(lines, "db_statements_total", "counter", "Số câu SQL theo engine và loại", ("engine", "verb"), sql["statements"])
+    _samples(
+        lines, "db_statement_seconds_total", "counter", "Tổng thời gian chạy SQL theo engine",
+        ("engine",), {(k,): v for k, v in sql["seconds"].items()}
+    )
+    _samples(
+        lines, "db_errors_total", "counter", "Số lỗi SQL theo engine",
+        ("engine",), {(k,): v for k, v in sql["errors"].items()}
+    )
+    _pool_metrics(lines)
+
+    cache = response_cache.stats()
+    _samples(
+        lines, "response_cache_requests_total", "counter", "Cache response: hit / miss theo route",
+        ("route", "result"),
+        {
+            **{(route, "hit"): s["hits"] for route, s in cache["routes"].items()},
+            **{(route, "miss"): s["misses"] for route, s in cache["routes"].items()},
+        }
+    )
+    if cache["entries"] >= 0:
+        _samples(lines, "response_cache_entries", "gauge", "Số mục trong cache response", (), {(): cache["entries"]})
+
+    images = image_worker.stats()
+    _samples(lines, "image_queue_depth", "gauge", "Ảnh đang chờ tạo bản thu nhỏ", (), {(): images["queued"]})
+    _samples(
+        lines, "image_jobs_total", "counter", "Việc tạo ảnh thu nhỏ theo kết quả", ("result",),
+        {(k,): images[k] for k in ("done", "retried", "failed", "dropped")}
+    )
+
+    passwords = password_pool.stats()
+    _samples(lines, "password_pool_pending", "gauge", "Việc băm mật khẩu đang chạy + đang chờ", (), {(): passwords["pending"]})
+    _samples(
+        lines, "password_pool_rejected_total", "counter", "Số lần pool băm mật khẩu đầy (trả 503)", (),
+        {(): passwords["rejected"]}
+    )
+
+    tokens = claims_cache.stats()
+    _samples(
+        lines, "auth_token_cache_requests_total", "counter", "Cache claims JWT: hit / miss", ("result",),
+        {("hit",): tokens["hits"], ("miss",): tokens["misses"]}
+    )
+    _samples(lines, "auth_token_cache_entries", "gauge", "Số token đang cache", (), {(): tokens["entries"]})
+
+    return "\n".join(lines) + "\n"
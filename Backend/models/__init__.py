@@ -7,5 +7,7 @@ from models.like import Like
 from sqlalchemy.orm import configure_mappers
 from .tag import Tag
 from .forum_tag import ForumTag  
+from .forum_search import ForumSearch
+from .stored_file import StoredFile
 
 configure_mappers()  # chỉ an toàn khi tất cả model đã được import
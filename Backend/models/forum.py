@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
 
 class Forum(Base):
     __tablename__ = "forum"
+    # 📄 Index cho phân trang keyset /forum/page theo (created_at, forum_id)
+    # DB cũ cần tạo tay: CREATE INDEX ix_forum_created ON forum (created_at, forum_id);
+    __table_args__ = (
+        Index("ix_forum_created", "created_at", "forum_id"),
+    )
 
     forum_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String(100), nullable=False)
@@ -17,6 +22,16 @@ class Forum(Base):
     created_by = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # 🔢 Bộ đếm lưu sẵn (xem forum_counters.py). DB cũ cần thêm cột rồi chạy python -m forum_counters:
+    # ALTER TABLE forum ADD member_count INT NOT NULL DEFAULT 0, ADD like_count INT NOT NULL DEFAULT 0,
+    #                   ADD message_count INT NOT NULL DEFAULT 0;
+    member_count = Column(Integer, nullable=False, default=0, server_default="0")
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # 🏷️ Tăng mỗi khi dữ liệu hiển thị của forum đổi (thông tin, số thành viên/like) → dùng làm ETag.
+    # DB cũ: ALTER TABLE forum ADD version INT NOT NULL DEFAULT 0;
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+
     # 🧩 Quan hệ hiện có
     members = relationship("Membership", back_populates="forum", cascade="all, delete")
     messages = relationship("Message", back_populates="forum")
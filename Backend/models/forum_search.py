@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, Text, ForeignKey, Index
+from database import Base
+
+
+# 🔍 Bảng phụ cho tìm kiếm toàn văn: tên + tag + caption đã bỏ dấu, có FULLTEXT index (MySQL)
+class ForumSearch(Base):
+    __tablename__ = "forum_search"
+    __table_args__ = (
+        Index("ft_forum_search_document", "document", mysql_prefix="FULLTEXT", mysql_with_parser="ngram"),
+    )
+
+    forum_id = Column(Integer, ForeignKey("forum.forum_id", ondelete="CASCADE"), primary_key=True)
+    document = Column(Text, nullable=False)
@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
 
 class Message(Base):
     __tablename__ = "message"
+    # 📄 Index cho phân trang lịch sử chat theo (created_at, message_id) trong từng forum
+    # DB cũ cần tạo tay: CREATE INDEX ix_message_forum_created ON message (forum_id, created_at, message_id);
+    __table_args__ = (
+        Index("ix_message_forum_created", "forum_id", "created_at", "message_id"),
+    )
 
     message_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     forum_id = Column(Integer, ForeignKey("forum.forum_id", ondelete="CASCADE"), nullable=False)
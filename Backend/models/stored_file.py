@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime
+from datetime import datetime
+from database import Base
+
+
+# 📦 File upload lưu theo nội dung (xem storage.py): mỗi nội dung 1 bản, đếm số nơi đang dùng
+class StoredFile(Base):
+    __tablename__ = "stored_file"
+
+    digest = Column(String(64), primary_key=True)  # SHA-256 hex
+    path = Column(String(255), nullable=False)  # tính từ thư mục static/
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String(100))
+    ref_count = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -3,9 +3,17 @@ from passlib.context import CryptContext #băm và ktra mk
 from jose import jwt #tạo và giải mã token
 from datetime import datetime, timedelta #xử lý thời gian
 
-SECRET_KEY = "YOUR_SECRET_KEY" 
+import os
+
+# 🔑 Khoá ký JWT lấy từ biến môi trường, KHÔNG để trong code (main.py dừng khởi động nếu thiếu)
+SECRET_KEY = os.getenv("JWT_SECRET_KEY", "")
 ALGORITHM = "HS256"
 
+
+def require_secret_key():
+    if not SECRET_KEY:
+        raise RuntimeError("Chưa đặt JWT_SECRET_KEY: token đăng nhập không thể ký / kiểm tra an toàn")
+
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
 def hash_password(password: str):
@@ -0,0 +1,100 @@
+# pagination.py
+# 📄 Phân trang keyset (cursor) theo cặp (created_at, id)
+# - Cursor là chuỗi base64 mờ, client chỉ cần gửi lại nguyên văn
+# - Mỗi trang là 1 lần quét khoảng trên index (..., created_at, id), không dùng OFFSET
+# - Tổng số dòng lấy từ cache (cached_count), không COUNT lại mỗi request
+import base64
+import os
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+from response_cache import response_cache
+
+COUNT_TTL = float(os.getenv("PAGINATION_COUNT_TTL", "300"))
+HISTORY_LIMIT = 50  # số tin mỗi trang lịch sử khi client không gửi limit
+# Client cũ gọi lịch sử tin nhắn không kèm limit / cursor: trả mảng trần gồm tối đa chừng này tin mới nhất
+LEGACY_HISTORY_LIMIT = int(os.getenv("LEGACY_HISTORY_LIMIT", "200"))
+
+
+def encode_token(*parts) -> str:
+    raw = "|".join(str(p) for p in parts)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_token(token: str, *types) -> tuple:
+    """Giải mã cursor thành tuple, mỗi phần chuyển bằng hàm tương ứng trong types."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        parts = base64.urlsafe_b64decode(padded).decode().split("|")
+        if len(parts) != len(types):
+            raise ValueError(token)
+        return tuple(convert(part) for convert, part in zip(types, parts))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor không hợp lệ")
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return encode_token(created_at.isoformat(), row_id)
+
+
+def decode_cursor(token: str) -> Tuple[datetime, int]:
+    return decode_token(token, datetime.fromisoformat, int)
+
+
+def cached_count(key: str, count_fn, tags=(), ttl: Optional[float] = None) -> int:
+    """
+    Tổng số dòng cho phản hồi phân trang, lưu trong response_cache (xoá theo tag như các trang).
+    Tránh chạy COUNT(*) toàn bảng ở mỗi request.
+    """
+    body = response_cache.get(f"count:{key}")
+    if body is not None:
+        return int(body)
+    total = count_fn()
+    response_cache.set(f"count:{key}", str(total).encode(), tags, ttl or COUNT_TTL)
+    return total
+
+
+def _before(created_col, id_col, cursor):
+    created_at, row_id = cursor
+    return or_(created_col < created_at, and_(created_col == created_at, id_col < row_id))
+
+
+def _after(created_col, id_col, cursor):
+    created_at, row_id = cursor
+    return or_(created_col > created_at, and_(created_col == created_at, id_col > row_id))
+
+
+def paginate_keyset(query, created_col, id_col, limit: int,
+                    before: Optional[str] = None, after: Optional[str] = None,
+                    newest_first: bool = False, oldest_first: bool = False):
+    """
+    Lấy 1 trang từ query theo cursor.
+    - before: các dòng cũ hơn cursor; after: các dòng mới hơn cursor
+    - không có cursor: trang mới nhất (oldest_first=True: trang cũ nhất, đọc tiếp bằng after)
+    - Kết quả trả về theo thứ tự cũ → mới (newest_first=True thì mới → cũ)
+    Trả về (rows, has_more) với has_more = còn dữ liệu tiếp theo hướng đang đọc.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Chỉ được dùng before hoặc after")
+
+    if after or (oldest_first and not before):
+        if after:
+            query = query.filter(_after(created_col, id_col, decode_cursor(after)))
+        query = query.order_by(created_col.asc(), id_col.asc())
+        ascending = True
+    else:
+        if before:
+            query = query.filter(_before(created_col, id_col, decode_cursor(before)))
+        query = query.order_by(created_col.desc(), id_col.desc())
+        ascending = False
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if ascending == newest_first:
+        rows.reverse()
+    return rows, has_more
@@ -0,0 +1,95 @@
+# password_pool.py
+# 🔐 Băm / kiểm tra mật khẩu (pbkdf2_sha256, xem my_utils.py) trong process pool riêng
+# - pbkdf2 cố ý tốn CPU và giữ GIL: chạy trong threadpool chung thì lúc nhiều người đăng nhập
+#   mọi route đồng bộ khác phải xếp hàng chờ thread
+# - Pool có số process cố định (PASSWORD_WORKERS) + giới hạn số việc đang chờ (PASSWORD_MAX_PENDING):
+#   đầy thì trả 503 + Retry-After ngay, không để hàng đợi (và độ trễ) tăng vô hạn
+# - Mỗi worker uvicorn/gunicorn có pool riêng: mặc định chia ngân sách cả máy PASSWORD_HOST_WORKERS
+#   (= nửa số core) cho WEB_CONCURRENCY worker, không phải mỗi worker chiếm nửa số core
+# - PASSWORD_WORKERS=0: không dùng process (môi trường không cho fork/spawn), chạy trong threadpool
+#   nhưng vẫn giới hạn số việc đồng thời
+# Đo:  python -m bench.password_hash   (từ thư mục Backend)
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+import my_utils
+
+# Tổng số process băm mật khẩu cho cả máy, chia đều cho các worker web (WEB_CONCURRENCY, như uvicorn / gunicorn)
+PASSWORD_HOST_WORKERS = int(os.getenv("PASSWORD_HOST_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(max(1, PASSWORD_HOST_WORKERS // WEB_CONCURRENCY))))
+# Việc đang chạy + đang chờ; mặc định mỗi process tối đa 8 việc xếp hàng
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", str(max(1, PASSWORD_WORKERS) * 8)))
+RETRY_AFTER_SECONDS = 1
+
+
+def _warm_up() -> bool:
+    return True
+
+
+class PasswordPool:
+    def __init__(self, workers: int = PASSWORD_WORKERS, max_pending: int = PASSWORD_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: không fork process đang có event loop / thread / connection DB (và chạy được trên Windows)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def start(self):
+        """Tạo sẵn các process lúc khởi động, request đầu tiên không phải đợi spawn."""
+        if self.workers > 0:
+            pool = self._pool()
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(pool, _warm_up) for _ in range(self.workers)))
+
+    async def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Máy chủ đang bận, vui lòng thử lại sau",
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+            )
+        self.pending += 1
+        try:
+            if self.workers > 0:
+                return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+            return await run_in_threadpool(fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(my_utils.hash_password, password)
+
+    async def verify(self, plain: str, hashed: str) -> bool:
+        return await self._run(my_utils.verify_password, plain, hashed)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "rejected": self.rejected,
+        }
+
+
+password_pool = PasswordPool()
@@ -0,0 +1,333 @@
+# response_cache.py
+# 🗄️ Cache response cho các endpoint đọc nhiều (danh sách / chi tiết forum, top tag)
+# - Mỗi entry có TTL + tag để xoá chủ động khi ghi: "forum-list", "forum:{id}", "tag-top", "forum-count"
+# - Backend: LRU trong bộ nhớ (mặc định, mỗi worker 1 bản) hoặc Redis dùng chung (CACHE_URL)
+#   → với nhiều worker mà không có Redis, worker khác chỉ thấy thay đổi sau tối đa CACHE_TTL giây
+# - Lưu sẵn JSON đã encode: cache hit không query DB, cũng không serialize lại
+# - Có replica: miss đọc từ replica, nhưng replica có thể chưa thấy lần ghi vừa invalidate()
+#   → trong CACHE_REPLICA_LAG_SECONDS sau invalidate, tag đó bị "giữ": vẫn trả kết quả nhưng không lưu vào cache
+#   → request đang dính primary (cookie db_primary_until sau khi tự ghi) bỏ qua cache, đọc thẳng primary
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+
+from database import DB_STICKY_SECONDS, offload, replicas, wants_primary
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+CACHE_TTL = float(os.getenv("CACHE_TTL", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2000"))
+CACHE_URL = os.getenv("CACHE_URL", "")  # vd redis://localhost:6379/1
+# Độ trễ replica chấp nhận được (mặc định = thời gian dính primary của database.py, 0 khi không có replica)
+CACHE_REPLICA_LAG_SECONDS = float(os.getenv("CACHE_REPLICA_LAG_SECONDS", str(DB_STICKY_SECONDS if replicas else 0)))
+
+# Dấu phiên bản (Forum.version...) mà etag_route vừa đọc cho request hiện tại: nằm trong key của entry
+# → body và ETag luôn từ cùng 1 phiên bản; version đã tăng thì entry cũ (kể cả ghi muộn sau invalidate) không bao giờ khớp
+current_version: ContextVar = ContextVar("current_version", default=None)
+
+FORUM_LIST = "forum-list"
+FORUM_COUNT = "forum-count"  # tổng số forum (chỉ đổi khi tạo / xoá)
+TAG_TOP = "tag-top"
+
+
+def forum_tag(forum_id: int) -> str:
+    return f"forum:{forum_id}"
+
+
+# ===============================
+# 🧠 LRU trong bộ nhớ
+# ===============================
+class MemoryCache:
+    blocking = False
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, bytes, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._held: Dict[str, float] = {}  # tag → hết bị giữ lúc (monotonic)
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, body: bytes, ttl: float, tags: Iterable[str]):
+        tags = tuple(tags)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, body, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, *tags: str, hold: float = 0):
+        with self._lock:
+            now = time.monotonic()
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._drop(key)
+                if hold > 0:
+                    self._held[tag] = now + hold
+            # Dọn mốc đã qua để dict không lớn dần
+            for tag in [t for t, until in self._held.items() if until <= now]:
+                del self._held[tag]
+
+    def held(self, tags: Iterable[str]) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            return any(self._held.get(tag, 0) > now for tag in tags)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+# ===============================
+# 🧰 Redis (dùng chung giữa các worker)
+# ===============================
+class RedisCache:
+    blocking = True
+    KEY_PREFIX = "cache:"
+    TAG_PREFIX = "cache-tag:"
+    TAG_TTL = 86400  # tập key của 1 tag; luôn sống lâu hơn các key bên trong
+    HOLD_PREFIX = "cache-hold:"
+
+    def __init__(self, url: str):
+        import redis  # chỉ cần khi cấu hình CACHE_URL
+
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._redis.get(self.KEY_PREFIX + key)
+
+    def set(self, key: str, body: bytes, ttl: float, tags: Iterable[str]):
+        pipe = self._redis.pipeline()
+        pipe.set(self.KEY_PREFIX + key, body, ex=max(1, int(ttl)))
+        for tag in tags:
+            pipe.sadd(self.TAG_PREFIX + tag, key)
+            pipe.expire(self.TAG_PREFIX + tag, self.TAG_TTL)
+        pipe.execute()
+
+    def invalidate(self, *tags: str, hold: float = 0):
+        for tag in tags:
+            keys = self._redis.smembers(self.TAG_PREFIX + tag)
+            pipe = self._redis.pipeline()
+            if keys:
+                pipe.delete(*(self.KEY_PREFIX + k.decode() for k in keys))
+            pipe.delete(self.TAG_PREFIX + tag)
+            if hold > 0:
+                pipe.set(self.HOLD_PREFIX + tag, 1, px=max(1, int(hold * 1000)))
+            pipe.execute()
+
+    def held(self, tags: Iterable[str]) -> bool:
+        keys = [self.HOLD_PREFIX + tag for tag in tags]
+        return bool(keys) and self._redis.exists(*keys) > 0
+
+    def size(self) -> int:
+        return -1  # không đếm (dùng chung với dữ liệu khác)
+
+
+# ===============================
+# 📈 Lớp cache + thống kê hit/miss theo route
+# ===============================
+class ResponseCache:
+    def __init__(self, backend, ttl: float = CACHE_TTL, replica_lag: float = CACHE_REPLICA_LAG_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.replica_lag = replica_lag
+        self.skipped_lagging = 0
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, float]] = {}
+
+    def _call(self, fn, *args, **kwargs):
+        # Redis đồng bộ gọi từ thân route async_db_route (cached_count, invalidate) → threadpool
+        return offload(fn, *args, **kwargs) if self.backend.blocking else fn(*args, **kwargs)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self._call(self.backend.get, key)
+        except Exception as e:
+            print("⚠️ Cache get lỗi:", e)
+            return None
+
+    def set(self, key: str, body: bytes, tags: Iterable[str], ttl: Optional[float] = None):
+        tags = tuple(tags)
+        try:
+            if self.replica_lag > 0 and self._call(self.backend.held, tags):
+                self.skipped_lagging += 1  # body có thể đọc từ replica chưa kịp thấy lần ghi vừa rồi
+                return
+            self._call(self.backend.set, key, body, ttl or self.ttl, tags)
+        except Exception as e:
+            print("⚠️ Cache set lỗi:", e)
+
+    def invalidate(self, *tags: str):
+        try:
+            self._call(self.backend.invalidate, *tags, hold=self.replica_lag)
+        except Exception as e:
+            print("⚠️ Cache invalidate lỗi:", e)
+
+    def record(self, route: str, hit: bool, seconds: float):
+        outcome = "hit" if hit else "miss"
+        with self._lock:
+            stats = self._routes.setdefault(route, {"hit": 0, "miss": 0, "hit_seconds": 0.0, "miss_seconds": 0.0})
+            stats[outcome] += 1
+            stats[f"{outcome}_seconds"] += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            routes = {name: dict(s) for name, s in self._routes.items()}
+        summary = {}
+        hits = misses = 0
+        for name, s in routes.items():
+            hits += s["hit"]
+            misses += s["miss"]
+            summary[name] = {
+                "hits": s["hit"],
+                "misses": s["miss"],
+                "hit_ratio": round(s["hit"] / ((s["hit"] + s["miss"]) or 1), 4),
+                "avg_hit_ms": round(s["hit_seconds"] * 1000 / (s["hit"] or 1), 3),
+                "avg_miss_ms": round(s["miss_seconds"] * 1000 / (s["miss"] or 1), 3),
+            }
+        return {
+            "enabled": CACHE_ENABLED,
+            "skipped_lagging": self.skipped_lagging,
+            "backend": type(self.backend).__name__,
+            "entries": self.backend.size(),
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / ((hits + misses) or 1), 4),
+            "routes": summary,
+        }
+
+
+def create_cache() -> ResponseCache:
+    if CACHE_URL:
+        try:
+            return ResponseCache(RedisCache(CACHE_URL))
+        except ImportError:
+            print("⚠️ Chưa cài redis, dùng cache trong bộ nhớ")
+    return ResponseCache(MemoryCache())
+
+
+response_cache = create_cache()
+
+
+def invalidate(*tags: str):
+    response_cache.invalidate(*tags)
+
+
+def render_json(result) -> bytes:
+    # Giống JSONResponse của FastAPI
+    return json.dumps(
+        jsonable_encoder(result), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def route_key(route: str, kwargs: dict) -> str:
+    """Tên route + base_url + các tham số kiểu đơn giản (bỏ qua db)."""
+    parts = [route]
+    for name, value in sorted(kwargs.items()):
+        if isinstance(value, Request):
+            parts.append(str(value.base_url))
+        elif value is None or isinstance(value, (str, int, float, bool)):
+            parts.append(f"{name}={value}")
+    return "|".join(parts)
+
+
+def _bypass(kwargs: dict) -> bool:
+    """Cache tắt, hoặc client vừa ghi (cookie dính primary): đọc thẳng DB, không đọc / ghi cache."""
+    if not CACHE_ENABLED:
+        return True
+    request = next((v for v in kwargs.values() if isinstance(v, Request)), None)
+    return request is not None and wants_primary(request)
+
+
+def cached_route(*tags: str, ttl: Optional[float] = None):
+    """
+    Cache response của 1 route GET. Tag có thể chứa tham số route, vd "forum:{forum_id}".
+    Key xem route_key() (+ dấu phiên bản của etag_route). Request dính primary bỏ qua cache, xem _bypass().
+    Đặt ngay dưới @router.get (trên @async_db_route).
+    """
+    def decorator(fn):
+        route = fn.__name__
+
+        def make_key(kwargs: dict) -> str:
+            key = route_key(route, kwargs)
+            version = current_version.get()
+            return key if version is None else f"{key}|v={version}"
+
+        def respond(body: bytes, hit: bool) -> Response:
+            return Response(content=body, media_type="application/json", headers={"X-Cache": "HIT" if hit else "MISS"})
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(**kwargs):
+                if _bypass(kwargs):
+                    return await fn(**kwargs)
+                start = time.perf_counter()
+                key = make_key(kwargs)
+                blocking = response_cache.backend.blocking
+                body = await run_in_threadpool(response_cache.get, key) if blocking else response_cache.get(key)
+                if body is not None:
+                    response_cache.record(route, True, time.perf_counter() - start)
+                    return respond(body, True)
+                result = await fn(**kwargs)
+                if isinstance(result, Response):
+                    return result  # vd StreamingResponse: không cache
+                body = render_json(result)
+                entry_tags = [t.format(**kwargs) for t in tags]
+                if blocking:
+                    await run_in_threadpool(response_cache.set, key, body, entry_tags, ttl)
+                else:
+                    response_cache.set(key, body, entry_tags, ttl)
+                response_cache.record(route, False, time.perf_counter() - start)
+                return respond(body, False)
+        else:
+            @functools.wraps(fn)
+            def wrapper(**kwargs):
+                if _bypass(kwargs):
+                    return fn(**kwargs)
+                start = time.perf_counter()
+                key = make_key(kwargs)
+                body = response_cache.get(key)
+                if body is not None:
+                    response_cache.record(route, True, time.perf_counter() - start)
+                    return respond(body, True)
+                result = fn(**kwargs)
+                if isinstance(result, Response):
+                    return result
+                body = render_json(result)
+                response_cache.set(key, body, [t.format(**kwargs) for t in tags], ttl)
+                response_cache.record(route, False, time.perf_counter() - start)
+                return respond(body, False)
+
+        return wrapper
+
+    return decorator
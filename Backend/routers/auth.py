@@ -1,77 +1,81 @@
 # routers/auth.py
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_async_db
 from models.user import User
-import my_utils
+from password_pool import password_pool
+from user_index import user_index
 from schemas import SignupRequest, SigninRequest, GoogleRegisterRequest
 from datetime import datetime
-import os
-import firebase_admin
-from firebase_admin import credentials, auth
+from firebase_tokens import firebase_verifier
+from identity import issue_token
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
-# 🔥 Khởi tạo Firebase chỉ 1 lần
-if not firebase_admin._apps:
-    cred = credentials.Certificate(os.path.join(os.getcwd(), "firebase-service-account.json"))
-    firebase_admin.initialize_app(cred)
-
-
 # 🧩 1️⃣ Đăng ký (MySQL)
+# Băm / kiểm tra mật khẩu chạy trong password_pool (process riêng), không chiếm threadpool chung
 @router.post("/signup")
-def signup(request: SignupRequest, db: Session = Depends(get_db)):
-    existing_email = db.query(User).filter(User.email == request.email).first()
-    existing_username = db.query(User).filter(User.username == request.username).first()
-    if existing_email:
-        raise HTTPException(status_code=400, detail="Email đã tồn tại")
-    if existing_username:
-        raise HTTPException(status_code=400, detail="Tên đăng nhập đã tồn tại")
-
-    new_user = User(
-        username=request.username,
-        email=request.email,
-        password_hash=my_utils.hash_password(request.password),
-        avatar=request.avatar,
-        background=request.background,
-        bio=request.bio,
-        created_at=datetime.utcnow()
-    )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    return {"message": "Đăng ký thành công"}
+async def signup(request: SignupRequest, db=Depends(get_async_db)):
+    def _check(session: Session):
+        if session.query(User).filter(User.email == request.email).first():
+            raise HTTPException(status_code=400, detail="Email đã tồn tại")
+        if session.query(User).filter(User.username == request.username).first():
+            raise HTTPException(status_code=400, detail="Tên đăng nhập đã tồn tại")
+
+    await db.run_sync(_check)
+    password_hash = await password_pool.hash(request.password)
+
+    def _create(session: Session):
+        new_user = User(
+            username=request.username,
+            email=request.email,
+            password_hash=password_hash,
+            avatar=request.avatar,
+            background=request.background,
+            bio=request.bio,
+            created_at=datetime.utcnow()
+        )
+        session.add(new_user)
+        session.commit()
+        return new_user.user_id
+
+    user_id = await db.run_sync(_create)
+    user_index.add(user_id, request.username)
+    return {"message": "Đăng ký thành công", "user_id": user_id}
 
 
 # 🧠 2️⃣ Đăng nhập tài khoản thường (MySQL)
 @router.post("/signin")
-def signin(request: SigninRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == request.username).first()
-    if not user or not my_utils.verify_password(request.password, user.password_hash):
+async def signin(request: SigninRequest, db=Depends(get_async_db)):
+    def _load(session: Session):
+        user = session.query(User).filter(User.username == request.username).first()
+        if not user:
+            return None
+        return {
+            "id": user.user_id,
+            "username": user.username,
+            "email": user.email,
+            "avatar": user.avatar,
+            "bio": user.bio,
+            "password_hash": user.password_hash,
+        }
+
+    user = await db.run_sync(_load)
+    if not user or not await password_pool.verify(request.password, user.pop("password_hash")):
         raise HTTPException(status_code=401, detail="Sai tên đăng nhập hoặc mật khẩu")
 
-    token = my_utils.create_token({
-        "id": user.user_id,
-        "email": user.email,
-        "username": user.username
-    })
+    token = issue_token(user["id"], user["username"], user["email"])
 
     return {
         "token": token,
         "login_type": "mysql",
-        "user": {
-            "id": user.user_id,
-            "username": user.username,
-            "email": user.email,
-            "avatar": user.avatar,
-            "bio": user.bio
-        }
+        "user": user
     }
 
 
 # 🔥 3️⃣ Đăng nhập Google qua Firebase
 @router.post("/firebase-login")
-async def firebase_login(request: Request, db: Session = Depends(get_db)):
+async def firebase_login(request: Request, db=Depends(get_async_db)):
     """
     Xác thực người dùng từ Firebase token:
     - Nếu email đã tồn tại → đăng nhập thành công
@@ -86,9 +90,9 @@ async def firebase_login(request: Request, db: Session = Depends(get_db)):
     if not id_token:
         raise HTTPException(status_code=400, detail="Thiếu Firebase ID token")
 
-    # 🧩 Giải mã token Firebase
+    # 🧩 Giải mã token Firebase (khoá Google cache trong firebase_tokens.py, không chặn event loop)
     try:
-        decoded_token = auth.verify_id_token(id_token)
+        decoded_token = await firebase_verifier.verify(id_token)
         uid = decoded_token["uid"]
         email = decoded_token.get("email")
         name = decoded_token.get("name", email.split("@")[0] if email else "Người dùng")
@@ -100,17 +104,20 @@ async def firebase_login(request: Request, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Tài khoản Google không có email hợp lệ.")
 
     # 🔎 Kiểm tra user trong DB
-    user = db.query(User).filter(User.email == email).first()
+    def _login(session: Session):
+        user = session.query(User).filter(User.email == email).first()
+        if not user:
+            return None
 
-    if user:
         # ✅ Nếu user đã tồn tại → cho đăng nhập luôn
         if not user.firebase_uid:
             user.firebase_uid = uid
-            db.commit()
+            session.commit()
 
         return {
             "need_register": False,
             "message": "Đăng nhập Firebase thành công",
+            "token": issue_token(user.user_id, user.username, user.email),
             "login_type": "firebase",
             "user": {
                 "id": user.user_id,
@@ -121,6 +128,10 @@ async def firebase_login(request: Request, db: Session = Depends(get_db)):
             }
         }
 
+    logged_in = await db.run_sync(_login)
+    if logged_in:
+        return logged_in
+
     # 🚨 Nếu chưa tồn tại user trong DB → yêu cầu đăng ký bổ sung
     return {
         "need_register": True,
@@ -130,28 +141,37 @@ async def firebase_login(request: Request, db: Session = Depends(get_db)):
         "suggested_name": email.split("@")[0],
     }
 @router.post("/register-from-google")
-def register_from_google(request: GoogleRegisterRequest, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.email == request.email).first()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Email này đã có trong hệ thống")
+async def register_from_google(request: GoogleRegisterRequest, db=Depends(get_async_db)):
+    def _check(session: Session):
+        if session.query(User).filter(User.email == request.email).first():
+            raise HTTPException(status_code=400, detail="Email này đã có trong hệ thống")
 
-    # ✅ Tạo user mới
-    new_user = User(
-        username=request.username,
-        email=request.email,
-        password_hash=my_utils.hash_password(request.password),
-        avatar=request.avatar,
-        firebase_uid=request.firebase_uid,
-        bio=request.bio,
-        created_at=datetime.utcnow()
-    )
+    await db.run_sync(_check)
+    password_hash = await password_pool.hash(request.password)
 
-    try:
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Lỗi khi tạo tài khoản: {str(e)}")
-
-    return {"message": "Đăng ký tài khoản Firebase thành công", "user_id": new_user.user_id}
+    # ✅ Tạo user mới
+    def _create(session: Session):
+        new_user = User(
+            username=request.username,
+            email=request.email,
+            password_hash=password_hash,
+            avatar=request.avatar,
+            firebase_uid=request.firebase_uid,
+            bio=request.bio,
+            created_at=datetime.utcnow()
+        )
+        try:
+            session.add(new_user)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise HTTPException(status_code=500, detail=f"Lỗi khi tạo tài khoản: {str(e)}")
+        return new_user.user_id
+
+    user_id = await db.run_sync(_create)
+    user_index.add(user_id, request.username)
+    return {
+        "message": "Đăng ký tài khoản Firebase thành công",
+        "user_id": user_id,
+        "token": issue_token(user_id, request.username, request.email)
+    }
@@ -1,27 +1,30 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, async_db_route
+from pagination import HISTORY_LIMIT, LEGACY_HISTORY_LIMIT, encode_cursor, paginate_keyset
+from chat_hub import hub
+from message_writer import message_writer
+from trending import leaderboard
 from models.message import Message
 from models.user import User
-from datetime import datetime
-from typing import Dict, List
+from typing import Optional
 import json
-from datetime import datetime, timedelta, timezone
+from identity import websocket_user
+from datetime import datetime
 
-VN_TZ = timezone(timedelta(hours=7))  # Múi giờ Việt Nam (UTC+7)
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
-# Lưu danh sách kết nối đang mở
-active_connections: Dict[int, List[WebSocket]] = {}
-
 @router.websocket("/ws/{forum_id}")
-async def websocket_endpoint(websocket: WebSocket, forum_id: int, db: Session = Depends(get_db)):
+async def websocket_endpoint(websocket: WebSocket, forum_id: int):
+    # 🪪 Người gửi lấy từ token (?token=...), không tin user_id / user trong nội dung tin nhắn
+    sender = websocket_user(websocket)
+    if sender is None:
+        await websocket.close(code=1008)
+        return
     await websocket.accept()
     print(f"✅ WebSocket connected to forum {forum_id}")
 
-    if forum_id not in active_connections:
-        active_connections[forum_id] = []
-    active_connections[forum_id].append(websocket)
+    await hub.connect(forum_id, websocket)
 
     try:
         while True:
@@ -31,53 +34,67 @@ async def websocket_endpoint(websocket: WebSocket, forum_id: int, db: Session =
             # Parse JSON từ frontend
             try:
                 msg_data = json.loads(data)
-                user = msg_data.get("user", "Ẩn danh")
-                user_id = int(msg_data.get("user_id", 1))
+                user = sender.username
+                user_id = sender.user_id
                 content = msg_data.get("content", "")
             except Exception as e:
                 print("❌ Parse error:", e)
                 continue
 
-            # 🧩 Lưu xuống database
-            new_msg = Message(
-                forum_id=forum_id,
-                user_id=user_id,
-                content=content,
-                created_at=datetime.now(VN_TZ)  # ✅ Giờ Việt Nam thật
-            )
-            db.add(new_msg)
-            db.commit()
-            db.refresh(new_msg)
+            # 🧩 Lưu xuống database (ghi theo lô ở task nền, không chặn event loop)
+            # 🕒 UTC không kèm tzinfo, giống /message/send và default của model (trending.py đọc theo UTC)
+            created_at = datetime.utcnow()
+            try:
+                message_id = await message_writer.write(
+                    forum_id=forum_id,
+                    user_id=user_id,
+                    content=content,
+                    created_at=created_at
+                )
+            except Exception as e:
+                # Chỉ bỏ tin lỗi, giữ kết nối
+                print(f"❌ Không lưu được tin nhắn ở forum {forum_id}: {e}")
+                continue
+            leaderboard.record(forum_id, "message")
 
-            # 🛰️ Gửi lại cho toàn bộ client cùng forum
+            # 🛰️ Gửi lại cho toàn bộ client cùng forum (trên mọi worker)
             payload = {
-                "message_id": new_msg.message_id,
+                "message_id": message_id,
                 "forum_id": forum_id,
                 "user_id": user_id,
                 "user": user,
                 "content": content,
-                "created_at": new_msg.created_at.isoformat()
+                "created_at": created_at.isoformat()
             }
-            for conn in active_connections[forum_id]:
-                await conn.send_text(json.dumps(payload))
+            await hub.publish(forum_id, payload)
 
     except WebSocketDisconnect:
         print(f"🔌 Client disconnected from forum {forum_id}")
-        if forum_id in active_connections:
-            active_connections[forum_id].remove(websocket)
+        hub.disconnect(forum_id, websocket)
 
     except Exception as e:
         print(f"❌ Error in WebSocket forum {forum_id}: {e}")
+        hub.disconnect(forum_id, websocket)
         await websocket.close(code=403)
 
 @router.get("/{forum_id}")
-def get_messages(forum_id: int, db: Session = Depends(get_db)):
-    messages = (
+@async_db_route
+def get_messages(
+    forum_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Mặc định HISTORY_LIMIT; bỏ trống cùng before/after → mảng như API cũ"),
+    before: Optional[str] = Query(None, description="Cursor: lấy các tin cũ hơn"),
+    after: Optional[str] = Query(None, description="Cursor: lấy các tin mới hơn"),
+    db: Session = Depends(get_db)
+):
+    query = (
         db.query(Message, User.username)
         .join(User, User.user_id == Message.user_id)
         .filter(Message.forum_id == forum_id)
-        .order_by(Message.created_at.asc())
-        .all()
+    )
+    legacy = limit is None and before is None and after is None
+    limit = LEGACY_HISTORY_LIMIT if legacy else (limit or HISTORY_LIMIT)
+    messages, has_more = paginate_keyset(
+        query, Message.created_at, Message.message_id, limit, before=before, after=after
     )
 
     result = []
@@ -93,4 +110,16 @@ def get_messages(forum_id: int, db: Session = Depends(get_db)):
             "reply_to": msg.reply_to,
             "created_at": msg.created_at.isoformat()
         })
-    return result
+
+    if legacy:
+        # Client cũ: mảng trần (cũ → mới) như trước khi có cursor
+        return result
+
+    first, last = (messages[0][0], messages[-1][0]) if messages else (None, None)
+    return {
+        "limit": limit,
+        "has_more": has_more,
+        "before": encode_cursor(first.created_at, first.message_id) if first else None,
+        "after": encode_cursor(last.created_at, last.message_id) if last else None,
+        "results": result
+    }
@@ -1,102 +1,142 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Form, UploadFile, File, Request, Body
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
-from database import get_db
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func, select
+from database import get_db, get_async_db, get_read_db, async_db_route
 from models.forum import Forum
 from datetime import datetime
 from schemas import ForumCreate
-import shutil, os
+import os, json, functools
+from typing import Optional
+from fastapi.responses import StreamingResponse
 from models.membership import Membership, RoleEnum
 from models.user import User
 from models.like import Like
 from models.message import Message
-UPLOAD_DIR = "static/uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+from forum_counters import bump, touch, forum_version
+from trending import leaderboard
+import search_index
+import storage
+from response_cache import cached_route, invalidate, forum_tag, FORUM_LIST, FORUM_COUNT, TAG_TOP
+from pagination import paginate_keyset, cached_count, encode_cursor, encode_token, decode_token
+from etag import etag_route
+from image_variants import image_worker, variant_urls
+from identity import CurrentUser, current_user
 
 router = APIRouter(
     prefix="/forum",
     tags=["Forum"]
 )
 
+
+async def _make_variants(forum_id: int, path: Optional[str]):
+    """🖼️ Tạo ảnh thu nhỏ / WebP ở nền; xong thì đổi version (ETag) và xoá cache của forum."""
+    await image_worker.enqueue(
+        path,
+        on_ready=lambda session: touch(session, forum_id),
+        tags=(FORUM_LIST, forum_tag(forum_id))
+    )
+
+
+def _require_owner(created_by: Optional[int], user: CurrentUser):
+    """Chỉ người tạo forum được sửa / xoá forum."""
+    if created_by != user.user_id:
+        raise HTTPException(status_code=403, detail="Chỉ người tạo forum mới có quyền thực hiện thao tác này")
+
+
 # 🟢 Tạo forum mới
 @router.post("/create")
-def create_forum(
+async def create_forum(
     request: Request,
     name: str = Form(...),
     tag: str = Form(...),
     caption: str = Form(""),
-    created_by: int = Form(...),
     file: UploadFile = File(None),
-    db: Session = Depends(get_db)
+    user: CurrentUser = Depends(current_user),
+    db=Depends(get_async_db)
 ):
-    image_path = None
-
-    # 🖼 Nếu có ảnh thì lưu file, chỉ lưu phần sau static/
-    if file:
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        image_path = f"uploads/{file.filename}"  # chỉ lưu phần sau static/
-
-    # 🧱 Tạo forum mới
-    new_forum = Forum(
-        name=name,
-        tag=tag,
-        caption=caption,
-        background=image_path,
-        created_by=created_by
-    )
-    db.add(new_forum)
-    db.commit()
-    db.refresh(new_forum)
-
-    # 👑 Thêm người tạo vào membership với quyền admin
-    creator_membership = Membership(
-        user_id=created_by,
-        forum_id=new_forum.forum_id,
-        role=RoleEnum.admin
-    )
-    db.add(creator_membership)
-    db.commit()
+    created_by = user.user_id  # người tạo = người đang đăng nhập
+    # 🖼 Nếu có ảnh thì lưu vào kho file (theo nội dung, ghi ngoài event loop)
+    blob = await storage.save(file, max_bytes=storage.IMAGE_MAX_BYTES) if file else None
+
+    def _create(session: Session):
+        # chỉ lưu phần sau static/
+        image_path = storage.acquire(session, blob) if blob else None
+
+        # 🧱 Tạo forum mới
+        new_forum = Forum(
+            name=name,
+            tag=tag,
+            caption=caption,
+            background=image_path,
+            created_by=created_by
+        )
+        session.add(new_forum)
+        session.commit()
+        session.refresh(new_forum)
+
+        # 👑 Thêm người tạo vào membership với quyền admin
+        creator_membership = Membership(
+            user_id=created_by,
+            forum_id=new_forum.forum_id,
+            role=RoleEnum.admin
+        )
+        session.add(creator_membership)
+        bump(session, new_forum.forum_id, Forum.member_count)
+        session.commit()
+        leaderboard.add_forum(new_forum.forum_id)
+        search_index.index_forum(session, new_forum)
+        leaderboard.record(new_forum.forum_id, "join")
+        invalidate(FORUM_LIST, FORUM_COUNT, TAG_TOP)
+
+        return {
+            "message": "Tạo forum thành công",
+            "forum_id": new_forum.forum_id,
+            "role": "admin",
+            "saved_path": image_path
+        }
 
-    return {
-        "message": "Tạo forum thành công",
-        "forum_id": new_forum.forum_id,
-        "role": "admin",
-        "saved_path": image_path
-    }
+    result = await db.run_sync(storage.uploading(blob, _create))
+    await _make_variants(result["forum_id"], result["saved_path"])
+    return result
 
 
 # 🟢 Lấy danh sách forum có phân trang
+# - Mặc định / có cursor: keyset theo (created_at, forum_id), trang sâu tốn như trang đầu
+# - page: kiểu OFFSET cũ, giữ để tương thích
+def _count_forums(db: Session) -> int:
+    return cached_count("forum", lambda: db.query(func.count(Forum.forum_id)).scalar(), tags=(FORUM_COUNT,))
+
+
 @router.get("/page")
+@cached_route(FORUM_LIST)
+@async_db_route
 def get_forum_list(
     request: Request,
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None, description="next_cursor của trang trước"),
+    page: Optional[int] = Query(None, ge=1),
     limit: int = Query(5, ge=1, le=50),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    offset = (page - 1) * limit
     base_url = str(request.base_url).rstrip("/")
 
-    forums = (
-        db.query(
-            Forum,
-            func.count(func.distinct(Membership.user_id)).label("member_count"),
-            func.count(func.distinct(Like.like_id)).label("like_count")
+    # 🔢 member_count / like_count đọc thẳng từ cột đếm lưu sẵn, không cần JOIN + GROUP BY
+    if page is not None and cursor is None:
+        forums = (
+            db.query(Forum)
+            .order_by(Forum.created_at.desc(), Forum.forum_id.desc())
+            .offset((page - 1) * limit)
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(forums) > limit
+        forums = forums[:limit]
+    else:
+        forums, has_more = paginate_keyset(
+            db.query(Forum), Forum.created_at, Forum.forum_id, limit, before=cursor, newest_first=True
         )
-        .outerjoin(Membership, Membership.forum_id == Forum.forum_id)
-        .outerjoin(Like, Like.forum_id == Forum.forum_id)
-        .group_by(Forum.forum_id)
-        .order_by(Forum.created_at.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
-
-    total = db.query(func.count(Forum.forum_id)).scalar()
 
     results = []
-    for f, member_count, like_count in forums:
+    for f in forums:
         bg_url = f"{base_url}/static/{f.background}" if f.background else None
         results.append({
             "forum_id": f.forum_id,
@@ -104,43 +144,67 @@ def get_forum_list(
             "tag": f.tag,
             "caption": f.caption,
             "background": bg_url,
+            "background_variants": variant_urls(base_url, f.background),
             "created_by": f.created_by,
             "created_at": f.created_at,
-            "member_count": member_count or 0,
-            "like_count": like_count or 0,
+            "member_count": f.member_count,
+            "like_count": f.like_count,
         })
 
-    return {"page": page, "limit": limit, "total": total, "results": results}
+    last = forums[-1] if forums else None
+    return {
+        "page": page,
+        "limit": limit,
+        "total": _count_forums(db),
+        "has_more": has_more,
+        "next_cursor": encode_cursor(last.created_at, last.forum_id) if has_more else None,
+        "results": results
+    }
 
 
-# 🟣 Trending forums
+# 🟣 Trending forums (xếp theo điểm trending giảm dần theo thời gian, xem trending.py)
 @router.get("/trending")
+@async_db_route
 def get_trending_forums(
     request: Request,
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None, description="next_cursor của trang trước"),
+    page: Optional[int] = Query(None, ge=1),
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     base_url = str(request.base_url).rstrip("/")
-    offset = (page - 1) * limit
 
-    forums = (
-        db.query(
-            Forum.forum_id,
-            Forum.name,
-            Forum.caption,
-            Forum.background,
-            Forum.tag,
-            Forum.created_by,
-            Forum.created_at
+    if not leaderboard.ready:
+        leaderboard.rebuild(db)
+    if page is not None and cursor is None:
+        offset = (page - 1) * limit
+        ranked, total = leaderboard.page(offset, limit)
+        next_cursor = None
+        has_more = offset + limit < total
+    else:
+        # Cursor = (điểm, forum_id) của phần tử cuối: forum chen lên phía trước không làm lệch trang sau
+        after = decode_token(cursor, float, float, int) if cursor else None
+        ranked, total, after = leaderboard.page_after(after, limit)
+        next_cursor = encode_token(*after) if after else None
+        has_more = after is not None
+    ids = [forum_id for forum_id, _ in ranked]
+
+    forums = {}
+    if ids:
+        rows = (
+            db.query(
+                Forum.forum_id,
+                Forum.name,
+                Forum.caption,
+                Forum.background,
+                Forum.tag,
+                Forum.created_by,
+                Forum.created_at
+            )
+            .filter(Forum.forum_id.in_(ids))
+            .all()
         )
-        .order_by(Forum.created_at.desc())  # 🟢 giữ nguyên thứ tự mới nhất
-        .offset(offset)  # 🟢 phân trang thực sự
-        .limit(limit)
-        .all()
-    )
-
-    total = db.query(func.count(Forum.forum_id)).scalar()
+        forums = {f.forum_id: f for f in rows}
 
     trending_list = [
         {
@@ -148,29 +212,46 @@ def get_trending_forums(
             "name": f.name,
             "caption": f.caption,
             "background": f"{base_url}/static/{f.background}" if f.background else None,
+            "background_variants": variant_urls(base_url, f.background),
             "tag": f.tag,
             "created_by": f.created_by,
-            "created_at": f.created_at
+            "created_at": f.created_at,
+            "score": round(score, 4)
         }
-        for f in forums
+        for f, score in ((forums.get(forum_id), score) for forum_id, score in ranked)
+        if f
     ]
 
-    return {"page": page, "limit": limit, "total": total, "results": trending_list}
+    return {
+        "page": page,
+        "limit": limit,
+        "total": total,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+        "results": trending_list
+    }
 
 
-# 🔍 Tìm kiếm forum theo từ khóa
+# 🔍 Tìm kiếm forum theo từ khóa (chỉ mục toàn văn, xếp theo độ liên quan, không phân biệt dấu)
 @router.get("/search")
-def search_forums(request: Request, keyword: str = Query(..., min_length=1), db: Session = Depends(get_db)):
-    forums = db.query(Forum).filter(
-        or_(
-            Forum.name.ilike(f"%{keyword}%"),
-            Forum.tag.ilike(f"%{keyword}%"),
-            Forum.caption.ilike(f"%{keyword}%")
-        )
-    ).all()
+@async_db_route
+def search_forums(
+    request: Request,
+    keyword: str = Query(..., min_length=1),
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db)
+):
+    ranked, total = search_index.search(db, keyword, offset=(page - 1) * limit, limit=limit)
+    ids = [forum_id for forum_id, _ in ranked]
+    by_id = {f.forum_id: f for f in db.query(Forum).filter(Forum.forum_id.in_(ids))} if ids else {}
+    forums = [by_id[forum_id] for forum_id in ids if forum_id in by_id]
 
     base_url = str(request.base_url).rstrip("/")
     return {
+        "page": page,
+        "limit": limit,
+        "total": total,
         "results": [
             {
                 "forum_id": f.forum_id,
@@ -178,6 +259,7 @@ def search_forums(request: Request, keyword: str = Query(..., min_length=1), db:
                 "tag": f.tag,
                 "caption": f.caption,
                 "background": f"{base_url}/static/{f.background}" if f.background else None,
+                "background_variants": variant_urls(base_url, f.background),
                 "created_by": f.created_by,
                 "created_at": f.created_at
             }
@@ -186,10 +268,12 @@ def search_forums(request: Request, keyword: str = Query(..., min_length=1), db:
     }
 # 🟣 Lấy danh sách forum theo tag, xếp theo số thành viên & lượt like
 @router.get("/by-tag/{tag_name}")
+@cached_route(FORUM_LIST)
+@async_db_route
 def get_forums_by_tag(
     tag_name: str,
     request: Request,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """
     Trả về danh sách forum có tag được chỉ định (tag lưu trực tiếp trong bảng forum),
@@ -198,17 +282,9 @@ def get_forums_by_tag(
     base_url = str(request.base_url).rstrip("/")
 
     forums = (
-        db.query(
-            Forum,
-            func.count(func.distinct(Membership.user_id)).label("member_count"),
-            func.count(func.distinct(Like.like_id)).label("like_count")
-        )
-        .outerjoin(Membership, Membership.forum_id == Forum.forum_id)
-        .outerjoin(Like, Like.forum_id == Forum.forum_id)
+        db.query(Forum)
         .filter(func.lower(Forum.tag) == func.lower(tag_name))
-        .group_by(Forum.forum_id)
-        .order_by(func.count(func.distinct(Membership.user_id)).desc(),
-                  func.count(func.distinct(Like.like_id)).desc())
+        .order_by(Forum.member_count.desc(), Forum.like_count.desc())
         .all()
     )
 
@@ -216,7 +292,7 @@ def get_forums_by_tag(
         raise HTTPException(status_code=404, detail=f"Không có forum nào với tag '{tag_name}'")
 
     results = []
-    for f, member_count, like_count in forums:
+    for f in forums:
         bg_url = f"{base_url}/static/{f.background}" if f.background else None
         results.append({
             "forum_id": f.forum_id,
@@ -224,10 +300,11 @@ def get_forums_by_tag(
             "tag": f.tag,
             "caption": f.caption,
             "background": bg_url,
+            "background_variants": variant_urls(base_url, f.background),
             "created_by": f.created_by,
             "created_at": f.created_at,
-            "member_count": member_count or 0,
-            "like_count": like_count or 0
+            "member_count": f.member_count,
+            "like_count": f.like_count
         })
 
     return {
@@ -237,76 +314,178 @@ def get_forums_by_tag(
     }
 
 # 🔵 Lấy tất cả forums
+# - Có cursor / page: trả 1 trang {page, limit, total, has_more, next_cursor, results} theo thứ tự cũ → mới,
+#   keyset theo (created_at, forum_id) như /forum/page; page > 1 không kèm cursor là OFFSET cũ, giữ để tương thích
+# - Không có page: stream toàn bộ bảng (mảng JSON như cũ, hoặc NDJSON với format=ndjson /
+#   Accept: application/x-ndjson), đọc theo lô qua server-side cursor → bộ nhớ không tăng theo số forum
+STREAM_BATCH_SIZE = int(os.getenv("FORUM_STREAM_BATCH_SIZE", "1000"))
+
+FORUM_LIST_COLUMNS = (
+    Forum.forum_id, Forum.name, Forum.tag, Forum.caption,
+    Forum.background, Forum.created_by, Forum.created_at,
+)
+
+
+def _forum_row(row, base_url: str) -> dict:
+    forum_id, name, tag, caption, background, created_by, created_at = row
+    return {
+        "forum_id": forum_id,
+        "name": name,
+        "tag": tag,
+        "caption": caption,
+        "background": f"{base_url}/static/{background}" if background else None,
+        "created_by": created_by,
+        "created_at": created_at.isoformat() if created_at else None
+    }
+
+
+def _stream_forums(db: Session, base_url: str, ndjson: bool):
+    # yield_per bật luôn stream_results (server-side cursor với MySQL)
+    rows = db.execute(
+        select(*FORUM_LIST_COLUMNS)
+        .order_by(Forum.forum_id)
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    dumps = functools.partial(json.dumps, ensure_ascii=False, separators=(",", ":"))
+    if not ndjson:
+        yield b"["
+    first = True
+    for batch in rows.partitions():
+        lines = [dumps(_forum_row(row, base_url)) for row in batch]
+        if ndjson:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+        else:
+            yield (("" if first else ",") + ",".join(lines)).encode("utf-8")
+        first = False
+    if not ndjson:
+        yield b"]"
+
+
 @router.get("/")
-def get_all_forums(request: Request, db: Session = Depends(get_db)):
-    forums = db.query(Forum).all()
+@cached_route(FORUM_LIST)
+def get_all_forums(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="next_cursor của trang trước"),
+    page: Optional[int] = Query(None, ge=1),
+    limit: int = Query(50, ge=1, le=500),
+    fmt: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_read_db)
+):
     base_url = str(request.base_url).rstrip("/")
-    return [
-        {
-            "forum_id": f.forum_id,
-            "name": f.name,
-            "tag": f.tag,
-            "caption": f.caption,
-            "background": f"{base_url}/static/{f.background}" if f.background else None,
-            "created_by": f.created_by,
-            "created_at": f.created_at
+
+    if page is not None or cursor is not None:
+        query = db.query(*FORUM_LIST_COLUMNS)
+        if cursor is None and page > 1:
+            rows = (
+                query.order_by(Forum.created_at, Forum.forum_id)
+                .offset((page - 1) * limit)
+                .limit(limit + 1)
+                .all()
+            )
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+        else:
+            rows, has_more = paginate_keyset(
+                query, Forum.created_at, Forum.forum_id, limit, after=cursor, oldest_first=True
+            )
+        last = rows[-1] if rows else None
+        return {
+            "page": page,
+            "limit": limit,
+            "total": _count_forums(db),
+            "has_more": has_more,
+            "next_cursor": encode_cursor(last.created_at, last.forum_id) if has_more else None,
+            "results": [_forum_row(row, base_url) for row in rows]
         }
-        for f in forums
-    ]
+
+    ndjson = fmt == "ndjson" or "application/x-ndjson" in request.headers.get("accept", "")
+    return StreamingResponse(
+        _stream_forums(db, base_url, ndjson),
+        media_type="application/x-ndjson" if ndjson else "application/json"
+    )
 
 
 # 🔵 Forums user đã tham gia
+def _supports_window_functions(db: Session) -> bool:
+    """MySQL >= 8, MariaDB >= 10.2, SQLite >= 3.25 mới có ROW_NUMBER() OVER (...)."""
+    dialect = db.get_bind().dialect
+    version = tuple(v for v in (dialect.server_version_info or ()) if isinstance(v, int))
+    if dialect.name in ("mysql", "mariadb"):
+        if getattr(dialect, "is_mariadb", False):
+            return version >= (10, 2)
+        return version >= (8, 0)
+    if dialect.name == "sqlite":
+        import sqlite3
+        return sqlite3.sqlite_version_info >= (3, 25)
+    return True
+
+
 @router.get("/joined/{user_id}")
-def get_joined_forums(request: Request, user_id: int, db: Session = Depends(get_db)):
+@async_db_route
+def get_joined_forums(request: Request, user_id: int, db: Session = Depends(get_read_db)):
     """
     Lấy danh sách forum mà user đã tham gia,
     kèm số lượng thành viên, tin nhắn, và hoạt động gần nhất.
+    Tất cả được tính trong 1 truy vấn gộp (không truy vấn riêng cho từng forum).
     """
-    joined_forums = (
+    joined_ids = select(Membership.forum_id).where(Membership.user_id == user_id)
+
+    # ✅ Số thành viên / tin nhắn lấy từ cột đếm lưu sẵn trên forum
+    query = (
         db.query(Forum)
         .join(Membership, Forum.forum_id == Membership.forum_id)
         .filter(Membership.user_id == user_id)
-        .all()
     )
 
-    base_url = str(request.base_url).rstrip("/")
-    results = []
-
-    for f in joined_forums:
-        # ✅ Đếm thành viên
-        member_count = (
-            db.query(func.count(Membership.user_id))
-            .filter(Membership.forum_id == f.forum_id)
-            .scalar()
-        )
-
-        # ✅ Đếm tin nhắn
-        try:
-            message_count = (
-                db.query(func.count(Message.message_id))
-                .filter(Message.forum_id == f.forum_id)
-                .scalar()
+    # ✅ Tin nhắn gần nhất + username
+    if _supports_window_functions(db):
+        ranked = (
+            db.query(
+                Message.forum_id,
+                Message.created_at,
+                User.username,
+                func.row_number().over(
+                    partition_by=Message.forum_id,
+                    order_by=(Message.created_at.desc(), Message.message_id.desc())
+                ).label("rn")
             )
-        except Exception:
-            message_count = 0
-
-        # ✅ Lấy tin nhắn gần nhất + username
-        last_msg = (
-            db.query(Message, User.username)
             .join(User, Message.user_id == User.user_id)
-            .filter(Message.forum_id == f.forum_id)
-            .order_by(Message.created_at.desc())
-            .first()
+            .filter(Message.forum_id.in_(joined_ids))
+            .subquery()
+        )
+        latest = select(ranked.c.forum_id, ranked.c.created_at, ranked.c.username).where(ranked.c.rn == 1).subquery()
+        query = (
+            query.add_columns(latest.c.username.label("last_user"), latest.c.created_at.label("last_time"))
+            .outerjoin(latest, latest.c.forum_id == Forum.forum_id)
+        )
+    else:
+        # 🔙 Engine không có window function: subquery tương quan (vẫn chỉ 1 câu SQL)
+        last_msg = aliased(Message)
+        last_user = (
+            select(User.username)
+            .join(last_msg, last_msg.user_id == User.user_id)
+            .where(last_msg.forum_id == Forum.forum_id)
+            .order_by(last_msg.created_at.desc(), last_msg.message_id.desc())
+            .limit(1)
+            .correlate(Forum)
+            .scalar_subquery()
+        )
+        last_time = (
+            select(last_msg.created_at)
+            .join(User, last_msg.user_id == User.user_id)
+            .where(last_msg.forum_id == Forum.forum_id)
+            .order_by(last_msg.created_at.desc(), last_msg.message_id.desc())
+            .limit(1)
+            .correlate(Forum)
+            .scalar_subquery()
         )
+        query = query.add_columns(last_user.label("last_user"), last_time.label("last_time"))
 
-        if last_msg:
-            msg, username = last_msg
-            last_activity = {
-                "user": username,
-                "time": msg.created_at
-            }
-        else:
-            last_activity = None
+    base_url = str(request.base_url).rstrip("/")
+    results = []
+
+    for f, last_user, last_time in query.all():
+        last_activity = {"user": last_user, "time": last_time} if last_user is not None else None
 
         # ✅ Gộp kết quả
         results.append({
@@ -315,10 +494,11 @@ def get_joined_forums(request: Request, user_id: int, db: Session = Depends(get_
             "tag": f.tag,
             "caption": f.caption,
             "background": f"{base_url}/static/{f.background}" if f.background else None,
+            "background_variants": variant_urls(base_url, f.background),
             "created_by": f.created_by,
             "created_at": f.created_at,
-            "member_count": member_count,
-            "message_count": message_count,
+            "member_count": f.member_count,
+            "message_count": f.message_count,
             "last_activity": last_activity
         })
 
@@ -326,27 +506,23 @@ def get_joined_forums(request: Request, user_id: int, db: Session = Depends(get_
 
 # 🟠 Forums user đã tạo
 @router.get("/created/{user_id}")
-def get_forums_created_by_user(request: Request, user_id: int, db: Session = Depends(get_db)):
-    from models.like import Like     # import bảng Like nếu có
-    from models.membership import Membership
-
+@async_db_route
+def get_forums_created_by_user(request: Request, user_id: int, db: Session = Depends(get_read_db)):
     forums = db.query(Forum).filter(Forum.created_by == user_id).all()
     base_url = str(request.base_url).rstrip("/")
 
     result = []
     for f in forums:
-        like_count = db.query(Like).filter(Like.forum_id == f.forum_id).count()
-        member_count = db.query(Membership).filter(Membership.forum_id == f.forum_id).count()
-
         result.append({
             "forum_id": f.forum_id,
             "name": f.name,
             "tag": f.tag,
             "caption": f.caption,
             "background": f"{base_url}/static/{f.background}" if f.background else None,
+            "background_variants": variant_urls(base_url, f.background),
             "created_at": f.created_at,
-            "like_count": like_count,
-            "member_count": member_count
+            "like_count": f.like_count,
+            "member_count": f.member_count
         })
     return result
 
@@ -354,29 +530,17 @@ def get_forums_created_by_user(request: Request, user_id: int, db: Session = Dep
 
 # 🟣 Lấy forum theo ID (kèm like_count & member_count)
 @router.get("/{forum_id}")
-def get_forum_by_id(request: Request, forum_id: int, db: Session = Depends(get_db)):
+@etag_route(version=forum_version)
+@cached_route("forum:{forum_id}")
+@async_db_route
+def get_forum_by_id(request: Request, forum_id: int, db: Session = Depends(get_read_db)):
     base_url = str(request.base_url).rstrip("/")
 
-    # 🔹 Dùng join để đếm like và member (tương tự get_forum_list)
-    query = (
-        db.query(
-            Forum,
-            func.count(func.distinct(Membership.user_id)).label("member_count"),
-            func.count(func.distinct(Like.like_id)).label("like_count")
-        )
-        .outerjoin(Membership, Membership.forum_id == Forum.forum_id)
-        .outerjoin(Like, Like.forum_id == Forum.forum_id)
-        .filter(Forum.forum_id == forum_id)
-        .group_by(Forum.forum_id)
-    )
-
-    result = query.first()
+    forum = db.query(Forum).filter(Forum.forum_id == forum_id).first()
 
-    if not result:
+    if not forum:
         raise HTTPException(status_code=404, detail="Không tìm thấy forum")
 
-    forum, member_count, like_count = result
-
     bg_url = f"{base_url}/static/{forum.background}" if forum.background else None
 
     return {
@@ -385,32 +549,43 @@ def get_forum_by_id(request: Request, forum_id: int, db: Session = Depends(get_d
         "tag": forum.tag,
         "caption": forum.caption,
         "background": bg_url,
+        "background_variants": variant_urls(base_url, forum.background),
         "created_by": forum.created_by,
         "created_at": forum.created_at,
-        "member_count": member_count or 0,
-        "like_count": like_count or 0
+        "member_count": forum.member_count,
+        "like_count": forum.like_count
     }
 
 
 # 🔴 Xóa forum
 @router.delete("/{forum_id}")
-def delete_forum(forum_id: int, db: Session = Depends(get_db)):
+@async_db_route
+def delete_forum(forum_id: int, user: CurrentUser = Depends(current_user), db: Session = Depends(get_db)):
     forum = db.query(Forum).filter(Forum.forum_id == forum_id).first()
     if not forum:
         raise HTTPException(status_code=404, detail="Không tìm thấy forum")
+    _require_owner(forum.created_by, user)
+    unused = storage.release(db, forum.background)
     db.delete(forum)
     db.commit()
+    storage.remove_files(db, unused)
+    leaderboard.remove_forum(forum_id)
+    search_index.remove_forum(db, forum_id)
+    invalidate(FORUM_LIST, FORUM_COUNT, TAG_TOP, forum_tag(forum_id))
     return {"message": "Xóa forum thành công"}
 # 🟣 Cập nhật thông tin forum (tên, caption, tag, background)
 @router.put("/update/{forum_id}")
+@async_db_route
 def update_forum(
     forum_id: int,
     data: dict = Body(...),
+    user: CurrentUser = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     forum = db.query(Forum).filter(Forum.forum_id == forum_id).first()
     if not forum:
         raise HTTPException(status_code=404, detail="Không tìm thấy forum")
+    _require_owner(forum.created_by, user)
 
     name = data.get("name")
     tag = data.get("tag")
@@ -424,13 +599,18 @@ def update_forum(
         forum.caption = caption
 
     forum.updated_at = datetime.utcnow()
+    touch(db, forum_id)
     db.commit()
     db.refresh(forum)
+    search_index.index_forum(db, forum)
+    invalidate(FORUM_LIST, TAG_TOP, forum_tag(forum_id))
 
     return {"message": "✅ Cập nhật forum thành công", "forum": forum.name}
 # 🟢 Lấy danh sách thành viên trong forum
 @router.get("/members/{forum_id}")
-def get_forum_members(forum_id: int, db: Session = Depends(get_db)):
+@etag_route(version=forum_version)
+@async_db_route
+def get_forum_members(request: Request, forum_id: int, db: Session = Depends(get_read_db)):
     memberships = (
         db.query(Membership, User)
         .join(User, Membership.user_id == User.user_id)
@@ -451,50 +631,57 @@ def get_forum_members(forum_id: int, db: Session = Depends(get_db)):
     ]
 # 🖼️ Cập nhật ảnh đại diện (background) của forum
 @router.put("/update-bg/{forum_id}")
-def update_forum_background(
+async def update_forum_background(
     forum_id: int,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    user: CurrentUser = Depends(current_user),
+    db=Depends(get_async_db)
 ):
-    forum = db.query(Forum).filter(Forum.forum_id == forum_id).first()
-    if not forum:
+    def _owner(session: Session):
+        return session.query(Forum.created_by).filter(Forum.forum_id == forum_id).first()
+
+    owner = await db.run_sync(_owner)
+    if not owner:
         raise HTTPException(status_code=404, detail="Không tìm thấy forum")
+    _require_owner(owner.created_by, user)
 
-    # 🧱 Tạo thư mục upload nếu chưa có
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    # 🔄 Lưu file mới vào kho (trùng nội dung thì dùng lại bản đã có)
+    blob = await storage.save(file, max_bytes=storage.IMAGE_MAX_BYTES)
 
-    # 🔄 Lưu file mới
-    filename = f"forum_{forum_id}_{file.filename}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
+    def _update(session: Session):
+        forum = session.query(Forum).filter(Forum.forum_id == forum_id).first()
+        if not forum:
+            raise HTTPException(status_code=404, detail="Không tìm thấy forum")
 
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+        # 🟢 Lưu đường dẫn mới vào DB (chỉ lưu phần sau static/), trả lại ảnh cũ cho kho
+        new_path = storage.acquire(session, blob)
+        unused = storage.release(session, forum.background)  # cùng ảnh cũ thì +1 -1, không xoá gì
+        forum.background = new_path
+        forum.updated_at = datetime.utcnow()
+        touch(session, forum_id)
 
-    # 🧹 Xóa ảnh cũ (nếu có)
-    if forum.background and os.path.exists(os.path.join("static", forum.background)):
-        try:
-            os.remove(os.path.join("static", forum.background))
-        except Exception as e:
-            print(f"⚠️ Không thể xóa ảnh cũ: {e}")
+        session.commit()
+        # 🧹 Xóa ảnh cũ khi không còn nơi nào dùng
+        storage.remove_files(session, unused)
+        invalidate(FORUM_LIST, forum_tag(forum_id))
+        return new_path
 
-    # 🟢 Lưu đường dẫn mới vào DB (chỉ lưu phần sau static/)
-    forum.background = f"uploads/{filename}"
-    forum.updated_at = datetime.utcnow()
-
-    db.commit()
-    db.refresh(forum)
+    new_path = await db.run_sync(storage.uploading(blob, _update))
+    await _make_variants(forum_id, new_path)
 
     return {
         "message": "✅ Cập nhật ảnh forum thành công",
-        "new_background_url": f"/static/uploads/{filename}"
+        "new_background_url": f"/static/{new_path}"
     }
 # ❤️ Like / Unlike forum
 @router.post("/{forum_id}/like")
+@async_db_route
 def toggle_like(
     forum_id: int,
-    user_id: int = Query(..., description="ID của người dùng thực hiện hành động"),
+    user: CurrentUser = Depends(current_user),
     db: Session = Depends(get_db)
 ):
+    user_id = user.user_id
     forum = db.query(Forum).filter(Forum.forum_id == forum_id).first()
     if not forum:
         raise HTTPException(status_code=404, detail="Không tìm thấy forum")
@@ -507,26 +694,35 @@ def toggle_like(
     # Nếu user đã like rồi => bỏ like
     if existing_like:
         db.delete(existing_like)
+        bump(db, forum_id, Forum.like_count, -1)
         db.commit()
+        leaderboard.record(forum_id, "like", -1)
+        invalidate(FORUM_LIST, forum_tag(forum_id))
         return {"liked": False, "message": "Đã bỏ thích"}
 
     # Nếu chưa => thêm like
     new_like = Like(forum_id=forum_id, user_id=user_id)
     db.add(new_like)
+    bump(db, forum_id, Forum.like_count)
     db.commit()
+    leaderboard.record(forum_id, "like")
+    invalidate(FORUM_LIST, forum_tag(forum_id))
     return {"liked": True, "message": "Đã thích"}
 # ❤️ Lấy danh sách forum mà user đã like
 @router.get("/liked/{user_id}")
-def get_liked_forums(user_id: int, db: Session = Depends(get_db)):
+@async_db_route
+def get_liked_forums(user_id: int, db: Session = Depends(get_read_db)):
     liked_forums = db.query(Like.forum_id).filter(Like.user_id == user_id).all()
     return {"liked_forum_ids": [f.forum_id for f in liked_forums]}
-@router.post("/upload")
-async def upload_forum_image(file: UploadFile = File(...)):
-    upload_dir = "static/uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-
-    file_path = os.path.join(upload_dir, file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    return {"url": f"/static/uploads/{file.filename}"}
+@router.post("/upload", dependencies=[Depends(current_user)])
+async def upload_forum_image(file: UploadFile = File(...), db=Depends(get_async_db)):
+    blob = await storage.save(file, max_bytes=storage.IMAGE_MAX_BYTES)
+
+    def _keep(session: Session):
+        path = storage.acquire(session, blob)
+        session.commit()
+        return path
+
+    path = await db.run_sync(storage.uploading(blob, _keep))
+    await image_worker.enqueue(path)
+    return {"url": f"/static/{path}"}
@@ -1,22 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Request
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, get_read_db, async_db_route
 from models.membership import Membership, RoleEnum
 from models.forum import Forum
 from models.user import User
-from schemas import MembershipBase, MembershipResponse
+from schemas import MembershipJoin, MembershipResponse
 from datetime import datetime
+from forum_counters import bump, forum_version
+from trending import leaderboard
+from user_index import user_index
+from response_cache import invalidate, forum_tag, FORUM_LIST
+from etag import etag_route
+from identity import CurrentUser, current_user, require_self
 
 router = APIRouter(
     prefix="/membership",
     tags=["Membership"]
 )
 
+def _require_admin(db: Session, forum_id: int, user_id: int, detail: str):
+    admin = db.query(Membership).filter(
+        Membership.forum_id == forum_id,
+        Membership.user_id == user_id
+    ).first()
+    if not admin or admin.role != RoleEnum.admin:
+        raise HTTPException(status_code=403, detail=detail)
+
+
 # 🟢 1️⃣ Người dùng tham gia forum
 @router.post("/join", response_model=MembershipResponse)
-def join_forum(request: MembershipBase, db: Session = Depends(get_db)):
+@async_db_route
+def join_forum(request: MembershipJoin, user: CurrentUser = Depends(current_user), db: Session = Depends(get_db)):
     existing = db.query(Membership).filter(
-        Membership.user_id == request.user_id,
+        Membership.user_id == user.user_id,
         Membership.forum_id == request.forum_id
     ).first()
 
@@ -24,29 +40,33 @@ def join_forum(request: MembershipBase, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Người dùng đã tham gia forum này")
 
     new_member = Membership(
-        user_id=request.user_id,
+        user_id=user.user_id,
         forum_id=request.forum_id,
-        role=request.role,
+        role=RoleEnum.member,
         joined_at=datetime.utcnow()
     )
 
     db.add(new_member)
+    bump(db, request.forum_id, Forum.member_count)
     db.commit()
     db.refresh(new_member)
+    leaderboard.record(request.forum_id, "join")
+    invalidate(FORUM_LIST, forum_tag(request.forum_id))
     return new_member
 @router.get("/suggest")
-def suggest_users(keyword: str = Query(..., min_length=1), db: Session = Depends(get_db)):
-    users = (
-        db.query(User)
-        .filter(User.username.ilike(f"%{keyword}%"))
-        .limit(8)
-        .all()
-    )
-    return [{"user_id": u.user_id, "username": u.username} for u in users]
+@async_db_route
+def suggest_users(keyword: str = Query(..., min_length=1), db: Session = Depends(get_read_db)):
+    # 🔤 Tra trong chỉ mục username trong bộ nhớ (chính xác → tiền tố → giữa chuỗi), không quét bảng user
+    return [
+        {"user_id": user_id, "username": username}
+        for user_id, username in user_index.suggest(db, keyword)
+    ]
 
 # 🧠 2️⃣ Xem tất cả thành viên trong 1 forum
 @router.get("/{forum_id}")
-def get_members(forum_id: int, db: Session = Depends(get_db)):
+@etag_route(version=forum_version)
+@async_db_route
+def get_members(request: Request, forum_id: int, db: Session = Depends(get_read_db)):
     results = (
         db.query(Membership, User.username)
         .join(User, Membership.user_id == User.user_id)
@@ -68,13 +88,16 @@ def get_members(forum_id: int, db: Session = Depends(get_db)):
 
 # 🟣 3️⃣ Lấy danh sách forum mà 1 user đã tham gia
 @router.get("/user/{user_id}", response_model=list[MembershipResponse])
-def get_forums_joined_by_user(user_id: int, db: Session = Depends(get_db)):
+@async_db_route
+def get_forums_joined_by_user(user_id: int, db: Session = Depends(get_read_db)):
     return db.query(Membership).filter(Membership.user_id == user_id).all()
 
 
 # 🔴 4️⃣ RỜI NHÓM (xoá membership)
 @router.delete("/leave/{forum_id}/{user_id}")
-def leave_forum(forum_id: int, user_id: int, db: Session = Depends(get_db)):
+@async_db_route
+def leave_forum(forum_id: int, user_id: int, user: CurrentUser = Depends(current_user), db: Session = Depends(get_db)):
+    require_self(user, user_id)
     membership = db.query(Membership).filter(
         Membership.forum_id == forum_id,
         Membership.user_id == user_id
@@ -88,12 +111,17 @@ def leave_forum(forum_id: int, user_id: int, db: Session = Depends(get_db)):
     #     raise HTTPException(status_code=400, detail="Admin không thể rời nhóm")
 
     db.delete(membership)
+    bump(db, forum_id, Forum.member_count, -1)
     db.commit()
+    leaderboard.record(forum_id, "join", -1)
+    invalidate(FORUM_LIST, forum_tag(forum_id))
     return {"message": "Đã rời nhóm thành công!"}
 @router.post("/add")
+@async_db_route
 def add_member(
     forum_id: int = Body(...),
     username: str = Body(...),
+    user: CurrentUser = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     # 🔹 Kiểm tra forum tồn tại
@@ -101,6 +129,9 @@ def add_member(
     if not forum:
         raise HTTPException(status_code=404, detail="Forum không tồn tại")
 
+    # 🔹 Chỉ admin của forum được thêm thành viên
+    _require_admin(db, forum_id, user.user_id, "Chỉ admin mới có quyền thêm thành viên.")
+
     # 🔹 Kiểm tra user tồn tại
     user = db.query(User).filter(User.username == username).first()
     if not user:
@@ -117,25 +148,24 @@ def add_member(
     # 🟢 Thêm mới
     new_member = Membership(user_id=user.user_id, forum_id=forum_id, role=RoleEnum.member)
     db.add(new_member)
+    bump(db, forum_id, Forum.member_count)
     db.commit()
+    leaderboard.record(forum_id, "join")
+    invalidate(FORUM_LIST, forum_tag(forum_id))
 
     return {"message": f"✅ Đã thêm {user.username} vào forum thành công!"}
 @router.delete("/remove/{forum_id}/{target_user_id}")
+@async_db_route
 def remove_member(
     forum_id: int,
     target_user_id: int,
-    admin_id: int = Query(..., description="ID của admin thực hiện thao tác"),
+    user: CurrentUser = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     """Xóa thành viên khỏi forum (chỉ admin được phép)"""
+    admin_id = user.user_id
     # 🔹 Kiểm tra admin có trong nhóm không
-    admin = db.query(Membership).filter(
-        Membership.forum_id == forum_id,
-        Membership.user_id == admin_id
-    ).first()
-
-    if not admin or admin.role != RoleEnum.admin:
-        raise HTTPException(status_code=403, detail="Chỉ admin mới có quyền xóa thành viên.")
+    _require_admin(db, forum_id, admin_id, "Chỉ admin mới có quyền xóa thành viên.")
 
     # 🔹 Kiểm tra user cần xóa có trong nhóm không
     member = db.query(Membership).filter(
@@ -156,5 +186,8 @@ def remove_member(
 
     # ✅ Xóa thành viên
     db.delete(member)
+    bump(db, forum_id, Forum.member_count, -1)
     db.commit()
+    leaderboard.record(forum_id, "join", -1)
+    invalidate(FORUM_LIST, forum_tag(forum_id))
     return {"message": "✅ Thành viên đã bị xóa khỏi nhóm thành công!"}
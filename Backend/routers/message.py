@@ -1,17 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, Form, UploadFile, File, Request
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Form, UploadFile, File, Request, Query
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func
+from database import get_db, get_async_db, async_db_route
+from pagination import HISTORY_LIMIT, LEGACY_HISTORY_LIMIT, encode_cursor, paginate_keyset
 from models.message import Message
 from models.forum import Forum
 from models.user import User
+from forum_counters import bump
+from trending import leaderboard
 from datetime import datetime
-import shutil, os
+import storage
 from typing import Optional
+from identity import CurrentUser, current_user
 
 router = APIRouter(prefix="/message", tags=["Message"])
 
-UPLOAD_DIR = "static/messages"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Độ dài tối đa của nội dung preview khi reply
+PREVIEW_LENGTH = 100
+
+
+def _reply_preview_columns(parent, parent_user):
+    """Các cột preview của message cha — cắt nội dung ngay trong SQL (lấy dư 1 ký tự để biết có bị cắt không)."""
+    return (
+        parent.message_id.label("parent_id"),
+        parent_user.username.label("parent_username"),
+        func.substr(parent.content, 1, PREVIEW_LENGTH + 1).label("parent_content"),
+    )
+
+
+def _reply_preview(parent_id, parent_username, parent_content):
+    if parent_id is None or parent_username is None:
+        return None
+    content = parent_content or ""
+    return {
+        "id": parent_id,
+        "username": parent_username,
+        "content": content[:PREVIEW_LENGTH] + ("..." if len(content) > PREVIEW_LENGTH else "")
+    }
 
 
 # 🟢 Gửi message (có thể là text hoặc file)
@@ -19,107 +44,117 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 async def send_message(
     request: Request,
     forum_id: int = Form(...),
-    user_id: int = Form(...),
     content: str = Form(""),
     reply_to: Optional[int] = Form(None),
     file: UploadFile = File(None),
-    db: Session = Depends(get_db)
+    user: CurrentUser = Depends(current_user),
+    db=Depends(get_async_db)
 ):
+    user_id = user.user_id
     # ⚙️ Fix lỗi ràng buộc khóa ngoại khi reply_to = 0 hoặc ""
     if reply_to in [0, "0", "", None]:
         reply_to = None
 
-    file_url = None
     file_type = None
 
-    # 🖼️ Xử lý file nếu có
-    if file:
-        filename = f"{datetime.now().timestamp()}_{file.filename}"
-        file_path = os.path.join(UPLOAD_DIR, filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        base_url = str(request.base_url).rstrip("/")
-        file_url = f"{base_url}/static/messages/{filename}"
-
-        if file.content_type.startswith("image/"):
+    # 🖼️ Xử lý file nếu có: ghi vào kho theo chunk ngoài event loop
+    blob = await storage.save(file) if file else None
+    if blob:
+        content_type = file.content_type or ""
+        if content_type.startswith("image/"):
             file_type = "image"
-        elif file.content_type.startswith("video/"):
+        elif content_type.startswith("video/"):
             file_type = "video"
         else:
             file_type = "file"
 
-    # 🧱 Tạo message mới
-    new_msg = Message(
-        forum_id=forum_id,
-        user_id=user_id,
-        content=content,
-        file_url=file_url,
-        file_type=file_type,
-        reply_to=reply_to,  # Giờ an toàn vì không còn giá trị 0 hoặc ""
-        created_at=datetime.utcnow()
-    )
-    db.add(new_msg)
-    db.commit()
-    db.refresh(new_msg)
-
-    user = db.query(User).filter(User.user_id == user_id).first()
-
-    # 🔁 Nếu là tin nhắn reply thì lấy preview
-    reply_preview = None
-    if reply_to:
-        parent = db.query(Message).filter(Message.message_id == reply_to).first()
-        if parent:
-            reply_preview = {
-                "id": parent.message_id,
-                "username": db.query(User.username).filter(User.user_id == parent.user_id).scalar(),
-                "content": parent.content
-            }
+    # 🧱 Lưu message + lấy preview (code ORM đồng bộ, chạy qua run_sync)
+    def _save(session: Session):
+        if blob:
+            base_url = str(request.base_url).rstrip("/")
+            file_url = f"{base_url}/static/{storage.acquire(session, blob)}"
+        else:
+            file_url = None
+
+        new_msg = Message(
+            forum_id=forum_id,
+            user_id=user_id,
+            content=content,
+            file_url=file_url,
+            file_type=file_type,
+            reply_to=reply_to,  # Giờ an toàn vì không còn giá trị 0 hoặc ""
+            created_at=datetime.utcnow()
+        )
+        session.add(new_msg)
+        bump(session, forum_id, Forum.message_count)
+        session.commit()
+        session.refresh(new_msg)
+
+        # 🔁 Nếu là tin nhắn reply thì lấy preview (1 truy vấn message cha + username)
+        reply_preview = None
+        if reply_to:
+            parent_user = aliased(User)
+            parent = (
+                session.query(*_reply_preview_columns(Message, parent_user))
+                .join(parent_user, parent_user.user_id == Message.user_id)
+                .filter(Message.message_id == reply_to)
+                .first()
+            )
+            if parent:
+                reply_preview = _reply_preview(*parent)
+
+        return {
+            "message_id": new_msg.message_id,
+            "forum_id": forum_id,
+            "user_id": user_id,
+            "username": user.username,  # lấy từ token, không truy vấn bảng user
+            "content": new_msg.content,
+            "file_url": new_msg.file_url,
+            "file_type": new_msg.file_type,
+            "reply_to": new_msg.reply_to,
+            "reply_preview": reply_preview,
+            "created_at": new_msg.created_at
+        }
+
+    result = await db.run_sync(storage.uploading(blob, _save))
+    leaderboard.record(forum_id, "message")
 
     # ✅ Trả kết quả
-    return {
-        "message_id": new_msg.message_id,
-        "forum_id": forum_id,
-        "user_id": user_id,
-        "username": user.username if user else "Unknown",
-        "content": new_msg.content,
-        "file_url": new_msg.file_url,
-        "file_type": new_msg.file_type,
-        "reply_to": new_msg.reply_to,
-        "reply_preview": reply_preview,
-        "created_at": new_msg.created_at
-    }
+    return result
 
-# 🟣 Lấy danh sách message của 1 forum
+# 🟣 Lấy danh sách message của 1 forum (phân trang theo cursor; không gửi limit / cursor → mảng như API cũ)
 @router.get("/forum/{forum_id}")
-def get_messages(request: Request, forum_id: int, db: Session = Depends(get_db)):
+@async_db_route
+def get_messages(
+    request: Request,
+    forum_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Mặc định HISTORY_LIMIT; bỏ trống cùng before/after → mảng như API cũ"),
+    before: Optional[str] = Query(None, description="Cursor: lấy các tin cũ hơn"),
+    after: Optional[str] = Query(None, description="Cursor: lấy các tin mới hơn"),
+    db: Session = Depends(get_db)
+):
     base_url = str(request.base_url).rstrip("/")
 
-    messages = (
-        db.query(Message, User.username)
+    # 🔗 Self-join lấy luôn preview của message cha → số truy vấn không phụ thuộc số reply
+    parent = aliased(Message)
+    parent_user = aliased(User)
+    query = (
+        db.query(Message, User.username, *_reply_preview_columns(parent, parent_user))
         .join(User, Message.user_id == User.user_id)
+        .outerjoin(parent, parent.message_id == Message.reply_to)
+        .outerjoin(parent_user, parent_user.user_id == parent.user_id)
         .filter(Message.forum_id == forum_id)
-        .order_by(Message.created_at.asc())
-        .all()
+    )
+    legacy = limit is None and before is None and after is None
+    limit = LEGACY_HISTORY_LIMIT if legacy else (limit or HISTORY_LIMIT)
+    messages, has_more = paginate_keyset(
+        query, Message.created_at, Message.message_id, limit, before=before, after=after
     )
 
     result = []
     for m in messages:
         msg = m.Message
-        reply_preview = None
-        if msg.reply_to:
-            parent = (
-                db.query(Message, User.username)
-                .join(User, Message.user_id == User.user_id)
-                .filter(Message.message_id == msg.reply_to)
-                .first()
-            )
-            if parent:
-                reply_preview = {
-                    "id": parent.Message.message_id,
-                    "username": parent.username,
-                    "content": parent.Message.content[:100]
-                    + ("..." if len(parent.Message.content) > 100 else "")
-                }
+        reply_preview = _reply_preview(m.parent_id, m.parent_username, m.parent_content)
 
         result.append({
             "message_id": msg.message_id,
@@ -133,4 +168,15 @@ def get_messages(request: Request, forum_id: int, db: Session = Depends(get_db))
             "created_at": msg.created_at
         })
 
-    return result
+    if legacy:
+        # Client cũ: mảng trần (cũ → mới) như trước khi có cursor
+        return result
+
+    first, last = (messages[0].Message, messages[-1].Message) if messages else (None, None)
+    return {
+        "limit": limit,
+        "has_more": has_more,
+        "before": encode_cursor(first.created_at, first.message_id) if first else None,
+        "after": encode_cursor(last.created_at, last.message_id) if last else None,
+        "results": result
+    }
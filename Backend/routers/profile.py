@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, get_async_db, get_read_db, async_db_route
 from models.user import User
 from models.post import Post   # 👈 Thêm import này
 from datetime import datetime  # 👈 Thêm import
@@ -9,19 +9,25 @@ from sqlalchemy import func
 from models.forum import Forum
 from models.membership import Membership
 from models.like import Like as ForumLike
-import os, shutil
+from etag import etag_route
+from image_variants import image_worker, variant_urls
+import storage
+from identity import CurrentUser, current_user, require_self
 
 router = APIRouter()
 
-# 📁 Thư mục upload
-UPLOAD_DIR = "static/uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # ============================================================
 # 🟢 LẤY THÔNG TIN NGƯỜI DÙNG
 # ============================================================
+def _profile_version(db: Session, user_id: int, **_):
+    return db.query(User.updated_at).filter(User.user_id == user_id).scalar()
+
+
 @router.get("/profile/{user_id}")
-def get_profile(user_id: int, request: Request, db: Session = Depends(get_db)):
+@etag_route(version=_profile_version, cache_control="private, no-cache")
+@async_db_route
+def get_profile(user_id: int, request: Request, db: Session = Depends(get_read_db)):
     user = db.query(User).filter(User.user_id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Không tìm thấy người dùng")
@@ -37,6 +43,7 @@ def get_profile(user_id: int, request: Request, db: Session = Depends(get_db)):
         "username": user.username,
         "email": user.email,
         "avatar": avatar_url,  # Trả URL đầy đủ
+        "avatar_variants": variant_urls(base_url, f"uploads/{user.avatar}" if user.avatar else None),
         "background": user.background,
         "bio": user.bio
     }
@@ -46,32 +53,44 @@ def get_profile(user_id: int, request: Request, db: Session = Depends(get_db)):
 # 🟣 CẬP NHẬT ẢNH ĐẠI DIỆN (AVATAR)
 # ============================================================
 @router.post("/profile/update-avatar/{user_id}")
-def update_avatar(
+async def update_avatar(
     request: Request,
     user_id: int,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    current: CurrentUser = Depends(current_user),
+    db=Depends(get_async_db)
 ):
-    user = db.query(User).filter(User.user_id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="Không tìm thấy người dùng")
+    require_self(current, user_id)
 
-    # 🧩 Đảm bảo thư mục uploads tồn tại
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    # 🖼 Lưu file vào kho (static/uploads/blobs, đặt tên theo nội dung)
+    blob = await storage.save(file, max_bytes=storage.IMAGE_MAX_BYTES)
 
-    # 🖼 Lưu file thật vào thư mục static/uploads
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    def _update(session: Session):
+        user = session.query(User).filter(User.user_id == user_id).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="Không tìm thấy người dùng")
 
-    # 💾 Cập nhật DB — chỉ lưu tên file
-    user.avatar = file.filename
-    db.commit()
-    db.refresh(user)
+        # 💾 Cập nhật DB — chỉ lưu đường dẫn tính từ static/uploads, trả lại avatar cũ cho kho
+        new_path = storage.acquire(session, blob)
+        unused = storage.release(session, f"uploads/{user.avatar}" if user.avatar else None)
+        user.avatar = storage.upload_name(new_path)
+        session.commit()
+        storage.remove_files(session, unused)
+        return user.avatar
+
+    avatar = await db.run_sync(storage.uploading(blob, _update))
+
+    # 🖼️ Ảnh thu nhỏ / WebP tạo ở nền; xong thì đổi updated_at để ETag của profile đổi theo
+    def _touch_user(session: Session):
+        session.query(User).filter(User.user_id == user_id).update(
+            {User.updated_at: datetime.utcnow()}, synchronize_session=False
+        )
+
+    await image_worker.enqueue(f"uploads/{avatar}", on_ready=_touch_user)
 
     return {
         "message": "Cập nhật avatar thành công",
-        "file_name": file.filename
+        "file_name": avatar
     }
 
 
@@ -86,10 +105,9 @@ class PostCreate(BaseModel):
 # 🟢 ĐĂNG STATUS MỚI
 # ============================================================
 @router.post("/profile/{user_id}/post")
-def create_status(user_id: int, post: PostCreate, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.user_id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="Không tìm thấy người dùng")
+@async_db_route
+def create_status(user_id: int, post: PostCreate, user: CurrentUser = Depends(current_user), db: Session = Depends(get_db)):
+    require_self(user, user_id)
 
     new_post = Post(
         user_id=user_id,
@@ -112,7 +130,8 @@ def create_status(user_id: int, post: PostCreate, db: Session = Depends(get_db))
 # 🔵 LẤY DANH SÁCH STATUS CỦA NGƯỜI DÙNG
 # ============================================================
 @router.get("/profile/{user_id}/posts")
-def get_user_posts(user_id: int, db: Session = Depends(get_db)):
+@async_db_route
+def get_user_posts(user_id: int, db: Session = Depends(get_read_db)):
     posts = (
         db.query(Post)
         .filter(Post.user_id == user_id)
@@ -129,10 +148,12 @@ def get_user_posts(user_id: int, db: Session = Depends(get_db)):
         for p in posts
     ]
 @router.delete("/profile/post/{post_id}")
-def delete_post(post_id: int, db: Session = Depends(get_db)):
+@async_db_route
+def delete_post(post_id: int, user: CurrentUser = Depends(current_user), db: Session = Depends(get_db)):
     post = db.query(Post).filter(Post.post_id == post_id).first()  # ✅ dùng đúng tên cột
     if not post:
         raise HTTPException(status_code=404, detail="Không tìm thấy bài viết")
+    require_self(user, post.user_id)
 
     db.delete(post)
     db.commit()
@@ -141,7 +162,8 @@ def delete_post(post_id: int, db: Session = Depends(get_db)):
 # 🟣 LẤY THÔNG TIN CHI TIẾT USER (DÙNG CHO USER-PROFILE)
 # ============================================================
 @router.get("/user/{user_id}")
-def get_user_detail(user_id: int, request: Request, db: Session = Depends(get_db)):
+@async_db_route
+def get_user_detail(user_id: int, request: Request, db: Session = Depends(get_read_db)):
     user = db.query(User).filter(User.user_id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Không tìm thấy người dùng")
@@ -164,6 +186,7 @@ def get_user_detail(user_id: int, request: Request, db: Session = Depends(get_db
         "email": user.email,
         "bio": user.bio,
         "avatar": avatar_url,
+        "avatar_variants": variant_urls(base_url, f"uploads/{user.avatar}" if user.avatar else None),
         "forum_created": forum_created,
         "forum_joined": forum_joined,
         "total_likes": total_likes,
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from database import get_db
+from database import get_read_db, async_db_route
 from models.tag import Tag
 from models.forum_tag import ForumTag
+from response_cache import cached_route, TAG_TOP
+from etag import etag_route
 
 router = APIRouter(
     prefix="/tag",
@@ -11,7 +13,10 @@ router = APIRouter(
 )
 
 @router.get("/top")
-def get_top_tags(limit: int = 5, db: Session = Depends(get_db)):
+@etag_route(cache_control="public, max-age=60")
+@cached_route(TAG_TOP)
+@async_db_route
+def get_top_tags(request: Request, limit: int = 5, db: Session = Depends(get_read_db)):
     """
     Lấy ra top N tag được sử dụng nhiều nhất (mặc định 5)
     """
@@ -44,6 +44,10 @@ class MembershipBase(BaseModel):
     forum_id: int
     role: Optional[RoleEnum] = RoleEnum.member
 
+class MembershipJoin(BaseModel):
+    # user_id lấy từ token đăng nhập (identity.current_user), tự tham gia luôn là member
+    forum_id: int
+
 class MembershipResponse(MembershipBase):
     membership_id: int
     joined_at: datetime
@@ -0,0 +1,370 @@
+# search_index.py
+# 🔍 Chỉ mục tìm kiếm forum (tên, tag, caption)
+# - MySQL: bảng phụ forum_search + FULLTEXT (ngram) trên văn bản đã bỏ dấu
+# - Engine khác (SQLite khi test, dev): chỉ mục đảo ngược trong bộ nhớ, xếp hạng BM25
+#   Mỗi worker giữ 1 bản riêng, chỉ thấy forum tạo / sửa qua worker đó → run_rebuild() đồng bộ từng phần
+#   định kỳ (SEARCH_REBUILD_SECONDS): chỉ đọc (forum_id, version), nạp lại forum mới / đã đổi, bỏ forum đã xoá
+#   Từ gõ dở chỉ mở rộng tối đa SEARCH_PREFIX_EXPANSIONS từ phổ biến nhất
+# - MySQL: lúc khởi động, bảng forum_search rỗng mà đã có forum → tự build (forum có từ trước khi deploy)
+# - Tìm không phân biệt dấu tiếng Việt: "diễn đàn" ~ "dien dan"
+# Build lại chỉ mục:  python -m search_index   (từ thư mục Backend)
+import asyncio
+import bisect
+import heapq
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models.forum import Forum
+from models.forum_search import ForumSearch
+
+# Để trống = tự chọn theo DB (mysql → FULLTEXT, còn lại → bộ nhớ)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "")
+REBUILD_SECONDS = float(os.getenv("SEARCH_REBUILD_SECONDS", "60"))
+PREFIX_EXPANSIONS = int(os.getenv("SEARCH_PREFIX_EXPANSIONS", "50"))
+SYNC_BATCH = 1000
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Trọng số từng trường khi xếp hạng (chỉ mục bộ nhớ)
+FIELD_WEIGHTS = (("name", 3), ("tag", 2), ("caption", 1))
+
+
+def normalize(text: str) -> str:
+    """Chữ thường + bỏ dấu tiếng Việt (đ → d)."""
+    text = (text or "").lower().replace("đ", "d")
+    text = unicodedata.normalize("NFD", text)
+    return "".join(c for c in text if unicodedata.category(c) != "Mn")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(normalize(text))
+
+
+def forum_document(forum) -> str:
+    return normalize(" ".join(filter(None, (forum.name, forum.tag, forum.caption))))
+
+
+# ===============================
+# 🐬 MySQL FULLTEXT
+# ===============================
+class MySQLFulltextIndex:
+    def index_forum(self, db: Session, forum):
+        db.merge(ForumSearch(forum_id=forum.forum_id, document=forum_document(forum)))
+        db.commit()
+
+    def remove_forum(self, db: Session, forum_id: int):
+        db.query(ForumSearch).filter(ForumSearch.forum_id == forum_id).delete(synchronize_session=False)
+        db.commit()
+
+    def search(self, db: Session, keyword: str, offset: int, limit: int) -> Tuple[List[Tuple[int, float]], int]:
+        from sqlalchemy.dialects.mysql import match
+
+        terms = tokenize(keyword)
+        if not terms:
+            return [], 0
+        # Mỗi từ là 1 cụm ngram bắt buộc phải có → giống tìm chuỗi con nhưng dùng được index
+        against = " ".join(f'+"{t}"' for t in terms)
+        score = match(ForumSearch.document, against=against).in_boolean_mode()
+
+        total = db.query(func.count(ForumSearch.forum_id)).filter(score > 0).scalar()
+        rows = (
+            db.query(ForumSearch.forum_id, score.label("score"))
+            .filter(score > 0)
+            .order_by(score.desc(), ForumSearch.forum_id.desc())
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+        return [(forum_id, float(s)) for forum_id, s in rows], total
+
+    def backfill(self, db: Session) -> bool:
+        """Build lần đầu nếu bảng phụ còn rỗng nhưng đã có forum. True nếu đã build."""
+        if db.query(ForumSearch.forum_id).first() is not None or db.query(Forum.forum_id).first() is None:
+            return False
+        self.rebuild(db)
+        return True
+
+    def rebuild(self, db: Session):
+        db.query(ForumSearch).delete(synchronize_session=False)
+        for forum in db.query(Forum).yield_per(1000):
+            db.add(ForumSearch(forum_id=forum.forum_id, document=forum_document(forum)))
+        db.commit()
+
+
+# ===============================
+# 🧠 Chỉ mục đảo ngược trong bộ nhớ (BM25)
+# ===============================
+class MemorySearchIndex:
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[int, float]] = {}  # từ → {forum_id: tần suất có trọng số}
+        self._doc_terms: Dict[int, Dict[str, float]] = {}
+        self._doc_len: Dict[int, float] = {}
+        self._total_len = 0.0
+        self._versions: Dict[int, Optional[int]] = {}  # forum_id → Forum.version đã nạp (None = chưa rõ)
+        self._vocab: List[str] = []  # các từ đã sắp xếp, để tìm theo tiền tố
+        self._impact: Dict[str, List[Tuple[float, int]]] = {}
+        self._term_scores: Dict[str, Dict[int, float]] = {}  # từ → {forum_id: điểm BM25}, cache như _impact
+
+    def _add(self, forum_id: int, fields: Dict[str, str], update_vocab: bool = True, version: Optional[int] = None):
+        self._versions[forum_id] = version
+        terms: Counter = Counter()
+        for field, weight in FIELD_WEIGHTS:
+            for token in tokenize(fields.get(field) or ""):
+                terms[token] += weight
+        self._doc_terms[forum_id] = dict(terms)
+        self._doc_len[forum_id] = sum(terms.values())
+        self._total_len += self._doc_len[forum_id]
+        for term, tf in terms.items():
+            self._impact.pop(term, None)
+            self._term_scores.pop(term, None)
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = {}
+                if update_vocab:
+                    bisect.insort(self._vocab, term)
+            posting[forum_id] = tf
+
+    def _remove(self, forum_id: int):
+        self._versions.pop(forum_id, None)
+        terms = self._doc_terms.pop(forum_id, None)
+        if terms is None:
+            return
+        self._total_len -= self._doc_len.pop(forum_id)
+        for term in terms:
+            self._impact.pop(term, None)
+            self._term_scores.pop(term, None)
+            posting = self._postings[term]
+            posting.pop(forum_id, None)
+            if not posting:
+                del self._postings[term]
+                del self._vocab[bisect.bisect_left(self._vocab, term)]
+
+    def add_document(self, forum_id: int, name: str, tag: str, caption: str):
+        with self._lock:
+            self._remove(forum_id)
+            self._add(forum_id, {"name": name, "tag": tag, "caption": caption})
+
+    def index_forum(self, db: Session, forum):
+        if self.ready:
+            self.add_document(forum.forum_id, forum.name, forum.tag, forum.caption)
+
+    def remove_forum(self, db: Session, forum_id: int):
+        with self._lock:
+            self._remove(forum_id)
+
+    def _expand(self, term: str) -> List[str]:
+        # Từ gõ dở: khớp các từ có cùng tiền tố ("gam" → "game", "gamer")
+        start = bisect.bisect_left(self._vocab, term)
+        end = bisect.bisect_left(self._vocab, term + "\uffff")
+        terms = self._vocab[start:end]
+        if len(terms) > PREFIX_EXPANSIONS:
+            # Tiền tố ngắn khớp hàng nghìn từ: giữ chính từ đó + các từ có nhiều tài liệu nhất
+            terms = heapq.nlargest(PREFIX_EXPANSIONS, terms, key=lambda t: (t == term, len(self._postings[t])))
+        return terms
+
+    def _score(self, idf: float, tf: float, doc_len: float, avg_len: float) -> float:
+        return idf * tf * (self.K1 + 1) / (tf + self.K1 * (1 - self.B + self.B * doc_len / avg_len))
+
+    def _idf(self, term: str, n_docs: int) -> float:
+        df = len(self._postings[term])
+        return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+    def _scores_of(self, term: str, n_docs: int, avg_len: float) -> Dict[int, float]:
+        # Điểm BM25 của từng tài liệu chứa từ này; bị xoá khi từ đó thay đổi
+        cached = self._term_scores.get(term)
+        if cached is None:
+            idf = self._idf(term, n_docs)
+            cached = {
+                fid: self._score(idf, tf, self._doc_len[fid], avg_len) for fid, tf in self._postings[term].items()
+            }
+            self._term_scores[term] = cached
+        return cached
+
+    def _impact_list(self, term: str, n_docs: int, avg_len: float) -> List[Tuple[float, int]]:
+        # Danh sách (điểm, forum_id) của 1 từ, sắp xếp sẵn giảm dần; bị xoá khi từ đó thay đổi
+        cached = self._impact.get(term)
+        if cached is None:
+            cached = sorted(((score, fid) for fid, score in self._scores_of(term, n_docs, avg_len).items()), reverse=True)
+            self._impact[term] = cached
+        return cached
+
+    def _matching_docs(self, group: List[str]):
+        if len(group) == 1:
+            return self._postings[group[0]].keys()
+        return set().union(*(self._postings[t].keys() for t in group))
+
+    def search(self, db: Session, keyword: str, offset: int, limit: int) -> Tuple[List[Tuple[int, float]], int]:
+        if not self.ready:
+            self.rebuild(db)
+        terms = tokenize(keyword)
+        if not terms:
+            return [], 0
+
+        need = offset + limit
+        with self._lock:
+            n_docs = len(self._doc_terms) or 1
+            avg_len = (self._total_len / n_docs) or 1.0
+            # Các từ đã gõ xong khớp chính xác, riêng từ cuối khớp theo tiền tố
+            groups = [[t] if t in self._postings else [] for t in terms[:-1]]
+            groups.append(self._expand(terms[-1]))
+            if not all(groups):
+                return [], 0
+
+            if len(groups) == 1:
+                # 1 từ: top-k của từng danh sách đã sắp xếp là đủ để ra top-k chung (điểm = max)
+                best: Dict[int, float] = {}
+                for term in groups[0]:
+                    for score, fid in self._impact_list(term, n_docs, avg_len)[:need]:
+                        if score > best.get(fid, 0.0):
+                            best[fid] = score
+                total = len(self._matching_docs(groups[0]))
+            else:
+                # Nhiều từ (AND): giao tập tài liệu trước, chỉ tính điểm cho phần giao
+                candidates = set(self._matching_docs(groups[0]))
+                for group in groups[1:]:
+                    candidates.intersection_update(self._matching_docs(group))
+                    if not candidates:
+                        return [], 0
+                best = dict.fromkeys(candidates, 0.0)
+                for group in groups:
+                    if len(group) == 1:
+                        scores = self._scores_of(group[0], n_docs, avg_len)
+                    else:
+                        # Từ gõ dở: điểm của tài liệu = điểm cao nhất trong các từ mở rộng
+                        scores = {}
+                        for term in group:
+                            for fid, score in self._scores_of(term, n_docs, avg_len).items():
+                                if fid in best and score > scores.get(fid, 0.0):
+                                    scores[fid] = score
+                    for fid in candidates:
+                        best[fid] += scores[fid]
+                total = len(candidates)
+
+        ranked = heapq.nlargest(need, best.items(), key=lambda item: (item[1], item[0]))
+        return ranked[offset:], total
+
+    def rebuild(self, db: Session):
+        rows = db.query(Forum.forum_id, Forum.name, Forum.tag, Forum.caption, Forum.version).yield_per(5000)
+        fresh = MemorySearchIndex()
+        for forum_id, name, tag, caption, version in rows:
+            fresh._add(forum_id, {"name": name, "tag": tag, "caption": caption}, update_vocab=False, version=version)
+        fresh._vocab = sorted(fresh._postings)
+        with self._lock:
+            self._postings = fresh._postings
+            self._doc_terms = fresh._doc_terms
+            self._doc_len = fresh._doc_len
+            self._total_len = fresh._total_len
+            self._versions = fresh._versions
+            self._vocab = fresh._vocab
+            self._impact = {}
+            self._term_scores = {}
+            self.ready = True
+
+    def sync(self, db: Session) -> Tuple[int, int]:
+        """
+        Đồng bộ từng phần với DB (forum tạo / sửa / xoá qua worker khác): so Forum.version với bản đã nạp,
+        chỉ đọc lại nội dung forum mới hoặc đã đổi. Chưa build lần nào thì build toàn bộ.
+        Trả về (số forum nạp lại, số forum bỏ).
+        """
+        if not self.ready:
+            self.rebuild(db)
+            return len(self._versions), 0
+        current = dict(db.query(Forum.forum_id, Forum.version))
+        with self._lock:
+            changed = [fid for fid, version in current.items() if self._versions.get(fid, -1) != version]
+            removed = [fid for fid in self._versions if fid not in current]
+        for i in range(0, len(changed), SYNC_BATCH):
+            rows = (
+                db.query(Forum.forum_id, Forum.name, Forum.tag, Forum.caption, Forum.version)
+                .filter(Forum.forum_id.in_(changed[i:i + SYNC_BATCH]))
+                .all()
+            )
+            with self._lock:
+                for forum_id, name, tag, caption, version in rows:
+                    self._remove(forum_id)
+                    self._add(forum_id, {"name": name, "tag": tag, "caption": caption}, version=version)
+        with self._lock:
+            for forum_id in removed:
+                self._remove(forum_id)
+        return len(changed), len(removed)
+
+
+# ===============================
+# 🧭 Chọn backend theo DB
+# ===============================
+_index = None
+
+
+def get_index(db: Session):
+    global _index
+    if _index is None:
+        backend = SEARCH_BACKEND or db.get_bind().dialect.name
+        _index = MySQLFulltextIndex() if backend in ("mysql", "mariadb") else MemorySearchIndex()
+    return _index
+
+
+def index_forum(db: Session, forum):
+    get_index(db).index_forum(db, forum)
+
+
+def remove_forum(db: Session, forum_id: int):
+    get_index(db).remove_forum(db, forum_id)
+
+
+def search(db: Session, keyword: str, offset: int = 0, limit: int = 20):
+    """Trả về ([(forum_id, điểm liên quan)], tổng số kết quả)."""
+    return get_index(db).search(db, keyword, offset, limit)
+
+
+async def run_rebuild(session_factory, interval: float = REBUILD_SECONDS):
+    """
+    Task nền (thread riêng): chỉ mục bộ nhớ → build lần đầu rồi sync() từng phần định kỳ;
+    FULLTEXT → chỉ build bảng forum_search nếu còn rỗng rồi dừng.
+    """
+    loop = asyncio.get_running_loop()
+
+    def _rebuild() -> bool:
+        db = session_factory()
+        try:
+            index = get_index(db)
+            if not isinstance(index, MemorySearchIndex):
+                if index.backfill(db):
+                    print("✅ Đã build bảng forum_search cho các forum có sẵn")
+                return False
+            index.sync(db)
+            return True
+        finally:
+            db.close()
+
+    while True:
+        try:
+            if not await loop.run_in_executor(None, _rebuild):
+                return
+        except Exception as e:
+            print(f"⚠️ Không thể build lại chỉ mục tìm kiếm: {e}")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    import models
+
+    db = SessionLocal()
+    try:
+        get_index(db).rebuild(db)
+        print("✅ Đã build lại chỉ mục tìm kiếm forum")
+    finally:
+        db.close()
@@ -0,0 +1,160 @@
+# static_files.py
+# 🗂️ Phục vụ /static và /Frontend (thay StaticFiles mặc định)
+# - Cache-Control theo loại file: blob trong kho (uploads/blobs, tên = SHA-256 nội dung, xem storage.py)
+#   không bao giờ đổi → "immutable" 1 năm; file khác → luôn hỏi lại server (ETag / Last-Modified → 304)
+# - Byte-range (video/audio trong tin nhắn): FileResponse của Starlette đã hỗ trợ Range / If-Range,
+#   server ASGI có extension http.response.pathsend thì gửi file không qua Python
+# - File nén sẵn: có x.js.br / x.js.gz cạnh x.js và client chấp nhận → gửi bản nén, không nén lúc chạy
+# - STATIC_ACCEL_PREFIX (chạy sau nginx): chỉ trả header X-Accel-Redirect, nginx tự gửi file
+#   (sendfile, Range, gzip_static), worker Python không phải đọc byte nào. Ví dụ nginx:
+#       location /_files/static/   { internal; alias /app/Backend/static/; }
+#       location /_files/Frontend/ { internal; alias /app/Frontend/; }
+#   với STATIC_ACCEL_PREFIX=/_files
+# Tạo sẵn bản nén:  python -m static_files ../Frontend   (từ thư mục Backend)
+import gzip
+import mimetypes
+import os
+import sys
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+import storage
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = os.getenv("STATIC_CACHE_CONTROL", "public, no-cache")
+ACCEL_PREFIX = os.getenv("STATIC_ACCEL_PREFIX", "").rstrip("/")
+
+# Thứ tự ưu tiên khi client nhận cả hai
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/xml")
+MIN_COMPRESS_BYTES = 1024
+
+
+def is_compressible(media_type: Optional[str]) -> bool:
+    return bool(media_type) and media_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def accepted_encodings(header: str) -> set:
+    """Các encoding client nhận (bỏ những cái q=0)."""
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class StaticAssets(StaticFiles):
+    def __init__(self, *args, immutable_prefix: Optional[str] = None, **kwargs):
+        """immutable_prefix: thư mục con (tính từ directory) chứa file đặt tên theo nội dung."""
+        super().__init__(*args, **kwargs)
+        self.immutable_dir = (
+            os.path.join(os.path.realpath(self.directory), immutable_prefix) + os.sep if immutable_prefix else None
+        )
+
+    def cache_control(self, full_path: str) -> str:
+        if self.immutable_dir and os.path.realpath(full_path).startswith(self.immutable_dir):
+            return IMMUTABLE_CACHE_CONTROL
+        return DEFAULT_CACHE_CONTROL
+
+    def _precompressed(
+        self, full_path: str, source: os.stat_result, request_headers: Headers
+    ) -> Optional[Tuple[str, str, os.stat_result]]:
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accepted:
+                continue
+            try:
+                stat_result = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            if stat_result.st_mtime < source.st_mtime:
+                continue  # bản nén cũ hơn file gốc (quên chạy lại precompress)
+            return encoding, full_path + suffix, stat_result
+        return None
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+        headers = {"Cache-Control": self.cache_control(full_path)}
+
+        if ACCEL_PREFIX:
+            headers["X-Accel-Redirect"] = ACCEL_PREFIX + scope["path"]  # path đầy đủ, vd /static/uploads/…
+            return Response(status_code=status_code, headers=headers, media_type=media_type)
+
+        path = full_path
+        if is_compressible(media_type):
+            headers["Vary"] = "Accept-Encoding"
+            # Có Range thì gửi bản gốc (offset tính trên nội dung chưa nén)
+            found = None if "range" in request_headers else self._precompressed(full_path, stat_result, request_headers)
+            if found:
+                encoding, path, stat_result = found
+                headers["Content-Encoding"] = encoding
+
+        response = FileResponse(
+            path, status_code=status_code, stat_result=stat_result, media_type=media_type, headers=headers
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def static_app(directory: str) -> StaticAssets:
+    """App cho mount /static: blob trong kho được cache vĩnh viễn."""
+    return StaticAssets(directory=directory, immutable_prefix=storage.BLOB_PREFIX)
+
+
+# ===============================
+# 🗜️ Tạo sẵn .gz / .br cho file tĩnh (chạy lúc deploy)
+# ===============================
+def _compressors():
+    yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    try:
+        import brotli
+    except ImportError:
+        print("⚠️ Chưa cài brotli → chỉ tạo .gz (pip install brotli)")
+        return
+    yield ".br", lambda data: brotli.compress(data, quality=11)
+
+
+def precompress(root: str) -> int:
+    compressors = list(_compressors())
+    written = 0
+    for folder, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(folder, name)
+            if not is_compressible(mimetypes.guess_type(path)[0]) or os.path.getsize(path) < MIN_COMPRESS_BYTES:
+                continue
+            source_mtime = os.path.getmtime(path)
+            data = None
+            for suffix, compress in compressors:
+                target = path + suffix
+                if os.path.exists(target) and os.path.getmtime(target) >= source_mtime:
+                    continue
+                if data is None:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                packed = compress(data)
+                if len(packed) >= len(data):
+                    continue  # nén không lợi
+                with open(target, "wb") as f:
+                    f.write(packed)
+                written += 1
+    return written
+
+
+if __name__ == "__main__":
+    roots = sys.argv[1:] or [os.path.join(os.path.dirname(os.path.abspath(__file__)), "../Frontend")]
+    for root in roots:
+        print(f"✅ {root}: đã tạo {precompress(root)} file nén")
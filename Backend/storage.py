@@ -0,0 +1,253 @@
+# storage.py
+# 📦 Lưu file upload theo nội dung (content-addressed)
+# - Đọc UploadFile theo chunk, ghi file tạm + băm SHA-256 trong threadpool → không chặn event loop
+# - Tên file = digest (+ đuôi file): cùng nội dung chỉ lưu 1 bản, không dùng tên file người dùng gửi lên
+# - Bảng stored_file đếm số nơi đang dùng (forum background, avatar, file trong tin nhắn);
+#   release() về 0 mới xoá file trên đĩa
+# - File tạm nằm ngoài static/ (UPLOAD_TMP_DIR, mặc định upload_tmp/ cạnh static/): static/ được phục vụ công khai
+#   + cache immutable; cùng thư mục cha → cùng ổ đĩa, chuyển vào kho chỉ là đổi tên. Tạo lúc khởi động (main.py)
+# - acquire() giữ tham chiếu trong DB TRƯỚC rồi mới đảm bảo file có trên đĩa (thiếu thì ghi lại);
+#   remove_files() khoá dòng rồi mới xoá → xoá và dùng lại cùng nội dung không giẫm lên nhau
+# - Lỗi giữa save() và commit: storage.uploading(blob, fn) dọn file tạm / file vừa ghi mà không ai dùng
+# - Thao tác đĩa gọi trong session (acquire / discard / remove_files) đi qua database.offload():
+#   trong route async_db_route chúng chạy ở threadpool, không chặn event loop
+# - Giới hạn dung lượng: chặn theo Content-Length trước khi nhận body (middleware trong main.py),
+#   UploadFile.size, và dừng ngay khi vượt trong lúc đọc
+import glob
+import hashlib
+import os
+import re
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import offload
+from models.stored_file import StoredFile
+
+STATIC_DIR = "static"
+BLOB_PREFIX = "uploads/blobs"  # tính từ static/ (avatar cũ lưu tương đối với static/uploads → vẫn hiển thị được)
+BLOB_DIR = os.path.join(STATIC_DIR, BLOB_PREFIX)
+# KHÔNG đặt trong static/; đường dẫn tương đối tính từ thư mục chứa static/, không phụ thuộc cwd lúc ghi
+TMP_DIR = os.path.join(os.path.dirname(os.path.abspath(STATIC_DIR)), os.getenv("UPLOAD_TMP_DIR", "upload_tmp"))
+TMP_MAX_AGE = 3600  # file tạm cũ hơn (process chết giữa chừng) bị dọn lúc khởi động
+
+UPLOAD_MAX_BYTES = int(float(os.getenv("UPLOAD_MAX_MB", "20")) * 1024 * 1024)
+IMAGE_MAX_BYTES = int(float(os.getenv("UPLOAD_IMAGE_MAX_MB", "5")) * 1024 * 1024)
+CHUNK_SIZE = 1024 * 1024
+
+EXT_RE = re.compile(r"^\.[a-z0-9]{1,8}$")
+
+
+@dataclass
+class Blob:
+    digest: str
+    path: str  # tính từ static/, vd "uploads/blobs/ab/ab12….jpg"
+    size: int
+    content_type: Optional[str]
+    tmp_path: Optional[str] = None  # nội dung nằm đây cho tới khi acquire() đưa vào kho
+    written: Optional[str] = None  # file trong kho do chính request này ghi (dọn nếu lỗi)
+
+
+def upload_name(path: str) -> str:
+    """Đường dẫn tính từ static/uploads (cách cột user.avatar đang lưu)."""
+    return path[len("uploads/"):]
+
+
+def _extension(filename: Optional[str]) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if EXT_RE.match(ext) else ""
+
+
+def _too_large(max_bytes: int):
+    return HTTPException(status_code=413, detail=f"File quá lớn (tối đa {max_bytes // (1024 * 1024)} MB)")
+
+
+def _open_tmp():
+    return tempfile.NamedTemporaryFile(dir=TMP_DIR, delete=False)
+
+
+def _write_chunk(tmp, hasher, chunk: bytes):
+    hasher.update(chunk)
+    tmp.write(chunk)
+
+
+def _unlink(path: Optional[str]):
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"⚠️ Không thể xóa file {path}: {e}")
+
+
+def _drop_tmp(tmp, tmp_path: str):
+    tmp.close()
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+async def save(file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> Blob:
+    """Ghi file vào thư mục tạm và trả về Blob. Chưa vào kho — gọi acquire() trong hàm bọc bởi uploading()."""
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    hasher = hashlib.sha256()
+    size = 0
+    tmp = await run_in_threadpool(_open_tmp)
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise _too_large(max_bytes)
+            await run_in_threadpool(_write_chunk, tmp, hasher, chunk)
+        await run_in_threadpool(tmp.close)
+    except BaseException:
+        await run_in_threadpool(_drop_tmp, tmp, tmp.name)
+        raise
+
+    digest = hasher.hexdigest()
+    rel_path = f"{BLOB_PREFIX}/{digest[:2]}/{digest}{_extension(file.filename)}"
+    return Blob(digest=digest, path=rel_path, size=size, content_type=file.content_type, tmp_path=tmp.name)
+
+
+def _place(tmp_path: str, final_path: str) -> bool:
+    """Chuyển file tạm vào kho. True nếu đã ghi, False nếu kho đã có bản giống hệt."""
+    if os.path.exists(final_path):
+        _unlink(tmp_path)  # đã có bản giống hệt → không ghi lại
+        return False
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(tmp_path, final_path)
+    return True
+
+
+def _ensure_file(blob: Blob, path: str):
+    """Đảm bảo nội dung có ở static/<path>; thiếu (vừa bị xoá / chưa từng ghi) thì ghi từ file tạm."""
+    final_path = os.path.join(STATIC_DIR, path)
+    if blob.tmp_path is None:
+        return
+    if offload(_place, blob.tmp_path, final_path):
+        blob.written = final_path
+    blob.tmp_path = None
+
+
+def acquire(db: Session, blob: Blob) -> str:
+    """Tăng ref_count (tạo dòng nếu chưa có) rồi đảm bảo file có trên đĩa. Trả về path đã lưu. Chưa commit."""
+    for _ in range(2):
+        updated = db.query(StoredFile).filter(StoredFile.digest == blob.digest).update(
+            {StoredFile.ref_count: StoredFile.ref_count + 1}, synchronize_session=False
+        )
+        if updated:
+            # Cùng nội dung, có thể khác đuôi → dùng path đã lưu
+            path = db.query(StoredFile.path).filter(StoredFile.digest == blob.digest).scalar()
+            _ensure_file(blob, path)
+            return path
+        try:
+            with db.begin_nested():
+                db.add(StoredFile(
+                    digest=blob.digest, path=blob.path, size=blob.size,
+                    content_type=blob.content_type, ref_count=1
+                ))
+        except IntegrityError:
+            continue  # request khác vừa tạo cùng digest → quay lại UPDATE
+        _ensure_file(blob, blob.path)
+        return blob.path
+    raise HTTPException(status_code=500, detail="Không thể lưu file")
+
+
+def discard(db: Session, blob: Optional[Blob]):
+    """Dọn sau lỗi: xoá file tạm, và file trong kho do request này ghi nếu không còn dòng nào tham chiếu."""
+    if blob is None:
+        return
+    offload(_unlink, blob.tmp_path)
+    blob.tmp_path = None
+    if blob.written:
+        db.rollback()
+        remove_files(db, blob.written)
+        blob.written = None
+
+
+def uploading(blob: Optional[Blob], fn):
+    """
+    Bọc hàm chạy trong session (db.run_sync(storage.uploading(blob, _update))): lỗi ở bất kỳ đâu
+    (404, IntegrityError, commit hỏng...) → discard(); xong mà không acquire() (trả về sớm) → bỏ file tạm.
+    """
+    def run(db: Session):
+        try:
+            result = fn(db)
+        except BaseException:
+            discard(db, blob)
+            raise
+        if blob is not None:
+            offload(_unlink, blob.tmp_path)
+        return result
+    return run
+
+
+def ensure_tmp_dir():
+    os.makedirs(TMP_DIR, exist_ok=True)
+
+
+def sweep_tmp(max_age: float = TMP_MAX_AGE):
+    """Xoá file tạm bị bỏ lại (process chết giữa save() và acquire())."""
+    cutoff = time.time() - max_age
+    for entry in os.scandir(TMP_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def release(db: Session, path: Optional[str]) -> Optional[str]:
+    """
+    Giảm ref_count của file theo path (tính từ static/). Path không thuộc kho (file cũ) thì bỏ qua.
+    Trả về đường dẫn trên đĩa cần xoá sau khi commit (hết tham chiếu), hoặc None.
+    """
+    if not path or not path.startswith(BLOB_PREFIX + "/"):
+        return None
+    digest = os.path.splitext(os.path.basename(path))[0]
+    db.query(StoredFile).filter(StoredFile.digest == digest).update(
+        {StoredFile.ref_count: StoredFile.ref_count - 1}, synchronize_session=False
+    )
+    deleted = db.query(StoredFile).filter(
+        StoredFile.digest == digest, StoredFile.ref_count <= 0
+    ).delete(synchronize_session=False)
+    return os.path.join(STATIC_DIR, path) if deleted else None
+
+
+def _unlink_blob(path: str):
+    # File gốc + các bản phái sinh <digest>.<tên>.webp
+    for target in [path] + glob.glob(glob.escape(os.path.splitext(path)[0]) + ".*.*"):
+        _unlink(target)
+
+
+def remove_files(db: Session, *paths: Optional[str]):
+    """
+    Xoá file đã hết tham chiếu (gọi sau commit), kèm các bản phái sinh <digest>.<tên>.webp.
+    File trong kho chỉ bị xoá khi không còn dòng stored_file: SELECT ... FOR UPDATE giữ khoá (InnoDB khoá cả
+    khoảng trống của digest chưa có) → acquire() đồng thời phải chờ tới commit này, sau đó thấy file thiếu và ghi lại.
+    """
+    for path in paths:
+        if not path:
+            continue
+        if not os.path.normpath(path).startswith(os.path.normpath(BLOB_DIR) + os.sep):
+            offload(_unlink, path)  # file cũ ngoài kho
+            continue
+        digest = os.path.splitext(os.path.basename(path))[0]
+        try:
+            in_use = db.query(StoredFile.digest).filter(StoredFile.digest == digest).with_for_update().first()
+            if in_use is None:
+                offload(_unlink_blob, path)
+        finally:
+            db.commit()
@@ -0,0 +1,55 @@
+# tests/conftest.py
+# 🧪 Môi trường chung cho pytest (chạy từ thư mục Backend:  python -m pytest -q)
+# - Biến môi trường phải đặt TRƯỚC khi import database / main (đọc cấu hình lúc import)
+# - DB SQLite tạm + ASYNC_DB=1 (aiosqlite), không cần MySQL / Redis / mạng
+# - Thư mục làm việc tạm: static/, upload_tmp/ không ghi vào cây mã nguồn
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix="forum-tests-")
+CERTS_FILE = os.path.join(WORK_DIR, "firebase-certs.json")
+with open(CERTS_FILE, "w") as f:
+    json.dump({}, f)
+
+os.environ.update(
+    JWT_SECRET_KEY="test-secret",
+    DATABASE_URL=f"sqlite:///{WORK_DIR}/forum.db",
+    ASYNC_DB="1",
+    ASYNC_DATABASE_URL=f"sqlite+aiosqlite:///{WORK_DIR}/forum.db",
+    PASSWORD_WORKERS="0",
+    FIREBASE_PROJECT_ID="forum-test",
+    FIREBASE_CERTS_URL=f"file://{CERTS_FILE}",
+)
+os.environ.pop("DATABASE_REPLICA_URLS", None)
+os.environ.pop("CHAT_BROKER_URL", None)
+os.environ.pop("CACHE_URL", None)
+os.chdir(WORK_DIR)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def login(client):
+    """login("an") → (headers Authorization, user_id); tạo tài khoản nếu chưa có."""
+    def _login(username: str):
+        client.post("/auth/signup", json={"username": username, "email": f"{username}@example.com", "password": "pw"})
+        r = client.post("/auth/signin", json={"username": username, "password": "pw"})
+        assert r.status_code == 200, r.text
+        return {"Authorization": f"Bearer {r.json()['token']}"}, r.json()["user"]["id"]
+
+    return _login
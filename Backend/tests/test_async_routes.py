@@ -0,0 +1,77 @@
+# tests/test_async_routes.py
+# 🔁 Luồng route chính khi bật ASYNC_DB=1 (AsyncSession + aiosqlite, xem database.async_db_route)
+import asyncio
+import threading
+
+import database
+
+
+def test_async_engine_in_use():
+    assert database.ASYNC_DB and database.async_engine is not None
+
+
+def test_forum_flow(client, login):
+    owner, _ = login("an")
+    r = client.post("/auth/signup", json={"username": "bo", "email": "bo@example.com", "password": "pw"})
+    assert r.status_code == 200, r.text
+    other_id = r.json()["user_id"]
+    other, signed_in_id = login("bo")
+    assert signed_in_id == other_id
+
+    r = client.post("/forum/create", data={"name": "Diễn đàn", "tag": "game", "caption": "xin chào"}, headers=owner)
+    assert r.status_code == 200, r.text
+    forum_id = r.json()["forum_id"]
+
+    r = client.get(f"/forum/{forum_id}")
+    assert r.status_code == 200
+    assert r.json()["name"] == "Diễn đàn"
+
+    assert client.post("/membership/join", json={"forum_id": forum_id}, headers=other).status_code == 200
+    members = client.get(f"/membership/{forum_id}").json()
+    assert len(members) == 2
+
+    r = client.post("/message/send", data={"forum_id": forum_id, "content": "chào cả nhà"}, headers=other)
+    assert r.status_code == 200, r.text
+    message_id = r.json()["message_id"]
+    r = client.post(
+        "/message/send", data={"forum_id": forum_id, "content": "chào", "reply_to": message_id}, headers=owner
+    )
+    assert r.json()["reply_preview"]["content"] == "chào cả nhà"
+
+    # Không limit / cursor: mảng trần như API cũ; có limit: trang cursor
+    r = client.get(f"/message/forum/{forum_id}")
+    assert r.status_code == 200
+    assert [m["content"] for m in r.json()] == ["chào cả nhà", "chào"]
+    page = client.get(f"/message/forum/{forum_id}", params={"limit": 1}).json()
+    assert [m["content"] for m in page["results"]] == ["chào"]
+    assert page["has_more"] is True
+    older = client.get(f"/message/forum/{forum_id}", params={"before": page["before"]}).json()
+    assert [m["content"] for m in older["results"]] == ["chào cả nhà"]
+    assert [m["content"] for m in client.get(f"/chat/{forum_id}").json()] == ["chào cả nhà", "chào"]
+    assert client.get(f"/chat/{forum_id}", params={"limit": 5}).json()["has_more"] is False
+
+    assert client.post(f"/forum/{forum_id}/like", headers=other).json()["liked"] is True
+    assert client.get(f"/forum/liked/{other_id}").json() == {"liked_forum_ids": [forum_id]}
+
+    assert client.get("/forum/search", params={"keyword": "dien dan"}).json()["total"] == 1
+
+
+def test_offload_leaves_event_loop_inside_run_sync():
+    # Thân route async_db_route chạy trong greenlet trên event loop: offload() phải chuyển IO sang thread khác
+    async def scenario():
+        loop_thread = threading.get_ident()
+        async with database.AsyncSessionLocal() as db:
+            inside, offloaded = await db.run_sync(
+                lambda session: (threading.get_ident(), database.offload(threading.get_ident))
+            )
+        return loop_thread, inside, offloaded
+
+    loop_thread, inside, offloaded = asyncio.run(scenario())
+    assert inside == loop_thread
+    assert offloaded != loop_thread
+    assert database.offload(threading.get_ident) == threading.get_ident()  # ngoài greenlet: gọi thẳng
+
+
+def test_auth_required(client):
+    r = client.post("/forum/create", data={"name": "F", "tag": "game"})
+    assert r.status_code == 401
@@ -0,0 +1,92 @@
+# tests/test_chat_hub.py
+# 🛰️ ChatHub: 2 hub dùng chung 1 MemoryBroker = 2 worker; client chậm bị ngắt (1013), client khác vẫn nhận
+import asyncio
+import json
+
+from chat_hub import SLOW_CONSUMER_CLOSE_CODE, ChatHub, MemoryBackend, MemoryBroker
+
+
+class FakeWebSocket:
+    """WebSocket giả: ghi lại tin đã gửi; blocked=True thì send_text treo như client không đọc."""
+
+    def __init__(self, blocked: bool = False):
+        self.sent = []
+        self.close_code = None
+        self._unblocked = asyncio.Event()
+        if not blocked:
+            self._unblocked.set()
+
+    async def send_text(self, data: str):
+        await self._unblocked.wait()
+        self.sent.append(json.loads(data))
+
+    async def close(self, code: int):
+        self.close_code = code
+
+
+async def _settle():
+    # Cho các task ghi / đóng socket chạy hết
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_message_reaches_clients_on_both_workers():
+    async def scenario():
+        broker = MemoryBroker()
+        worker_a = ChatHub(MemoryBackend(broker))
+        worker_b = ChatHub(MemoryBackend(broker))
+        ws_a, ws_b, other_forum = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await worker_a.connect(1, ws_a)
+        await worker_b.connect(1, ws_b)
+        await worker_b.connect(2, other_forum)
+
+        await worker_a.publish(1, {"content": "xin chào"})
+        await _settle()
+
+        assert ws_a.sent == [{"content": "xin chào"}]
+        assert ws_b.sent == [{"content": "xin chào"}]
+        assert other_forum.sent == []
+        await worker_a.stop()
+        await worker_b.stop()
+
+    asyncio.run(scenario())
+
+
+def test_slow_consumer_is_closed_while_others_keep_receiving():
+    async def scenario():
+        hub = ChatHub(MemoryBackend(), max_queue=2)
+        slow, fast = FakeWebSocket(blocked=True), FakeWebSocket()
+        await hub.connect(1, slow)
+        await hub.connect(1, fast)
+
+        # Writer của slow lấy 1 tin rồi treo, 2 tin tiếp lấp đầy hàng đợi, tin thứ 4 làm tràn
+        for i in range(5):
+            await hub.publish(1, {"n": i})
+            await _settle()
+
+        assert slow.close_code == SLOW_CONSUMER_CLOSE_CODE
+        assert slow not in hub.connections[1]
+        assert [m["n"] for m in fast.sent] == [0, 1, 2, 3, 4]
+        await hub.stop()
+
+    asyncio.run(scenario())
+
+
+def test_disconnect_cancels_writer_task():
+    async def scenario():
+        hub = ChatHub(MemoryBackend())
+        ws = FakeWebSocket(blocked=True)
+        await hub.connect(1, ws)
+        writer = hub.connections[1][ws]._writer
+        await hub.publish(1, {"content": "treo"})
+        await _settle()
+        assert not writer.done()
+
+        hub.disconnect(1, ws)
+        await _settle()
+
+        assert writer.cancelled()
+        assert 1 not in hub.connections
+        await hub.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,38 @@
+# tests/test_etag_cache.py
+# 🏷️ ETag (Forum.version) + cache response: body cache và ETag phải cùng 1 phiên bản
+from database import SessionLocal
+from models.forum import Forum
+
+
+def _bump_without_invalidate(forum_id: int, **values):
+    # Giả lập lượt ghi xảy ra trong lúc 1 cache miss đang dựng body: version đã tăng,
+    # invalidate() đã chạy TRƯỚC khi miss kịp lưu body cũ
+    db = SessionLocal()
+    try:
+        db.query(Forum).filter(Forum.forum_id == forum_id).update(
+            {**values, Forum.version: Forum.version + 1}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_stale_body_not_served_with_new_etag(client, login):
+    headers, _ = login("etag-owner")
+    forum_id = client.post("/forum/create", data={"name": "Cũ", "tag": "etag"}, headers=headers).json()["forum_id"]
+
+    first = client.get(f"/forum/{forum_id}")
+    assert first.headers["x-cache"] == "MISS"
+    assert client.get(f"/forum/{forum_id}").headers["x-cache"] == "HIT"
+    old_etag = first.headers["etag"]
+
+    _bump_without_invalidate(forum_id, name="Mới")
+
+    r = client.get(f"/forum/{forum_id}", headers={"If-None-Match": old_etag})
+    assert r.status_code == 200
+    assert r.headers["x-cache"] == "MISS"
+    assert r.json()["name"] == "Mới"
+    assert r.headers["etag"] != old_etag
+
+    r = client.get(f"/forum/{forum_id}", headers={"If-None-Match": r.headers["etag"]})
+    assert r.status_code == 304
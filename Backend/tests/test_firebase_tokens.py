@@ -0,0 +1,111 @@
+# tests/test_firebase_tokens.py
+# 🔥 FirebaseVerifier với chứng chỉ tự tạo (không gọi Google): token hợp lệ, hết hạn, sai audience, kid lạ
+import asyncio
+import datetime
+import time
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from jose import jwt
+
+import firebase_tokens
+from firebase_tokens import FirebaseVerifier, InvalidFirebaseToken
+
+PROJECT_ID = "forum-test"
+
+
+def _keypair():
+    """(private key PEM, chứng chỉ x509 tự ký PEM) giống dạng Google trả về."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.system.gserviceaccount.com")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    return private_pem, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+PRIVATE_KEY, CERT = _keypair()
+OTHER_PRIVATE_KEY, OTHER_CERT = _keypair()
+
+
+def _token(private_key=PRIVATE_KEY, kid="kid-1", **overrides) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": "firebase-uid-1",
+        "iat": now - 10,
+        "auth_time": now - 10,
+        "exp": now + 3600,
+        "email": "an@example.com",
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+def _verify(token: str, certs=None, fetch=None):
+    async def run():
+        verifier = FirebaseVerifier(project_id=PROJECT_ID, fetch=fetch or (lambda: (certs or {"kid-1": CERT}, 3600)))
+        return await verifier.verify(token)
+
+    return asyncio.run(run())
+
+
+def test_valid_token():
+    claims = _verify(_token())
+    assert claims["uid"] == "firebase-uid-1"
+    assert claims["email"] == "an@example.com"
+
+
+def test_expired_token():
+    now = int(time.time())
+    with pytest.raises(InvalidFirebaseToken):
+        _verify(_token(iat=now - 7200, auth_time=now - 7200, exp=now - 3600))
+
+
+def test_wrong_audience():
+    with pytest.raises(InvalidFirebaseToken):
+        _verify(_token(aud="another-project"))
+
+
+def test_unknown_kid():
+    with pytest.raises(InvalidFirebaseToken, match="kid"):
+        _verify(_token(private_key=OTHER_PRIVATE_KEY, kid="kid-2"))
+
+
+def test_wrong_signature():
+    # kid đúng nhưng ký bằng khoá khác
+    with pytest.raises(InvalidFirebaseToken):
+        _verify(_token(private_key=OTHER_PRIVATE_KEY))
+
+
+def test_unknown_kid_refetches_rotated_keys(monkeypatch):
+    monkeypatch.setattr(firebase_tokens, "MIN_REFRESH_SECONDS", 0)
+    responses = [({"kid-1": CERT}, 3600), ({"kid-1": CERT, "kid-2": OTHER_CERT}, 3600)]
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return responses[min(len(calls), len(responses)) - 1]
+
+    async def run():
+        verifier = FirebaseVerifier(project_id=PROJECT_ID, fetch=fetch)
+        await verifier.verify(_token())
+        return await verifier.verify(_token(private_key=OTHER_PRIVATE_KEY, kid="kid-2"))
+
+    assert asyncio.run(run())["uid"] == "firebase-uid-1"
+    assert len(calls) == 2
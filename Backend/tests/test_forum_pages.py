@@ -0,0 +1,27 @@
+# tests/test_forum_pages.py
+# 📄 GET /forum/?page= / ?cursor=: keyset theo (created_at, forum_id), tổng lấy từ cached_count
+def test_all_forums_cursor_pages_match_page_numbers(client, login):
+    headers, _ = login("trang")
+    for i in range(5):
+        r = client.post("/forum/create", data={"name": f"Trang {i}", "tag": "pages"}, headers=headers)
+        assert r.status_code == 200, r.text
+
+    everything = [f["forum_id"] for f in client.get("/forum/").json()]
+    total = len(everything)
+
+    walked = []
+    page = client.get("/forum/", params={"page": 1, "limit": 2}).json()
+    while True:
+        assert page["total"] == total
+        walked.extend(f["forum_id"] for f in page["results"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            assert page["has_more"] is False
+            break
+        page = client.get("/forum/", params={"cursor": cursor, "limit": 2}).json()
+    assert sorted(walked) == sorted(everything)
+    assert len(walked) == total
+
+    # page > 1 (OFFSET cũ) trả cùng thứ tự với cursor
+    second = client.get("/forum/", params={"page": 2, "limit": 2}).json()
+    assert [f["forum_id"] for f in second["results"]] == walked[2:4]
@@ -0,0 +1,92 @@
+# tests/test_identity.py
+# 🪪 Token thiếu / sai / hết hạn → 401; sai người → 403 (require_self, chủ forum, admin forum); ClaimsCache hết hạn
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from jose import jwt
+
+import my_utils
+from identity import ClaimsCache, CurrentUser
+
+
+def _expired_token(user_id: int, username: str) -> str:
+    claims = {"id": user_id, "username": username, "email": None, "exp": datetime.utcnow() - timedelta(minutes=1)}
+    return jwt.encode(claims, my_utils.SECRET_KEY, algorithm=my_utils.ALGORITHM)
+
+
+@pytest.fixture(scope="module")
+def forum(client, login):
+    """Forum của "chu" (admin), "khach" chưa tham gia, "thanhvien" là member."""
+    owner, _ = login("chu")
+    forum_id = client.post("/forum/create", data={"name": "Quyền", "tag": "auth"}, headers=owner).json()["forum_id"]
+    member, member_id = login("thanhvien")
+    assert client.post("/membership/join", json={"forum_id": forum_id}, headers=member).status_code == 200
+    return forum_id, member_id
+
+
+def test_missing_invalid_or_expired_token_is_401(client, login):
+    _, user_id = login("hethan")
+    for headers in (
+        {},
+        {"Authorization": "Bearer khong-phai-jwt"},
+        {"Authorization": f"Bearer {_expired_token(user_id, 'hethan')}"},
+    ):
+        r = client.post("/forum/create", data={"name": "F", "tag": "auth"}, headers=headers)
+        assert r.status_code == 401, headers
+        assert r.headers["www-authenticate"] == "Bearer"
+
+
+def test_require_self_is_403(client, login, forum):
+    forum_id, member_id = forum
+    guest, _ = login("khach")
+    r = client.delete(f"/membership/leave/{forum_id}/{member_id}", headers=guest)
+    assert r.status_code == 403
+    r = client.post(f"/profile/{member_id}/post", json={"content": "giả mạo"}, headers=guest)
+    assert r.status_code == 403
+
+
+def test_non_owner_cannot_update_or_delete_forum(client, login, forum):
+    forum_id, _ = forum
+    guest, _ = login("khach")
+    assert client.put(f"/forum/update/{forum_id}", json={"name": "Chiếm"}, headers=guest).status_code == 403
+    assert client.delete(f"/forum/{forum_id}", headers=guest).status_code == 403
+    assert client.get(f"/forum/{forum_id}").json()["name"] == "Quyền"
+
+
+def test_non_admin_cannot_add_or_remove_members(client, login, forum):
+    forum_id, member_id = forum
+    member, _ = login("thanhvien")
+    login("khach")
+    r = client.post("/membership/add", json={"forum_id": forum_id, "username": "khach"}, headers=member)
+    assert r.status_code == 403
+    _, owner_id = login("chu")
+    r = client.delete(f"/membership/remove/{forum_id}/{owner_id}", headers=member)
+    assert r.status_code == 403
+    members = {m["user_id"] for m in client.get(f"/membership/{forum_id}").json()}
+    assert members == {owner_id, member_id}
+
+
+def test_join_ignores_client_supplied_identity_and_role(client, login, forum):
+    forum_id, member_id = forum
+    guest, guest_id = login("khach")
+    r = client.post(
+        "/membership/join",
+        json={"forum_id": forum_id, "user_id": member_id, "role": "admin"},
+        headers=guest,
+    )
+    assert r.status_code == 200, r.text
+    assert r.json()["user_id"] == guest_id
+    assert r.json()["role"] == "member"
+
+
+def test_claims_cache_drops_expired_entries():
+    cache = ClaimsCache(maxsize=10)
+    user = CurrentUser(user_id=1, username="an")
+    cache.put("sap-het", user, time.time() + 60)
+    cache.put("da-het", user, time.time() - 1)
+
+    assert cache.get("sap-het") == user
+    assert cache.get("da-het") is None
+    assert cache.stats()["entries"] == 1
+    assert (cache.hits, cache.misses) == (1, 1)
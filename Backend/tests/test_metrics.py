@@ -0,0 +1,39 @@
+# tests/test_metrics.py
+# 📈 /metrics, /health/*: cần METRICS_TOKEN, chưa đặt token thì chỉ localhost
+from fastapi.testclient import TestClient
+
+import main
+import metrics
+
+
+def test_metrics_requires_token(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape-secret")
+    client = TestClient(main.app)
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    r = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert r.status_code == 200
+    assert "http_request_duration_seconds_bucket" in r.text
+
+
+def test_metrics_localhost_only_without_token(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "")
+    assert TestClient(main.app).get("/metrics").status_code == 403
+    assert TestClient(main.app, client=("127.0.0.1", 50000)).get("/metrics").status_code == 200
+
+
+HEALTH_ENDPOINTS = ("/health/db", "/health/cache", "/health/images", "/health/passwords", "/health/firebase")
+
+
+def test_health_endpoints_share_metrics_auth(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape-secret")
+    client = TestClient(main.app)
+    for url in HEALTH_ENDPOINTS:
+        assert client.get(url).status_code == 401, url
+        assert client.get(url, headers={"Authorization": "Bearer scrape-secret"}).status_code == 200, url
+
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "")
+    local = TestClient(main.app, client=("127.0.0.1", 50000))
+    for url in HEALTH_ENDPOINTS:
+        assert client.get(url).status_code == 403, url
+        assert local.get(url).status_code == 200, url
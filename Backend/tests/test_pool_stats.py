@@ -0,0 +1,25 @@
+# tests/test_pool_stats.py
+# 🏊 Thống kê pool qua event công khai: checkout, connect mới, timeout + histogram thời gian chờ
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from database import TimedQueuePool, pool_status
+
+
+def test_pool_stats_count_checkouts_connects_and_timeouts(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.1
+    )
+    held = engine.connect()
+    held.execute(text("select 1"))
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    held.close()
+    with engine.connect() as conn:
+        conn.execute(text("select 1"))
+
+    status = pool_status(engine)
+    assert (status["checkouts"], status["timeouts"], status["connects"]) == (2, 1, 1)
+    assert status["wait_ms"]["count"] == 3
+    assert status["wait_ms"]["buckets"][-1] == {"le": "+Inf", "count": 3}
+    engine.dispose()
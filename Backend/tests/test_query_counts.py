@@ -0,0 +1,97 @@
+# tests/test_query_counts.py
+# 🔢 Số câu SQL mỗi request không tăng theo kích thước dữ liệu (chống N+1), đếm qua database.sql_stats
+# (cùng kịch bản với bench/query_counts.py, chạy trong CI)
+import itertools
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base, ThreadedSession, get_async_db, get_db, instrument_engine, sql_stats
+from models.forum import Forum
+from models.membership import Membership
+from models.message import Message
+from models.user import User
+from routers import forum, message
+
+_engine_ids = itertools.count()
+
+
+def make_client(routers):
+    """App riêng trên SQLite in-memory; engine được đếm dưới 1 tên riêng trong sql_stats."""
+    name = f"query_counts:{next(_engine_ids)}"
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    instrument_engine(engine, name)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        db = Session()
+        try:
+            yield ThreadedSession(db)
+        finally:
+            db.close()
+
+    app = FastAPI()
+    for r in routers:
+        app.include_router(r)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    return TestClient(app), Session, name
+
+
+def statements(name: str) -> int:
+    counts = sql_stats.snapshot()["statements"]
+    return sum(n for (engine_name, _), n in counts.items() if engine_name == name)
+
+
+def count_statements(client, name, url):
+    before = statements(name)
+    response = client.get(url)
+    assert response.status_code == 200, response.text
+    return statements(name) - before
+
+
+def test_message_history_query_count():
+    results = {}
+    for size in (10, 50, 200):
+        client, Session, name = make_client([message.router])
+        db = Session()
+        db.add(User(user_id=1, username="bench", email="bench@example.com", password_hash="x"))
+        db.add(Forum(forum_id=1, name="bench", created_by=1))
+        db.add(Message(message_id=1, forum_id=1, user_id=1, content="x" * 300))
+        db.add_all(Message(forum_id=1, user_id=1, content=f"reply {i}", reply_to=1) for i in range(size))
+        db.commit()
+        db.close()
+        results[size] = count_statements(client, name, f"/message/forum/1?limit={size}")
+
+    assert len(set(results.values())) == 1, f"Số câu SQL thay đổi theo số reply: {results}"
+    assert all(1 <= n <= 2 for n in results.values()), results
+
+
+def test_joined_forums_query_count():
+    results = {}
+    for size in (5, 50, 200):
+        client, Session, name = make_client([forum.router])
+        db = Session()
+        db.add_all(User(user_id=i, username=f"u{i}", email=f"u{i}@example.com", password_hash="x") for i in (1, 2))
+        for forum_id in range(1, size + 1):
+            db.add(Forum(forum_id=forum_id, name=f"f{forum_id}", created_by=1))
+            db.add(Membership(user_id=1, forum_id=forum_id))
+            db.add(Membership(user_id=2, forum_id=forum_id))
+            db.add_all(Message(forum_id=forum_id, user_id=2, content="hi") for _ in range(3))
+        db.commit()
+        db.close()
+        results[size] = count_statements(client, name, "/forum/joined/1")
+
+    assert len(set(results.values())) == 1, f"Số câu SQL thay đổi theo số forum: {results}"
+    assert all(1 <= n <= 2 for n in results.values()), results
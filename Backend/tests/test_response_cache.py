@@ -0,0 +1,43 @@
+# tests/test_response_cache.py
+# 🗄️ Cache response khi có replica: không lưu body đọc ngay sau invalidate(), request dính primary bỏ qua cache
+import time
+
+from starlette.requests import Request
+
+import response_cache
+from database import STICKY_COOKIE
+from response_cache import MemoryCache, ResponseCache
+
+
+def test_invalidated_tag_is_held_for_replica_lag():
+    cache = ResponseCache(MemoryCache(), ttl=30, replica_lag=0.2)
+    cache.set("k", b"v1", ["forum:1"])
+    assert cache.get("k") == b"v1"
+
+    cache.invalidate("forum:1")
+    cache.set("k", b"stale", ["forum:1"])  # miss vừa đọc replica có thể chưa thấy lần ghi
+    assert cache.get("k") is None
+    cache.set("other", b"x", ["forum:2"])  # tag khác không bị giữ
+    assert cache.get("other") == b"x"
+
+    time.sleep(0.25)
+    cache.set("k", b"v2", ["forum:1"])
+    assert cache.get("k") == b"v2"
+
+
+def test_no_hold_without_replicas():
+    cache = ResponseCache(MemoryCache(), ttl=30, replica_lag=0)
+    cache.invalidate("forum:1")
+    cache.set("k", b"v", ["forum:1"])
+    assert cache.get("k") == b"v"
+
+
+def _request(cookie: str = "") -> Request:
+    headers = [(b"cookie", cookie.encode())] if cookie else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "query_string": b""})
+
+
+def test_sticky_request_bypasses_cache():
+    assert not response_cache._bypass({"request": _request()})
+    sticky = _request(f"{STICKY_COOKIE}={time.time() + 60}")
+    assert response_cache._bypass({"request": sticky})
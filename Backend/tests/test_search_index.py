@@ -0,0 +1,68 @@
+# tests/test_search_index.py
+# 🔎 Chỉ mục tìm kiếm bộ nhớ: sync() chỉ nạp lại forum mới / đã đổi / đã xoá, từ gõ dở bị giới hạn số từ mở rộng
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import search_index
+from database import Base
+from models.forum import Forum
+from search_index import MemorySearchIndex
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Forum(forum_id=1, name="cờ vua", tag="game"),
+        Forum(forum_id=2, name="nấu ăn", tag="food"),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def _ids(index, db, keyword):
+    results, _ = index.search(db, keyword, 0, 20)
+    return {fid for fid, _ in results}
+
+
+def test_sync_picks_up_changes_from_other_workers(db):
+    index = MemorySearchIndex()
+    index.sync(db)
+    assert _ids(index, db, "co vua") == {1}
+
+    # Worker khác: thêm forum 3, sửa forum 2 (tăng version), xoá forum 1
+    db.add(Forum(forum_id=3, name="du lịch", tag="travel"))
+    forum = db.get(Forum, 2)
+    forum.name = "bóng đá"
+    forum.version += 1
+    db.delete(db.get(Forum, 1))
+    db.commit()
+
+    assert index.sync(db) == (2, 1)
+    assert _ids(index, db, "du lich") == {3}
+    assert _ids(index, db, "bong da") == {2}
+    assert _ids(index, db, "nau an") == set()
+    assert _ids(index, db, "co vua") == set()
+
+    # Không có gì đổi → không đọc lại forum nào
+    assert index.sync(db) == (0, 0)
+
+
+def test_prefix_expansion_is_capped(db, monkeypatch):
+    monkeypatch.setattr(search_index, "PREFIX_EXPANSIONS", 3)
+    index = MemorySearchIndex()
+    for i in range(10):
+        index.add_document(100 + i, f"game{i}", "", "")
+    for i in range(5):
+        index.add_document(200 + i, "game7", "", "")
+    index.ready = True
+
+    expanded = index._expand("game")
+    assert len(expanded) == 3
+    assert "game7" in expanded  # từ có nhiều tài liệu nhất được giữ
+    _, total = index.search(db, "game", 0, 20)
+    assert total == 6 + 2  # game7 (6 tài liệu) + 2 từ khác, không phải cả 15
@@ -0,0 +1,52 @@
+# tests/test_storage.py
+# 📦 Kho file theo nội dung: 2 lần upload cùng bytes → 1 file, ref_count = 2; xoá 1 chủ sở hữu → file vẫn còn
+import os
+
+import storage
+from database import SessionLocal
+from models.stored_file import StoredFile
+
+
+def _stored(digest_path: str):
+    db = SessionLocal()
+    try:
+        digest = os.path.splitext(os.path.basename(digest_path))[0]
+        return db.query(StoredFile).filter(StoredFile.digest == digest).first()
+    finally:
+        db.close()
+
+
+def test_same_bytes_are_stored_once_and_released_per_owner(client, login):
+    headers, _ = login("kho")
+    content = b"cung-noi-dung-" * 64
+    forum_ids, paths = [], []
+    for name in ("Ảnh 1", "Ảnh 2"):
+        r = client.post(
+            "/forum/create",
+            data={"name": name, "tag": "storage"},
+            files={"file": ("nen.jpg", content, "image/jpeg")},
+            headers=headers,
+        )
+        assert r.status_code == 200, r.text
+        forum_ids.append(r.json()["forum_id"])
+        paths.append(r.json()["saved_path"])
+
+    assert paths[0] == paths[1]
+    disk_path = os.path.join(storage.STATIC_DIR, paths[0])
+    assert os.path.isfile(disk_path)
+    assert _stored(paths[0]).ref_count == 2
+    assert os.listdir(storage.TMP_DIR) == []  # file tạm đã vào kho / bị bỏ
+
+    assert client.delete(f"/forum/{forum_ids[0]}", headers=headers).status_code == 200
+    assert _stored(paths[0]).ref_count == 1
+    assert os.path.isfile(disk_path)
+
+    assert client.delete(f"/forum/{forum_ids[1]}", headers=headers).status_code == 200
+    assert _stored(paths[0]) is None
+    assert not os.path.exists(disk_path)
+
+
+def test_tmp_dir_sits_next_to_static(client):
+    assert os.path.isabs(storage.TMP_DIR)
+    assert os.path.dirname(storage.TMP_DIR) == os.path.dirname(os.path.abspath(storage.STATIC_DIR))
+    assert os.path.isdir(storage.TMP_DIR)  # tạo lúc khởi động
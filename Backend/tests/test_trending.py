@@ -0,0 +1,75 @@
+# tests/test_trending.py
+# 🔥 Trending: mọi thời điểm quy về UTC — tin nhắn qua WebSocket và qua /message/send cùng múi giờ
+import math
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, SessionLocal
+from models.forum import Forum
+from models.like import Like
+from models.message import Message
+from models.user import User
+from trending import TrendingLeaderboard, _timestamp
+
+VN_TZ = timezone(timedelta(hours=7))
+
+
+def test_timestamp_mixed_timezones():
+    utc_naive = datetime(2025, 1, 1, 5, 0, 0)
+    same_instant = [
+        utc_naive,
+        utc_naive.replace(tzinfo=timezone.utc),
+        datetime(2025, 1, 1, 12, 0, 0, tzinfo=VN_TZ),
+    ]
+    assert len({_timestamp(dt) for dt in same_instant}) == 1
+
+
+@pytest.fixture
+def mixed_db():
+    """Forum 1: like + tin nhắn 24h trước; forum 2: like 24h trước + like ngoài cửa sổ (đều naive UTC)."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(user_id=1, username="u", email="u@example.com", password_hash="x"))
+    db.add_all([Forum(forum_id=1, name="a"), Forum(forum_id=2, name="b")])
+    day_ago = datetime.utcnow() - timedelta(hours=24)
+    db.add_all([
+        Like(user_id=1, forum_id=1, created_at=day_ago),
+        Message(user_id=1, forum_id=1, content="x", created_at=day_ago),
+        Like(user_id=1, forum_id=2, created_at=day_ago),
+        # Sự kiện ngoài cửa sổ 7 ngày
+        Like(user_id=1, forum_id=2, created_at=datetime.utcnow() - timedelta(days=8)),
+    ])
+    db.commit()
+    yield db
+    db.close()
+
+
+def test_rebuild_decays_by_utc_age(mixed_db):
+    board = TrendingLeaderboard(half_life_hours=24, window_days=7)
+    board.rebuild(mixed_db)
+    scores = dict(board.page(0, 10)[0])
+    # half-life 24h: sự kiện 24h trước còn nửa trọng số (like 3 + message 1)
+    assert math.isclose(scores[1], (3 + 1) / 2, rel_tol=0.01)
+    assert math.isclose(scores[2], 3 / 2, rel_tol=0.01)
+
+
+def test_websocket_message_stored_in_utc(client, login):
+    headers, _ = login("tz-user")
+    forum_id = client.post("/forum/create", data={"name": "tz", "tag": "tz"}, headers=headers).json()["forum_id"]
+    token = headers["Authorization"].split(" ", 1)[1]
+    with client.websocket_connect(f"/chat/ws/{forum_id}?token={token}") as ws:
+        ws.send_json({"content": "xin chào"})
+        payload = ws.receive_json()
+
+    db = SessionLocal()
+    try:
+        stored = db.query(Message.created_at).filter(Message.message_id == payload["message_id"]).scalar()
+    finally:
+        db.close()
+    now = datetime.utcnow()
+    assert abs((now - stored).total_seconds()) < 60
+    assert abs((now - datetime.fromisoformat(payload["created_at"])).total_seconds()) < 60
@@ -0,0 +1,164 @@
+# trending.py
+# 🔥 Bảng xếp hạng forum trending
+# - Điểm = tổng trọng số các sự kiện (like, join, message) giảm dần theo hàm mũ với half-life cấu hình được
+# - Điểm lưu quy về 1 mốc epoch chung, nên mọi forum giảm cùng tỉ lệ theo thời gian:
+#   thứ tự chỉ thay đổi khi có sự kiện mới → giữ được 1 danh sách đã sắp xếp, cập nhật từng phần
+# - Định kỳ build lại từ DB (compaction) để dời epoch và đồng bộ giữa các worker
+import asyncio
+import bisect
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models.forum import Forum
+from models.like import Like
+from models.membership import Membership
+from models.message import Message
+
+HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))
+# Chỉ đọc sự kiện trong cửa sổ này khi build lại (sự kiện cũ hơn gần như không còn điểm)
+WINDOW_DAYS = float(os.getenv("TRENDING_WINDOW_DAYS", "7"))
+REBUILD_SECONDS = float(os.getenv("TRENDING_REBUILD_SECONDS", "600"))
+
+WEIGHTS = {"like": 3.0, "join": 2.0, "message": 1.0}
+
+
+def _timestamp(dt: datetime) -> float:
+    # DB lưu datetime không kèm múi giờ, quy ước UTC (mọi nơi ghi dùng datetime.utcnow());
+    # giá trị có tzinfo (múi giờ bất kỳ) được quy đổi đúng
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class TrendingLeaderboard:
+    def __init__(self, half_life_hours: float = HALF_LIFE_HOURS, window_days: float = WINDOW_DAYS):
+        self.decay = math.log(2) / (half_life_hours * 3600)
+        self.window_seconds = window_days * 86400
+        self.ready = False
+        self._lock = threading.Lock()
+        self._epoch = time.time()
+        self._scores: Dict[int, float] = {}        # forum_id -> điểm quy về epoch
+        self._order: List[Tuple[float, int]] = []  # (-điểm, -forum_id): điểm cao trước, forum mới trước
+
+    # ===============================
+    # ✏️ Cập nhật từng phần
+    # ===============================
+    def _set(self, forum_id: int, score: float):
+        old = self._scores.get(forum_id)
+        if old is not None:
+            del self._order[bisect.bisect_left(self._order, (-old, -forum_id))]
+        self._scores[forum_id] = score
+        bisect.insort(self._order, (-score, -forum_id))
+
+    def record(self, forum_id: int, kind: str, sign: int = 1):
+        """Ghi nhận 1 sự kiện (like/join/message); sign=-1 khi bỏ like, rời nhóm."""
+        if not self.ready:
+            return  # lần build đầu tiên sẽ đọc sự kiện này từ DB
+        with self._lock:
+            if forum_id not in self._scores:
+                return
+            gain = WEIGHTS[kind] * math.exp(self.decay * (time.time() - self._epoch))
+            self._set(forum_id, max(self._scores[forum_id] + sign * gain, 0.0))
+
+    def add_forum(self, forum_id: int):
+        if not self.ready:
+            return
+        with self._lock:
+            if forum_id not in self._scores:
+                self._set(forum_id, 0.0)
+
+    def remove_forum(self, forum_id: int):
+        with self._lock:
+            score = self._scores.pop(forum_id, None)
+            if score is not None:
+                del self._order[bisect.bisect_left(self._order, (-score, -forum_id))]
+
+    # ===============================
+    # 📄 Đọc 1 trang
+    # ===============================
+    def page(self, offset: int, limit: int) -> Tuple[List[Tuple[int, float]], int]:
+        """Trả về ([(forum_id, điểm hiện tại)], tổng số forum)."""
+        with self._lock:
+            items = self._order[offset:offset + limit]
+            total = len(self._order)
+            factor = math.exp(-self.decay * (time.time() - self._epoch))
+        return [(-neg_id, -neg_score * factor) for neg_score, neg_id in items], total
+
+    def page_after(self, cursor: Optional[Tuple[float, float, int]], limit: int):
+        """
+        Đọc tiếp sau cursor = (điểm lưu, epoch, forum_id) của phần tử cuối trang trước.
+        Điểm được quy đổi sang epoch hiện tại nên cursor vẫn dùng được sau khi build lại.
+        Trả về ([(forum_id, điểm hiện tại)], tổng số forum, cursor trang sau hoặc None).
+        """
+        with self._lock:
+            start = 0
+            if cursor is not None:
+                stored, epoch, forum_id = cursor
+                stored *= math.exp(-self.decay * (self._epoch - epoch))
+                start = bisect.bisect_right(self._order, (-stored, -forum_id))
+            items = self._order[start:start + limit + 1]
+            total = len(self._order)
+            epoch = self._epoch
+            factor = math.exp(-self.decay * (time.time() - epoch))
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            neg_score, neg_id = items[-1]
+            next_cursor = (-neg_score, epoch, -neg_id)
+        return [(-neg_id, -neg_score * factor) for neg_score, neg_id in items], total, next_cursor
+
+    # ===============================
+    # 🧹 Build lại từ DB
+    # ===============================
+    def rebuild(self, db: Session):
+        now = time.time()
+        since = datetime.utcfromtimestamp(now - self.window_seconds)
+        scores = {forum_id: 0.0 for (forum_id,) in db.query(Forum.forum_id)}
+
+        sources = (
+            ("like", Like.forum_id, Like.created_at),
+            ("join", Membership.forum_id, Membership.joined_at),
+            ("message", Message.forum_id, Message.created_at),
+        )
+        for kind, forum_col, time_col in sources:
+            weight = WEIGHTS[kind]
+            rows = db.query(forum_col, time_col).filter(time_col >= since).yield_per(5000)
+            for forum_id, created_at in rows:
+                if forum_id in scores and created_at is not None:
+                    age = now - min(_timestamp(created_at), now)
+                    scores[forum_id] += weight * math.exp(-self.decay * age)
+
+        order = sorted((-score, -forum_id) for forum_id, score in scores.items())
+        with self._lock:
+            self._epoch = now
+            self._scores = scores
+            self._order = order
+            self.ready = True
+
+
+leaderboard = TrendingLeaderboard()
+
+
+async def run_compaction(session_factory, interval: float = REBUILD_SECONDS):
+    """Task nền: build lại bảng xếp hạng định kỳ trong thread riêng."""
+    loop = asyncio.get_running_loop()
+
+    def _rebuild():
+        db = session_factory()
+        try:
+            leaderboard.rebuild(db)
+        finally:
+            db.close()
+
+    while True:
+        try:
+            await loop.run_in_executor(None, _rebuild)
+        except Exception as e:
+            print(f"⚠️ Không thể build lại trending: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,127 @@
+# user_index.py
+# 🔤 Chỉ mục gợi ý username cho /membership/suggest
+# - Danh sách username (đã chuẩn hoá) sắp xếp sẵn → tìm theo tiền tố bằng bisect
+# - Trigram cho trường hợp từ khoá nằm giữa username
+# - Xếp hạng: khớp chính xác → khớp tiền tố → khớp giữa chuỗi
+# - Chỉ mục nằm trong bộ nhớ của từng worker: add() chỉ thấy user đăng ký qua worker này,
+#   run_rebuild() đọc lại bảng user định kỳ (USER_INDEX_REBUILD_SECONDS) để các worker đồng bộ với DB
+import asyncio
+import bisect
+import os
+import threading
+from typing import Dict, List, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from models.user import User
+from search_index import normalize
+
+SUGGEST_LIMIT = 8
+REBUILD_SECONDS = float(os.getenv("USER_INDEX_REBUILD_SECONDS", "60"))
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class UsernameIndex:
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.Lock()
+        self._keys: List[Tuple[str, int]] = []  # (username chuẩn hoá, user_id)
+        self._names: Dict[int, str] = {}
+        self._normalized: Dict[int, str] = {}
+        self._trigrams: Dict[str, Set[int]] = {}
+
+    def _add(self, user_id: int, username: str):
+        key = normalize(username)
+        self._names[user_id] = username
+        self._normalized[user_id] = key
+        for gram in _trigrams(key):
+            self._trigrams.setdefault(gram, set()).add(user_id)
+        return key
+
+    def add(self, user_id: int, username: str):
+        """Gọi sau khi tạo user mới."""
+        if not self.ready:
+            return  # lần build đầu sẽ đọc user này từ DB
+        with self._lock:
+            if user_id in self._names:
+                return
+            bisect.insort(self._keys, (self._add(user_id, username), user_id))
+
+    def rebuild(self, db: Session):
+        fresh = UsernameIndex()
+        keys = [
+            (fresh._add(user_id, username), user_id)
+            for user_id, username in db.query(User.user_id, User.username).yield_per(5000)
+        ]
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._names = fresh._names
+            self._normalized = fresh._normalized
+            self._trigrams = fresh._trigrams
+            self.ready = True
+
+    def suggest(self, db: Session, keyword: str, limit: int = SUGGEST_LIMIT) -> List[Tuple[int, str]]:
+        if not self.ready:
+            self.rebuild(db)
+        key = normalize(keyword).strip()
+        if not key:
+            return []
+
+        with self._lock:
+            # 1️⃣ Khớp chính xác + tiền tố: nằm liền nhau trong danh sách đã sắp xếp (chính xác đứng đầu)
+            results: List[int] = []
+            i = bisect.bisect_left(self._keys, (key, -1))
+            while i < len(self._keys) and len(results) < limit and self._keys[i][0].startswith(key):
+                results.append(self._keys[i][1])
+                i += 1
+
+            # 2️⃣ Khớp giữa chuỗi: qua trigram (từ khoá từ 3 ký tự), ngắn hơn thì quét và dừng sớm
+            if len(results) < limit:
+                if len(key) >= 3:
+                    grams = sorted((self._trigrams.get(g, set()) for g in _trigrams(key)), key=len)
+                    candidates = set(grams[0]).intersection(*grams[1:])
+                else:
+                    candidates = []
+                    for name, user_id in self._keys:
+                        if key in name[1:]:
+                            candidates.append(user_id)
+                            if len(candidates) >= limit * 4:
+                                break
+                seen = set(results)
+                infix = []
+                for user_id in candidates:
+                    if user_id in seen:
+                        continue
+                    name = self._normalized[user_id]
+                    pos = name.find(key)
+                    if pos > 0:
+                        infix.append((pos, len(name), name, user_id))
+                results.extend(user_id for *_, user_id in sorted(infix)[:limit - len(results)])
+
+            return [(user_id, self._names[user_id]) for user_id in results]
+
+
+user_index = UsernameIndex()
+
+
+async def run_rebuild(session_factory, interval: float = REBUILD_SECONDS):
+    """Task nền: build lại chỉ mục username định kỳ trong thread riêng (lần đầu chạy ngay)."""
+    loop = asyncio.get_running_loop()
+
+    def _rebuild():
+        db = session_factory()
+        try:
+            user_index.rebuild(db)
+        finally:
+            db.close()
+
+    while True:
+        try:
+            await loop.run_in_executor(None, _rebuild)
+        except Exception as e:
+            print(f"⚠️ Không thể nạp chỉ mục username: {e}")
+        await asyncio.sleep(interval)